@@ -0,0 +1,63 @@
+import argparse
+import time
+import tracemalloc
+
+from file_system.file_system import FileSystem
+
+
+def build(folders, files, length):
+    file_system = FileSystem()
+    file_system.create('drive', 'd', '')
+    file_system.create('folder', 'project', 'd')
+
+    for folder in range(folders):
+        folder_path = 'd\\project\\f{}'.format(folder)
+        file_system.create('folder', 'f{}'.format(folder), 'd\\project')
+        for file in range(files):
+            file_system.create('text', 't{}'.format(file), folder_path)
+            file_system.write_to_file('{}\\t{}'.format(folder_path, file), '{:08d}'.format(file) + 'x' * length)
+
+    return file_system
+
+
+def clone(file_system, source, destination):
+    """
+    Copies a folder the way it had to be done without FileSystem.copy, one create and write per entity
+    """
+
+    name = source.rsplit('\\', 1)[-1]
+    file_system.create('folder', name, destination)
+    for entry in file_system.walk(source):
+        parent = destination + '\\' + name + entry.entity.parent.path[len(source):]
+        file_system.create(entry.entity_type, entry.name, parent)
+        if entry.is_text():
+            file_system.write_to_file(parent + '\\' + entry.name, entry.entity.content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time and memory of copying a subtree entity by entity and with copy')
+    parser.add_argument('--folders', type=int, default=100)
+    parser.add_argument('--files', type=int, default=200, help='text files per folder')
+    parser.add_argument('--length', type=int, default=1000, help='characters per content')
+    args = parser.parse_args()
+
+    for method in ['create and write', 'copy']:
+        file_system = build(args.folders, args.files, args.length)
+        file_system.create('folder', 'clone', 'd')
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        if method == 'copy':
+            file_system.copy('d\\project', 'd\\clone')
+        else:
+            clone(file_system, 'd\\project', 'd\\clone')
+        elapsed = time.perf_counter() - started
+        allocated, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print('{}: {:.3f} s, {:,} bytes allocated'.format(method, elapsed, allocated))
+        del file_system
+
+
+if __name__ == '__main__':
+    main()
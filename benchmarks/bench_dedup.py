@@ -0,0 +1,67 @@
+import argparse
+import random
+import time
+import tracemalloc
+
+from file_system.file_system import FileSystem
+
+
+def corpus(files, duplicate_ratio, templates, length, seed=0):
+    """
+    Yields the contents of files text files, of which duplicate_ratio are copies of a few templates
+    Every content is a distinct string object, as it would be when read from outside the file system.
+    """
+
+    rng = random.Random(seed)
+    bodies = [''.join(rng.choice('abcdefghij \n') for _ in range(length)) for _ in range(templates)]
+    for index in range(files):
+        if rng.random() < duplicate_ratio:
+            yield ''.join(['', bodies[rng.randrange(templates)]])
+        else:
+            yield '{:08d}'.format(index) + bodies[0][8:]
+
+
+def build(contents, fan_out, dedup):
+    file_system = FileSystem(path_cache_size=0, dedup=dedup)
+    file_system.create('drive', 'd', '')
+
+    for index, content in enumerate(contents):
+        folder = 'd\\f{}'.format(index // fan_out)
+        if index % fan_out == 0:
+            file_system.create('folder', 'f{}'.format(index // fan_out), 'd')
+        file_system.create('text', 't{}'.format(index), folder)
+        file_system.write_to_file('{}\\t{}'.format(folder, index), content)
+
+    return file_system
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memory and write time with and without the content store')
+    parser.add_argument('--files', type=int, default=100000)
+    parser.add_argument('--duplicates', type=float, default=0.9, help='share of files holding a duplicate')
+    parser.add_argument('--templates', type=int, default=50, help='distinct duplicated contents')
+    parser.add_argument('--length', type=int, default=2000, help='characters per content')
+    parser.add_argument('--fan-out', type=int, default=100, help='text files per folder')
+    args = parser.parse_args()
+
+    for dedup in [False, True]:
+        contents = corpus(args.files, args.duplicates, args.templates, args.length)
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        file_system = build(contents, args.fan_out, dedup)
+        elapsed = time.perf_counter() - started
+        allocated, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print('dedup={}: {:,} bytes allocated, {:.2f} s'.format(dedup, allocated, elapsed))
+        if dedup:
+            info = file_system.content_store_info()
+            print('  {:,} files, {:,} distinct contents, ratio {:.1f}, {:,} bytes saved'.format(
+                info.references, info.contents, info.ratio, info.saved_bytes
+            ))
+        del file_system
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import time
+
+from file_system.file_system import FileSystem
+
+
+def build(nodes, fan_out, background_reclaim):
+    file_system = FileSystem(path_cache_size=0, dedup=True, background_reclaim=background_reclaim)
+    file_system.create('drive', 'd', '')
+    file_system.create('drive', 'other', '')
+
+    created = 0
+    folder = 0
+    while created < nodes:
+        file_system.create('folder', 'f{}'.format(folder), 'd')
+        file_system.create_many(
+            ('text', 't{}'.format(index), 'd\\f{}'.format(folder)) for index in range(min(fan_out, nodes - created))
+        )
+        file_system.write_many(
+            ('d\\f{}\\t{}'.format(folder, index), 'content') for index in range(min(fan_out, nodes - created))
+        )
+        created += fan_out + 1
+        folder += 1
+
+    return file_system
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Latency of deleting a large drive and of operations meanwhile')
+    parser.add_argument('--nodes', type=int, default=1000000)
+    parser.add_argument('--fan-out', type=int, default=1000, help='text files per folder')
+    args = parser.parse_args()
+
+    # tearing down at once is what a delete cost before the reclaimer
+    file_system = build(args.nodes, args.fan_out, False)
+    started = time.perf_counter()
+    file_system.delete('d')
+    file_system.reclaim()
+    print('delete and tear down at once: {:.3f} s'.format(time.perf_counter() - started))
+    del file_system
+
+    file_system = build(args.nodes, args.fan_out, True)
+    started = time.perf_counter()
+    file_system.delete('d')
+    deleted = time.perf_counter() - started
+
+    # operations issued while the subtree is torn down in the background
+    latencies = []
+    index = 0
+    while file_system.reclaim(0):
+        started = time.perf_counter()
+        file_system.create('folder', 'f{}'.format(index), 'other')
+        latencies.append(time.perf_counter() - started)
+        index += 1
+        time.sleep(0.001)
+
+    print('delete with background teardown: {:.6f} s, {} operations meanwhile, slowest {:.6f} s'.format(
+        deleted, len(latencies), max(latencies, default=0)
+    ))
+
+if __name__ == '__main__':
+    main()
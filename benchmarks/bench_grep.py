@@ -0,0 +1,94 @@
+import argparse
+import random
+import re
+import time
+
+from file_system.file_system import FileSystem
+
+
+def build(files, words, fan_out, seed=0):
+    """
+    Returns a file system of text files holding random sentences drawn from a vocabulary
+    """
+
+    rng = random.Random(seed)
+    vocabulary = ['word{}'.format(index) for index in range(5000)]
+
+    file_system = FileSystem(path_cache_size=0)
+    file_system.create('drive', 'd', '')
+
+    with file_system.batch():
+        for index in range(files):
+            if index % fan_out == 0:
+                folder = file_system.create('folder', 'f{}'.format(index // fan_out), 'd')
+            text = file_system._create_child(folder, 'text', 't{}'.format(index), None)
+            text.content = ' '.join(rng.choice(vocabulary) for _ in range(words))
+            text.size = len(text.content)
+            folder.mark_dirty()
+
+    return file_system
+
+
+def brute_force(file_system, pattern):
+    """
+    Returns the text files whose content matches a regular expression, reading every content
+    """
+
+    results = []
+    stack = [file_system._root]
+    while stack:
+        entity = stack.pop()
+        if entity.entity_type == 'text':
+            if pattern.search(entity.content):
+                results.append(entity)
+        else:
+            stack.extend(entity.get_child(name) for name in entity.get_names())
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Text index build time and grep latency against a brute-force scan')
+    parser.add_argument('--files', type=int, default=100000)
+    parser.add_argument('--words', type=int, default=50, help='words per text file')
+    parser.add_argument('--fan-out', type=int, default=100, help='text files per folder')
+    parser.add_argument('--queries', type=int, default=20)
+    args = parser.parse_args()
+
+    file_system = build(args.files, args.words, args.fan_out)
+
+    started = time.perf_counter()
+    file_system.grep('word0')
+    print('{} files: index built in {:.2f} s'.format(args.files, time.perf_counter() - started))
+
+    queries = [
+        ('word', 'word{}'.format(index * 37), r'\bword{}\b'.format(index * 37)) for index in range(args.queries)
+    ] + [
+        ('phrase', '"word{} word{}"'.format(index, index + 1), r'\bword{} word{}\b'.format(index, index + 1))
+        for index in range(args.queries)
+    ] + [
+        ('prefix', 'word{}*'.format(index + 10), r'\bword{}'.format(index + 10)) for index in range(args.queries)
+    ]
+
+    for kind in ['word', 'phrase', 'prefix']:
+        indexed_seconds = scan_seconds = 0
+        for query_kind, query, expression in queries:
+            if query_kind != kind:
+                continue
+
+            started = time.perf_counter()
+            indexed = file_system.grep(query)
+            indexed_seconds += time.perf_counter() - started
+
+            started = time.perf_counter()
+            scanned = brute_force(file_system, re.compile(expression))
+            scan_seconds += time.perf_counter() - started
+
+            assert len(indexed) == len(scanned)
+
+        print('{:6} queries: grep {:.2f} ms, scan {:.2f} ms per query'.format(
+            kind, 1000 * indexed_seconds / args.queries, 1000 * scan_seconds / args.queries
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import argparse
+import tracemalloc
+
+from file_system.file_system_entities import Drive, Folder, Text
+
+
+class LegacyEntity:
+    """
+    The original entity layout: a per-instance __dict__, a type string and a full path string
+    """
+
+    def __init__(self, entity_type, name, path):
+        self._entity_type = entity_type
+        self._name = name
+        self._path = path
+        self._size = 0
+
+
+class LegacyContainer(LegacyEntity):
+
+    def __init__(self, entity_type, name, path):
+        LegacyEntity.__init__(self, entity_type, name, path)
+        self._children = {}
+
+
+class LegacyText(LegacyEntity):
+
+    def __init__(self, entity_type, name, path):
+        LegacyEntity.__init__(self, entity_type, name, path)
+        self._content = ''
+
+
+def build_legacy(nodes, fan_out):
+    drive = LegacyContainer('drive', 'drive', 'drive')
+    count = 1
+    while count < nodes:
+        folder_name = 'folder{}'.format(count)
+        folder = LegacyContainer('folder', folder_name, drive._path + '\\' + folder_name)
+        drive._children[folder_name] = folder
+        count += 1
+        for index in range(min(fan_out, nodes - count)):
+            text_name = 'text{}'.format(index)
+            folder._children[text_name] = LegacyText('text', text_name, folder._path + '\\' + text_name)
+            count += 1
+    return drive
+
+
+def build_slotted(nodes, fan_out):
+    drive = Drive('drive', 'drive')
+    count = 1
+    while count < nodes:
+        folder = Folder('folder', 'folder{}'.format(count))
+        drive.add_child(folder)
+        count += 1
+        for index in range(min(fan_out, nodes - count)):
+            folder.add_child(Text('text', 'text{}'.format(index)))
+            count += 1
+    return drive
+
+
+def measure(build, nodes, fan_out):
+    """
+    Returns the bytes allocated per node while building a tree of nodes entities
+    """
+
+    tracemalloc.start()
+    tree = build(nodes, fan_out)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del tree
+    return allocated / nodes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare bytes per node of the original and slotted entities')
+    parser.add_argument('--nodes', type=int, nargs='+', default=[1000000])
+    parser.add_argument('--fan-out', type=int, default=10, help='text files per folder')
+    args = parser.parse_args()
+
+    for nodes in args.nodes:
+        print('{} nodes'.format(nodes))
+        print('original layout: {:.1f} bytes/node'.format(measure(build_legacy, nodes, args.fan_out)))
+        print('slotted layout:  {:.1f} bytes/node'.format(measure(build_slotted, nodes, args.fan_out)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+import argparse
+import timeit
+
+from file_system.file_system import FileSystem
+from file_system.file_system_helpers import FileSystemPath, parse_path
+
+
+def split_path(path):
+    """
+    The original path parser, kept here as the baseline
+    """
+
+    split = path.split('\\')
+    return [entity for entity in split if entity != '']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare path parsing cost per operation')
+    parser.add_argument('--depth', type=int, default=20)
+    parser.add_argument('--number', type=int, default=100000)
+    args = parser.parse_args()
+
+    file_system = FileSystem(path_cache_size=0)
+    parent = file_system.create('drive', 'drive', '')
+    for level in range(args.depth):
+        parent = file_system.create('folder', 'folder{}'.format(level), parent.path)
+    text = file_system.create('text', 'text', parent.path)
+
+    path = text.path
+    parsed = FileSystemPath(path)
+
+    def report(label, seconds):
+        print('{:<32} {:.3f} us/op'.format(label, seconds / args.number * 1e6))
+
+    print('path depth {}'.format(args.depth + 2))
+    report('original split', timeit.timeit(lambda: split_path(path), number=args.number))
+    report('FileSystemPath from string', timeit.timeit(lambda: FileSystemPath(path), number=args.number))
+    report('parse_path, memoized', timeit.timeit(lambda: parse_path(path), number=args.number))
+    report('write_to_file with a string', timeit.timeit(
+        lambda: file_system.write_to_file(path, 'test'), number=args.number
+    ))
+    report('write_to_file with a path', timeit.timeit(
+        lambda: file_system.write_to_file(parsed, 'test'), number=args.number
+    ))
+
+
+if __name__ == '__main__':
+    main()
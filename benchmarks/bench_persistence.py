@@ -0,0 +1,67 @@
+import argparse
+import os
+import tempfile
+import time
+
+from file_system.file_system import FileSystem
+
+
+def build(nodes, fan_out):
+    """
+    Returns a file system of about nodes entities: one drive of folders, each holding fan_out text files
+    """
+
+    file_system = FileSystem(path_cache_size=0)
+    file_system.create('drive', 'drive', '')
+
+    count = 1
+    with file_system.batch():
+        while count < nodes:
+            folder = file_system.create('folder', 'folder{}'.format(count), 'drive')
+            count += 1
+            for index in range(min(fan_out, nodes - count)):
+                text = file_system._create_child(folder, 'text', 'text{}'.format(index), None)
+                text.content = 'content of text file {}'.format(count)
+                text.size = len(text.content)
+                count += 1
+            folder.mark_dirty()
+
+    return file_system
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Save and load throughput of the binary image format')
+    parser.add_argument('--nodes', type=int, nargs='+', default=[1000000])
+    parser.add_argument('--fan-out', type=int, default=10, help='text files per folder')
+    args = parser.parse_args()
+
+    for nodes in args.nodes:
+        file_system = build(nodes, args.fan_out)
+
+        with tempfile.TemporaryDirectory() as directory:
+            image_path = os.path.join(directory, 'image.fs')
+
+            started = time.perf_counter()
+            file_system.save(image_path)
+            save_seconds = time.perf_counter() - started
+            image_bytes = os.path.getsize(image_path)
+            del file_system
+
+            started = time.perf_counter()
+            FileSystem.load(image_path)
+            load_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            mapped = FileSystem.load(image_path, lazy=True)
+            mapped.read('drive\\folder1\\text0')
+            lazy_seconds = time.perf_counter() - started
+            del mapped
+
+        print('{} nodes, {:,} byte image'.format(nodes, image_bytes))
+        print('save: {:.2f} s ({:,.0f} nodes/s)'.format(save_seconds, nodes / save_seconds))
+        print('load: {:.2f} s ({:,.0f} nodes/s)'.format(load_seconds, nodes / load_seconds))
+        print('lazy load and first read: {:.3f} s'.format(lazy_seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import math
+import sys
+import timeit
+
+from file_system.file_system import FileSystem
+from file_system.file_system_helpers import path_parse
+
+
+def recurse_sizes(path, current, size):
+    """
+    The original root-down recursive size propagation, kept here as the baseline
+    """
+    if len(path) == 0:
+        return
+
+    new_current = current.get_child(path[0])
+
+    if len(path) == 1:
+        if new_current.entity_type == 'zip':
+            compressed_size = math.ceil(size / 2.0)
+            new_current.size += compressed_size
+            return compressed_size
+        else:
+            new_current.size += size
+            return size
+    elif new_current.entity_type != 'zip':
+        new_size = recurse_sizes(path[1:], new_current, size)
+        new_current.size += new_size
+        return new_size
+    else:
+        new_size = recurse_sizes(path[1:], new_current, size)
+        compressed_size = math.ceil(new_size / 2.0)
+        new_current.size += compressed_size
+        return compressed_size
+
+
+def build_deep_tree(depth, zip_every):
+    """
+    Builds a single chain of containers depth levels deep with a text file at the bottom
+    """
+
+    file_system = FileSystem()
+    parent = file_system.create('drive', 'd', '')
+
+    for level in range(depth):
+        entity_type = 'zip' if zip_every and level % zip_every == 0 else 'folder'
+        parent = file_system.create(entity_type, 'n{}'.format(level), parent.path)
+
+    return file_system, file_system.create('text', 'leaf', parent.path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare recursive and parent-linked size propagation')
+    parser.add_argument('--depth', type=int, default=1000)
+    parser.add_argument('--zip-every', type=int, default=10)
+    parser.add_argument('--number', type=int, default=1000)
+    args = parser.parse_args()
+
+    sys.setrecursionlimit(args.depth * 2 + 1000)
+
+    file_system, leaf = build_deep_tree(args.depth, args.zip_every)
+
+    recursive = timeit.timeit(
+        lambda: recurse_sizes(path_parse(leaf.path), file_system._root, 1), number=args.number
+    )
+    iterative = timeit.timeit(lambda: file_system._update_sizes(leaf, 1), number=args.number)
+
+    print('depth {}, {} updates'.format(args.depth, args.number))
+    print('recursive:    {:.2f} us/update'.format(recursive / args.number * 1e6))
+    print('parent links: {:.2f} us/update'.format(iterative / args.number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
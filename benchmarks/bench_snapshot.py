@@ -0,0 +1,60 @@
+import argparse
+import copy
+import time
+import tracemalloc
+
+from file_system.file_system import FileSystem
+
+
+def build(texts, fan_out):
+    file_system = FileSystem()
+    file_system.create('drive', 'd', '')
+
+    with file_system.batch():
+        for index in range(texts):
+            folder = 'd\\f{}'.format(index // fan_out)
+            if index % fan_out == 0:
+                file_system.create('folder', 'f{}'.format(index // fan_out), 'd')
+            text = file_system.create('text', 't{}'.format(index), folder)
+            text.content = 'content {}'.format(index)
+            text.size = len(text.content)
+            text.parent.mark_dirty()
+
+    return file_system
+
+
+def measure(action):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = action()
+    elapsed = time.perf_counter() - started
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, allocated, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memory kept by a snapshot compared to a deep copy of the tree')
+    parser.add_argument('--texts', type=int, default=100000)
+    parser.add_argument('--fan-out', type=int, default=100, help='text files per folder')
+    parser.add_argument('--writes', type=int, default=1000, help='writes made after the snapshot')
+    args = parser.parse_args()
+
+    file_system = build(args.texts, args.fan_out)
+
+    def snapshot_and_write():
+        snapshot = file_system.snapshot()
+        for index in range(args.writes):
+            file_system.write_to_file('d\\f{}\\t{}'.format(index // args.fan_out, index), 'changed')
+        return snapshot
+
+    snapshot, snapshot_bytes, snapshot_seconds = measure(snapshot_and_write)
+    deep_copy, copy_bytes, copy_seconds = measure(lambda: copy.deepcopy(file_system._root))
+
+    print('{} text files, {} writes after the snapshot'.format(args.texts, args.writes))
+    print('snapshot + writes: {:>12,} bytes {:.3f} s'.format(snapshot_bytes, snapshot_seconds))
+    print('deep copy:         {:>12,} bytes {:.3f} s'.format(copy_bytes, copy_seconds))
+
+
+if __name__ == '__main__':
+    main()
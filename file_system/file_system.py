@@ -1,8 +1,23 @@
-import math
+import os
+import threading
+import weakref
+from contextlib import contextmanager, nullcontext
 
-from file_system.file_system_entities import Root, Drive, Folder, Zip, Text
-from file_system.file_system_exceptions import IllegalFileSystemOperation, PathAlreadyExists, PathNotFound, NotATextFile
-from file_system.file_system_helpers import path_parse, print_recursive
+from file_system.file_system_cache import PathCache
+from file_system.file_system_columnar import ColumnarFileSystem
+from file_system.file_system_content import CompressedContent, TextReader, compress, is_compressed
+from file_system.file_system_entities import NO_CHILDREN, Root, Drive, Folder, Zip, Text
+from file_system.file_system_exceptions import (
+    IllegalFileSystemOperation, PathAlreadyExists, PathNotFound, NotATextFile, InvalidImage
+)
+from file_system.file_system_helpers import FileSystemEntry, parse_path, iter_lines, list_children, walk
+from file_system.file_system_index import NameIndex, TextIndex
+from file_system.file_system_image import load_image, map_image, read_sequence
+from file_system.file_system_journal import IMAGE_FILE, Journal, replay
+from file_system.file_system_locks import LockManager, S, X
+from file_system.file_system_reclaimer import Reclaimer
+from file_system.file_system_snapshot import FileSystemSnapshot
+from file_system.file_system_store import ContentStore
 
 
 class FileSystem:
@@ -16,13 +31,445 @@ class FileSystem:
     If A contains B then A is the parent of B.
     """
 
-    def __init__(self):
+    BACKENDS = ['object', 'columnar']
 
-        self._root = Root('root', 'root', '')
+    # per-item errors that the bulk operations report instead of raising
+    BULK_ERRORS = (IllegalFileSystemOperation, PathAlreadyExists, PathNotFound, NotATextFile)
+
+    # the operations recorded in the journal of a file system opened with FileSystem.open
+    JOURNALED_OPERATIONS = [
+        'create', 'delete', 'move', 'copy', 'rename', 'write_to_file', 'append_to_file', 'write_at', 'truncate'
+    ]
+
+    # the number of resolved paths kept in the path cache by default
+    PATH_CACHE_SIZE = 4096
+
+    # the class of a new entity of each type
+    ENTITY_CLASSES = {'drive': Drive, 'folder': Folder, 'zip': Zip, 'text': Text}
+
+    def __new__(cls, defer_sizes=False, backend='object', path_cache_size=None, thread_safe=False, dedup=False,
+                zip_compression=None, background_reclaim=True):
+        if backend not in cls.BACKENDS:
+            raise IllegalFileSystemOperation('Invalid backend: {}'.format(backend))
+        elif backend == 'columnar':
+            options = {
+                'path_cache_size': path_cache_size is not None, 'thread_safe': thread_safe, 'dedup': dedup,
+                'zip_compression': zip_compression is not None, 'background_reclaim': not background_reclaim
+            }
+            unsupported = [name for name, given in options.items() if given]
+            if unsupported:
+                raise IllegalFileSystemOperation(
+                    'Not supported by the columnar backend: {}'.format(', '.join(unsupported))
+                )
+            return ColumnarFileSystem(defer_sizes)
+        else:
+            return super().__new__(cls)
+
+    def __init__(self, defer_sizes=False, backend='object', path_cache_size=None, thread_safe=False, dedup=False,
+                 zip_compression=None, background_reclaim=True):
+        """
+        :param defer_sizes if True, container sizes are never updated eagerly, they are
+            marked dirty and recomputed when they are next read
+        :param backend 'object' keeps one Python object per entity, 'columnar' returns a
+            ColumnarFileSystem that keeps the whole tree in parallel arrays
+        :param path_cache_size the number of resolved paths kept in the LRU path cache, 0 disables it,
+            PATH_CACHE_SIZE if None
+        :param thread_safe if True, every operation takes hierarchical locks on the entities it works on,
+            so operations on disjoint subtrees run concurrently and size updates are atomic
+        :param dedup if True, text file contents are kept in a reference counted ContentStore, so identical
+            contents are stored once
+        :param zip_compression 'zlib' or 'lzma' to keep the contents of text files under a zip compressed with
+            that codec, they are decompressed when read. Sizes still follow the nominal rules, stored_size
+            reports the bytes actually used.
+        :param background_reclaim if True, deleted subtrees are torn down by a background thread, a bounded
+            number of entities at a time, otherwise only by calls to reclaim
+        """
+
+        if thread_safe and defer_sizes:
+            raise IllegalFileSystemOperation('Deferred sizes are not available in thread safe mode')
+        elif zip_compression is not None and zip_compression not in CompressedContent.CODECS:
+            raise IllegalFileSystemOperation('Invalid zip compression: {}'.format(zip_compression))
+
+        self._path_cache_size = self.PATH_CACHE_SIZE if path_cache_size is None else path_cache_size
+        self._thread_safe = thread_safe
+        self._set_root(Root('root', 'root', ''))
+        self._defer_sizes = defer_sizes
+        self._batch_depth = 0
+        self._content_store = ContentStore() if dedup else None
+        self._zip_compression = zip_compression
+        self._name_index = None  # built by the first find, then kept up to date
+        self._text_index = None  # built by the first grep, then kept up to date
+        self._reclaimer = Reclaimer(self._teardown, background_reclaim)
+
+        # every snapshot ends an epoch, entities keep the states that live snapshots can still see. The epoch,
+        # the live snapshots and the kept states are only changed while holding the snapshot mutex.
+        self._snapshot_mutex = threading.Lock()
+        self._released_snapshots = []  # epochs of released snapshots not accounted for yet
+        self._epoch = 0
+        self._live_snapshots = {}  # epoch -> number of live snapshots taken in it
+        self._newest_snapshot = -1
+        self._oldest_snapshot = -1
+        self._versioned = {}  # epoch -> entities that kept a state ending in it, pruned once no snapshot needs it
+
+        # only set for a file system opened from a directory with FileSystem.open
+        self._directory = None
+        self._journal = None
+        self._compaction = None
+
+    def _set_root(self, root):
+        """
+        Makes root the root of the file system, along with a fresh path cache and lock manager
+        """
+
+        self._root = root
+        self._path_cache = PathCache(root, self._path_cache_size)
+        self._locks = LockManager(root) if self._thread_safe else None
+        self._size_lock = self._locks.size_lock if self._thread_safe else nullcontext()
 
     def __str__(self):
-        string = print_recursive(self._root).splitlines()[1:]
-        return '\n'.join(string)
+        return '\n'.join(self.iter_lines())
+
+    def iter_lines(self, max_depth=None, sort_children=False):
+        """
+        Lazily yields a 'path size' line for every entity below the root, depth first
+        :param max_depth only entities up to max_depth levels below the root are yielded, drives are at depth 1
+        :param sort_children yield children ordered by name instead of by insertion order
+        In thread safe mode the lines come from a snapshot, so the generator holds no locks while it is suspended.
+        """
+
+        if self._locks is not None:
+            return self.snapshot().iter_lines(max_depth, sort_children)
+
+        lines = iter_lines(self._root, max_depth, sort_children)
+        next(lines)  # the root itself is not listed
+        return lines
+
+    def walk(self, path=None, topdown=True, max_depth=None):
+        """
+        Lazily yields a FileSystemEntry for every entity below the entity at path, depth first
+        Entries hold the entity, its name, type, size and depth, the path of an entry is only built when read.
+        The walk uses an explicit stack, so it runs at constant stack depth on trees of any depth.
+        In thread safe mode each container is locked only while its children are listed, so the walk sees
+        the changes made while it is suspended and never blocks them.
+        :param path the entity to walk, the root if None
+        :param topdown yield a container before its descendants if True, after them if False
+        :param max_depth only entities up to max_depth levels below path are yielded, its children are at depth 1
+        """
+
+        with self._locked(lambda: [(self._get_entity_at_path(path), S)]) as (entity,):
+            pass
+
+        return walk(entity, topdown, max_depth, self._list_children)
+
+    def iterdir(self, path=None):
+        """
+        Lazily yields a FileSystemEntry for each child of the container at path, in insertion order
+        The children are listed when iterdir is called.
+        :param path the container to list, the root if None
+        """
+
+        with self._locked(lambda: [(self._get_entity_at_path(path), S)]) as (entity,):
+            if entity.entity_type == 'text':
+                raise IllegalFileSystemOperation('A text file does not contain other entities')
+            children = list_children(entity)
+
+        return (FileSystemEntry(child, 1) for child in children)
+
+    def _list_children(self, container):
+        """
+        Returns the children of a container, listed under a shared lock on it in thread safe mode
+        """
+
+        if self._locks is None:
+            return list_children(container)
+
+        with self._locked(lambda: [(container, S)]):
+            return list_children(container)
+
+    def dump(self, stream, max_depth=None, sort_children=False):
+        """
+        Writes the file system structure to a file-like object, one line at a time
+        :param stream a text stream with a write method
+        """
+
+        for line in self.iter_lines(max_depth, sort_children):
+            stream.write(line)
+            stream.write('\n')
+
+    @contextmanager
+    def batch(self):
+        """
+        Defers size updates for the duration of the block
+        Containers touched inside the block are only marked dirty, and all of their sizes are
+        recomputed in a single bottom-up pass when the outermost batch exits.
+        Sizes read inside the block are recomputed on demand.
+        """
+
+        if self._locks is not None:
+            raise IllegalFileSystemOperation('Batches are not available in thread safe mode')
+
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and not self._defer_sizes:
+                self.flush_sizes()
+
+    def flush_sizes(self):
+        """
+        Recomputes the sizes of all dirty containers
+        """
+
+        for name in self._root.get_names():
+            self._root.get_child(name).size  # reading a dirty size recomputes it
+
+    def snapshot(self):
+        """
+        Returns a read-only FileSystemSnapshot of the file system as it is now, in O(1)
+        Entities modified afterwards keep their previous state for as long as the snapshot is alive.
+        """
+
+        with self._locked(lambda: [(self._root, S)]):
+            return self._snapshot()
+
+    def _snapshot(self):
+        """
+        Takes a snapshot, expects the tree to be locked
+        """
+
+        self.flush_sizes()
+
+        with self._snapshot_mutex:
+            epoch = self._epoch
+            self._epoch += 1
+            self._live_snapshots[epoch] = self._live_snapshots.get(epoch, 0) + 1
+            self._update_live_snapshots()
+        self._account_released_snapshots()
+
+        snapshot = FileSystemSnapshot(self._root, epoch)
+        weakref.finalize(snapshot, self._release_snapshot, epoch)
+
+        return snapshot
+
+    def save(self, image_path):
+        """
+        Saves the file system to a binary image file, see file_system_image for the format
+        The image is written from a snapshot, so operations are not blocked while it is written.
+        :param image_path the path of the image file on disk
+        """
+
+        self.snapshot().save(image_path)
+
+    @classmethod
+    def load(cls, image_path, lazy=False, **options):
+        """
+        Returns a new FileSystem holding the tree saved in an image file
+        Sizes are taken from the image rather than recomputed.
+        :param image_path the path of the image file on disk
+        :param lazy if True, the image is memory-mapped, children are only built when a container is first
+            traversed and text contents are only decoded when first read. The image file must not be
+            modified in place while the file system is in use, save writes a new file and replaces it.
+        :param options the keyword arguments of FileSystem. Without lazy, contents are deduplicated and
+            compressed as the image is loaded, with lazy once they are written.
+        """
+
+        if options.get('backend', 'object') != 'object':
+            raise IllegalFileSystemOperation('Images can only be loaded into the object backend')
+
+        file_system = cls(**options)
+        file_system._set_root(map_image(image_path) if lazy else load_image(image_path))
+
+        if not lazy and (file_system._content_store is not None or file_system._zip_compression is not None):
+            stack = [(file_system._root, False)]
+            while stack:
+                entity, in_zip = stack.pop()
+                if entity.entity_type == 'text':
+                    file_system._set_content(entity, entity.content, in_zip)
+                else:
+                    in_zip = in_zip or entity.entity_type == 'zip'
+                    stack.extend((entity.get_child(name), in_zip) for name in entity.get_names())
+
+        return file_system
+
+    @classmethod
+    def open(cls, directory, commit_every=1, commit_interval=None, lazy=False, **options):
+        """
+        Opens a durable file system kept in a directory, creating it if needed
+        The directory holds the last compacted image and a journal of the operations applied since.
+        Opening loads the image and replays the journal, and every create, delete, move, copy, rename,
+        write_to_file, append_to_file, write_at and truncate is then appended to the journal.
+        Call close when done.
+        :param directory the path of the directory on disk
+        :param commit_every the journal is synced to disk once this many operations are pending
+        :param commit_interval if given, the journal is also synced at most this many seconds after an operation
+        :param lazy memory-map the image, see load
+        :param options the keyword arguments of FileSystem
+        """
+
+        if options.get('backend', 'object') != 'object':
+            raise IllegalFileSystemOperation('Only the object backend can be opened from a directory')
+
+        os.makedirs(directory, exist_ok=True)
+        image_path = os.path.join(directory, IMAGE_FILE)
+
+        if os.path.exists(image_path):
+            file_system = cls.load(image_path, lazy=lazy, **options)
+            sequence = read_sequence(image_path)
+        else:
+            file_system = cls(**options)
+            sequence = 0
+
+        for sequence, operation, arguments in replay(directory, sequence):
+            if operation not in cls.JOURNALED_OPERATIONS:
+                raise InvalidImage('Unknown journaled operation: {}'.format(operation))
+            getattr(file_system, operation)(*arguments)
+
+        file_system._directory = directory
+        file_system._journal = Journal(directory, sequence + 1, commit_every, commit_interval)
+        return file_system
+
+    def compact(self, wait=False):
+        """
+        Folds the journal into a new image of the directory the file system was opened from
+        The image is written from a snapshot by a background thread, so operations are not blocked,
+        and the journal segments it includes are removed once it is in place.
+        :param wait if True, returns once the new image is in place
+        :return the background thread writing the image
+        """
+
+        if self._journal is None:
+            raise IllegalFileSystemOperation('Only a file system opened with FileSystem.open has a journal')
+
+        if self._compaction is not None:
+            self._compaction.join()  # one compaction at a time, so images are replaced in order
+
+        # no operation is in progress while the tree is locked, so the snapshot includes exactly the
+        # operations in the journal segments that are finished here
+        with self._locked(lambda: [(self._root, S)]):
+            snapshot = self._snapshot()
+            sequence = self._journal.rotate()
+
+        self._compaction = threading.Thread(target=self._write_compaction, args=(snapshot, sequence), daemon=True)
+        self._compaction.start()
+        if wait:
+            self._compaction.join()
+        return self._compaction
+
+    def _write_compaction(self, snapshot, sequence):
+        snapshot.save(os.path.join(self._directory, IMAGE_FILE), sequence)
+        self._journal.remove_segments(sequence)
+
+    def close(self):
+        """
+        Waits for a running compaction and commits and closes the journal
+        """
+
+        if self._compaction is not None:
+            self._compaction.join()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def _log(self, operation, *arguments):
+        """
+        Appends an applied operation to the journal, called while the entities it modified are still locked
+        """
+
+        if self._journal is not None:
+            self._journal.append(operation, list(arguments))
+
+    def _release_snapshot(self, epoch):
+        """
+        Called when a snapshot is garbage collected, on whichever thread released it
+        The thread may already hold the snapshot mutex, so the release never waits for it: it is queued and
+        accounted for now if the mutex is free, otherwise by the thread holding it once it lets go.
+        """
+
+        self._released_snapshots.append(epoch)
+        self._account_released_snapshots()
+
+    def _account_released_snapshots(self):
+        """
+        Forgets the queued released snapshots and drops the states they kept, called after the snapshot mutex is let go
+        """
+
+        while self._released_snapshots and self._snapshot_mutex.acquire(blocking=False):
+            try:
+                while self._released_snapshots:
+                    epoch = self._released_snapshots.pop()
+                    self._live_snapshots[epoch] -= 1
+                    if self._live_snapshots[epoch] == 0:
+                        del self._live_snapshots[epoch]
+                self._update_live_snapshots()
+                self._prune_versions()
+
+                # start a new epoch, so the entities modified next keep no state for the released snapshots
+                self._epoch += 1
+            finally:
+                self._snapshot_mutex.release()
+
+    def _update_live_snapshots(self):
+        self._newest_snapshot = max(self._live_snapshots, default=-1)
+        self._oldest_snapshot = min(self._live_snapshots, default=-1)
+
+    def _prune_versions(self):
+        """
+        Drops the states that no live snapshot can see anymore, from the entities that kept them
+        Expects the snapshot mutex to be held. It takes no entity locks: it only replaces the version lists of
+        entities, which snapshot readers re-check.
+        """
+
+        oldest = self._oldest_snapshot
+        for epoch in list(self._versioned):
+            if oldest >= 0 and epoch >= oldest:
+                continue
+
+            for entity in self._versioned.pop(epoch, ()):
+                versions = entity._versions
+                if versions:
+                    entity._versions = [version for version in versions if version[0] >= oldest >= 0] or None
+
+    def _preserve(self, entity):
+        """
+        Keeps the current state of entity for the live snapshots, called before entity is modified
+        The state is kept at most once per epoch, and only if a live snapshot was taken after it began.
+        """
+
+        with self._snapshot_mutex:
+            epoch = self._epoch
+            if entity._version_epoch != epoch:
+                versions = entity._versions
+                if versions:
+                    # drop the states that no live snapshot can see anymore
+                    versions = [version for version in versions if version[0] >= self._oldest_snapshot >= 0] or None
+
+                if self._newest_snapshot >= entity._version_epoch:
+                    versions = versions or []
+                    versions.append((epoch - 1, entity.freeze()))
+                    self._versioned.setdefault(epoch - 1, []).append(entity)
+
+                entity._versions = versions
+                entity._version_epoch = epoch
+
+        if self._released_snapshots:
+            self._account_released_snapshots()
+
+    def _preserve_children(self, container):
+        """
+        Keeps the current state of container for the live snapshots, called before its children change
+        """
+
+        self._preserve(container)
+        container.unshare_children()
+
+    def _detach_children(self, container):
+        """
+        Empties a container of a detached subtree while it is torn down, returning its children
+        """
+
+        self._preserve(container)
+        return container.detach_children()
 
     def create(self, entity_type, name, path_of_parent):
         """
@@ -33,44 +480,81 @@ class FileSystem:
         :return entity newly created entity
         """
 
+        # validate target path exists and find the target parent entity
+        parent_path = self._parent_path(path_of_parent)
+        with self._locked(lambda: [(self._get_entity_at_path(parent_path), X)]) as (target_parent,):
+            new_entity = self._create_child(target_parent, entity_type, name, path_of_parent)
+            self._log('create', entity_type, name, str(parse_path(parent_path)))
+            return new_entity
+
+    def create_many(self, entities):
+        """
+        Creates many entities, resolving each distinct parent path only once
+        Entities are created grouped by parent, in the order each parent first appears.
+        A failing entity does not stop the others from being created.
+        :param entities iterable of (entity_type, name, path_of_parent) tuples
+        :return list with, for each tuple in order, the newly created entity or the exception it raised
+        """
+
+        entities = list(entities)
+        results = [None] * len(entities)
+
+        groups = {}
+        for index, (entity_type, name, path_of_parent) in enumerate(entities):
+            groups.setdefault(parse_path(self._parent_path(path_of_parent)), []).append(index)
+
+        for parent_path, indexes in groups.items():
+            try:
+                with self._locked(lambda: [(self._get_entity_at_path(parent_path), X)]) as (target_parent,):
+                    for index in indexes:
+                        entity_type, name, path_of_parent = entities[index]
+                        try:
+                            results[index] = self._create_child(target_parent, entity_type, name, path_of_parent)
+                        except self.BULK_ERRORS as error:
+                            results[index] = error
+                        else:
+                            self._log('create', entity_type, name, str(parent_path))
+            except PathNotFound as error:
+                for index in indexes:
+                    results[index] = error
+
+        return results
+
+    def _parent_path(self, path_of_parent):
+        """
+        Maps the root identifiers onto the empty path
+        """
+
         roots = [None, '', '\\', 'root']  # possible paths for root
 
         if path_of_parent in roots:
-            path_of_parent = ''
+            return ''
+        return path_of_parent
 
-        # validate target path exists and find the target parent entity
-        try:
-            target_parent = self._get_entity_at_path(path_of_parent)
-        except Exception:
-            raise
+    def _create_child(self, target_parent, entity_type, name, path_of_parent):
+        """
+        Creates a new entity under an already resolved parent
+        """
+
+        if target_parent.entity_type == 'text':
+            raise IllegalFileSystemOperation('A text file cannot contain other entities')
 
         # check that target parent doesn't already contain an entity with the same name
         if name in target_parent.get_names():
             raise PathAlreadyExists('An entity with that name already exists in {}'.format(path_of_parent))
 
-        # concatenate the path of the new entity
-        if target_parent.path == '':
-            new_path = name
-        else:
-            new_path = '{current_path}\\{name}'.format(current_path=target_parent.path, name=name)
-
-        # create new entity
-        try:
-            if entity_type == 'drive':
-                new_entity = Drive(entity_type, name, new_path)
-            elif entity_type == 'folder':
-                new_entity = Folder(entity_type, name, new_path)
-            elif entity_type == 'zip':
-                new_entity = Zip(entity_type, name, new_path)
-            elif entity_type == 'text':
-                new_entity = Text(entity_type, name, new_path)
-            else:
-                raise IllegalFileSystemOperation('Invalid entity_type: {}'.format(entity_type))
-        except Exception:
-            raise
+        # create new entity, its path is derived from the parent once attached
+        entity_class = self.ENTITY_CLASSES.get(entity_type)
+        if entity_class is None:
+            raise IllegalFileSystemOperation('Invalid entity_type: {}'.format(entity_type))
+        new_entity = entity_class(entity_type, name)
 
         # add new entity to it's target parent
+        self._preserve_children(target_parent)
+        new_entity._version_epoch = self._epoch
         target_parent.add_child(new_entity)
+        if self._name_index is not None:
+            self._name_index.add(new_entity)
 
         return new_entity
 
@@ -80,59 +564,220 @@ class FileSystem:
         :param path path to the entity to be deleted
         """
 
-        # validate target path and find the target parent entity
-        target_path = path_parse(path)
-        base_path = '\\'.join(target_path[:-1])
-        name = target_path[-1]
+        # validate target path and find the target entity and its parent
+        with self._locked(lambda: self._with_parent(self._get_entity_at_path(path))) as (entity, parent):
+            if entity.parent is None:
+                raise IllegalFileSystemOperation('The root cannot be deleted')
 
-        try:
-            parent = self._get_entity_at_path(base_path)
-        except Exception:
-            raise
+            # decrement the sizes of ancestors
+            self._update_sizes(parent, (entity.size * -1))
+
+            # delete child
+            self._preserve_children(parent)
+            parent.delete_child(entity.name)
+            self._reclaim(entity)
+            self._log('delete', str(parse_path(path)))
 
-        # decrement the sizes of ancestors
-        self._update_sizes(parent.path, (parent.get_child(name).size * -1))
+    def delete_many(self, paths):
+        """
+        Deletes many entities, resolving each distinct parent path only once
+        The sizes of a parent's ancestors are updated once for all of the entities deleted from it.
+        A failing path does not stop the others from being deleted.
+        :param paths iterable of paths to the entities to be deleted
+        :return list with, for each path in order, None or the exception it raised
+        """
 
-        # delete child
-        parent.delete_child(name)
+        paths = [parse_path(path) for path in paths]
+        results = [None] * len(paths)
+
+        groups = {}
+        for index, path in enumerate(paths):
+            groups.setdefault(path.parent, []).append(index)
+
+        for parent_path, indexes in groups.items():
+            try:
+                with self._locked(lambda: [(self._get_entity_at_path(parent_path), X)]) as (parent,):
+                    size_delta = 0
+                    try:
+                        for index in indexes:
+                            name = paths[index].name
+                            if not paths[index]:
+                                results[index] = IllegalFileSystemOperation('The root cannot be deleted')
+                            elif parent.entity_type == 'text' or name not in parent.get_names():
+                                results[index] = PathNotFound('Invalid target path')
+                            else:
+                                child = parent.get_child(name)
+                                size_delta -= child.size
+                                self._preserve_children(parent)
+                                parent.delete_child(name)
+                                self._reclaim(child)
+                                self._log('delete', str(paths[index]))
+                    finally:
+                        # decrement the sizes of ancestors once for the whole group, even if an item raised
+                        self._update_sizes(parent, size_delta)
+            except PathNotFound as error:
+                for index in indexes:
+                    results[index] = error
+
+        return results
 
     def move(self, source_path, destination_path):
         """
         Change the parent of an entity
+        Only the moved entity is re-linked, the paths of its descendants are derived from it
         :param source_path the path to the entity to be moved
         :param destination_path the parent to move the entity under
         """
 
-        # find source parent and child
-        target_path = path_parse(source_path)
-        source_parent_path = '\\'.join(target_path[:-1])
-        source_child = target_path[-1]
+        # find source entity, its parent and the destination entity
+        def resolve():
+            return self._with_parent(self._get_entity_at_path(source_path)) + [
+                (self._get_entity_at_path(destination_path), X)
+            ]
 
-        try:
-            source_parent = self._get_entity_at_path(source_parent_path)
-        except Exception:
-            raise
+        with self._locked(resolve) as (source_child_entity, source_parent, destination_entity):
+            if source_child_entity.parent is None:
+                raise IllegalFileSystemOperation('The root cannot be moved')
 
-        # find destination entity
-        try:
-            destination_entity = self._get_entity_at_path(destination_path)
-        except Exception:
-            raise
-
-        # if the destination does not already contain an entity of the source's name, move it.
-        if source_child not in destination_entity.get_names():
-            source_child_entity = source_parent.get_child(source_child)
-
-            self._update_sizes(source_parent.path, (source_child_entity.size * -1))  # dec sizes of sources ancestors
-            self._update_sizes(destination_entity.path, source_child_entity.size)  # inc sizes of destinations ancestors
-
-            # add reference to child at destination and update paths
-            destination_entity.add_child(source_child_entity)
-            source_child_entity.path = destination_entity.path + '\\' + source_child_entity.name
-            # delete reference at source and update paths
-            source_parent.delete_child(source_child_entity.name)
+            # an entity cannot be moved underneath itself
+            ancestor = destination_entity
+            while ancestor is not None:
+                if ancestor is source_child_entity:
+                    raise IllegalFileSystemOperation('Cannot move an entity into itself or one of its descendants')
+                ancestor = ancestor.parent
+
+            if destination_entity.entity_type == 'text':
+                raise IllegalFileSystemOperation('A text file cannot contain other entities')
+
+            # if the destination does not already contain an entity of the source's name, move it.
+            if source_child_entity.name not in destination_entity.get_names():
+                # add reference to child at destination, this validates the move before any sizes change
+                self._preserve_children(destination_entity)
+                destination_entity.add_child(source_child_entity)
+                # delete reference at source
+                self._preserve_children(source_parent)
+                source_parent.delete_child(source_child_entity.name)
+
+                self._update_sizes(source_parent, (source_child_entity.size * -1))  # dec sizes of sources ancestors
+                self._update_sizes(destination_entity, source_child_entity.size)  # inc sizes of destinations ancestors
+
+                if self._zip_compression is not None:
+                    in_zip = self._in_zip(destination_entity)
+                    if in_zip != self._in_zip(source_parent):
+                        self._recode_contents(source_child_entity, in_zip)
+                self._log('move', str(parse_path(source_path)), str(parse_path(destination_path)))
+            else:
+                raise PathAlreadyExists('Destination already has an entity with the source\'s name')
+
+    def copy(self, source_path, destination_path):
+        """
+        Copies an entity and everything below it under a destination container
+        Text contents are shared between the originals and the copies instead of being duplicated, and the
+        copied subtree's size is added to the destination's ancestors in a single update.
+        :param source_path the path to the entity to be copied
+        :param destination_path the parent to copy the entity under
+        :return the copy of the entity
+        """
+
+        def resolve():
+            return [(self._get_entity_at_path(source_path), S), (self._get_entity_at_path(destination_path), X)]
+
+        with self._locked(resolve) as (source_entity, destination_entity):
+            if source_entity.parent is None:
+                raise IllegalFileSystemOperation('The root cannot be copied')
+
+            # an entity cannot be copied underneath itself
+            ancestor = destination_entity
+            while ancestor is not None:
+                if ancestor is source_entity:
+                    raise IllegalFileSystemOperation('Cannot copy an entity into itself or one of its descendants')
+                ancestor = ancestor.parent
+
+            if destination_entity.entity_type == 'text':
+                raise IllegalFileSystemOperation('A text file cannot contain other entities')
+            elif source_entity.name in destination_entity.get_names():
+                raise PathAlreadyExists('Destination already has an entity with the source\'s name')
+
+            # attaching the top of the copy validates it before anything else is copied
+            in_zip = self._zip_compression is not None and self._in_zip(destination_entity)
+            copy = self._copy_entity(source_entity)
+            self._preserve_children(destination_entity)
+            destination_entity.add_child(copy)
+
+            stack = [(source_entity, copy, in_zip)]
+            while stack:
+                original, current, in_zip = stack.pop()
+                if self._name_index is not None:
+                    self._name_index.add(current)
+
+                if original.entity_type == 'text':
+                    self._copy_content(original, current, in_zip)
+                    continue
+
+                in_zip = in_zip or (self._zip_compression is not None and original.entity_type == 'zip')
+                for name in original.get_names():
+                    child = original.get_child(name)
+                    child_copy = self._copy_entity(child)
+                    current._attach(child_copy)
+                    stack.append((child, child_copy, in_zip))
+
+            self._update_sizes(destination_entity, copy.size)  # inc sizes of destinations ancestors
+            self._log('copy', str(parse_path(source_path)), str(parse_path(destination_path)))
+            return copy
+
+    def _copy_entity(self, entity):
+        """
+        Returns a detached copy of entity, with its sizes but without its children or content
+        """
+
+        copy = self.ENTITY_CLASSES[entity.entity_type](entity.entity_type, entity.name)
+        copy._version_epoch = self._epoch
+        if entity.entity_type == 'text':
+            copy.size = entity.size
+        else:
+            copy.raw_size = entity.raw_size
+        return copy
+
+    def _copy_content(self, original, copy, in_zip):
+        """
+        Gives a copied text file the content of the original, shared rather than duplicated where possible
+        :param in_zip whether the copy is under a zip, only meaningful when zip compression is on
+        """
+
+        # the frozen content is safe to share, an edited content is copied before either file next edits it
+        content = original.freeze().content
+        if content.__class__ is str or (
+                self._zip_compression is not None and in_zip != is_compressed(content)):
+            self._set_content(copy, str(content), in_zip)  # a str is shared through the content store, if any
         else:
-            raise PathAlreadyExists('Destination already has an entity with the source\'s name')
+            if self._text_index is not None:
+                self._text_index.update(copy, '', str(content))
+            copy.content = content
+
+    def rename(self, path, new_name):
+        """
+        Change the name of an entity
+        The paths of its descendants are derived from it, so they are not rewritten
+        :param path the path to the entity to be renamed
+        :param new_name the new name of the entity
+        """
+
+        # find target entity and its parent
+        with self._locked(lambda: self._with_parent(self._get_entity_at_path(path))) as (entity, parent):
+            if entity.parent is None:
+                raise IllegalFileSystemOperation('The root cannot be renamed')
+
+            # the parent raises PathAlreadyExists if a sibling already has the new name
+            self._preserve(entity)
+            self._preserve_children(parent)
+            if self._name_index is not None:
+                self._name_index.remove(entity)
+            try:
+                entity.name = new_name
+            finally:
+                if self._name_index is not None:
+                    self._name_index.add(entity)
+            self._log('rename', str(parse_path(path)), new_name)
 
     def write_to_file(self, path, content):
         """
@@ -142,74 +787,488 @@ class FileSystem:
         """
 
         # find target entity
-        try:
-            file = self._get_entity_at_path(path)
-        except Exception:
-            raise
+        with self._locked(lambda: [(self._get_entity_at_path(path), X)]) as (file,):
+            # ensure we are writing to a text entity
+            if file.entity_type != 'text':
+                raise NotATextFile('Cannot write content to a non-text entity')
+            else:
+                size_delta = len(content) - file.size  # calculate the delta in size based on the new content
+                self._preserve(file)
+                self._set_content(file, content)  # update the content
+                self._update_sizes(file, size_delta)  # update sizes of all ancestors based on size delta
+                self._log('write_to_file', str(parse_path(path)), content)
+
+    def append_to_file(self, path, data):
+        """
+        Appends to the content of a text file, in time proportional to the size of data
+        :param path path to the text file to append to
+        :param data the string appended to its content
+        """
+
+        with self._locked(lambda: [(self._get_entity_at_path(path), X)]) as (file,):
+            if file.entity_type != 'text':
+                raise NotATextFile('Cannot write content to a non-text entity')
+
+            self._preserve(file)
+            self._edit_content(file, file.append, data)
+            self._update_sizes(file, len(data))
+            self._log('append_to_file', str(parse_path(path)), data)
+
+    def write_at(self, path, offset, data):
+        """
+        Overwrites part of the content of a text file, in time proportional to the size of data
+        Data that runs past the end of the content extends it.
+        :param path path to the text file to write to
+        :param offset the offset in the content where data is written, at most the size of the file
+        :param data the string written at offset
+        """
+
+        with self._locked(lambda: [(self._get_entity_at_path(path), X)]) as (file,):
+            if file.entity_type != 'text':
+                raise NotATextFile('Cannot write content to a non-text entity')
+            elif not 0 <= offset <= file.size:
+                raise IllegalFileSystemOperation('Offset {} is outside of the file'.format(offset))
+
+            size_delta = max(offset + len(data) - file.size, 0)
+            self._preserve(file)
+            self._edit_content(file, file.write_at, offset, data)
+            self._update_sizes(file, size_delta)
+            self._log('write_at', str(parse_path(path)), offset, data)
+
+    def truncate(self, path, length):
+        """
+        Cuts the content of a text file down to its first length characters
+        :param path path to the text file to truncate
+        :param length the new size of the file, at most its current size
+        """
+
+        with self._locked(lambda: [(self._get_entity_at_path(path), X)]) as (file,):
+            if file.entity_type != 'text':
+                raise NotATextFile('Cannot write content to a non-text entity')
+            elif not 0 <= length <= file.size:
+                raise IllegalFileSystemOperation('Cannot truncate a file of size {} to {}'.format(file.size, length))
+
+            size_delta = length - file.size
+            self._preserve(file)
+            self._edit_content(file, file.truncate, length)
+            self._update_sizes(file, size_delta)
+            self._log('truncate', str(parse_path(path)), length)
+
+    def read(self, path):
+        """
+        Returns the content of a text file
+        :param path path to the text file to be read
+        """
+
+        # find target entity
+        with self._locked(lambda: [(self._get_entity_at_path(path), S)]) as (file,):
+            # ensure we are reading from a text entity
+            if file.entity_type != 'text':
+                raise NotATextFile('Cannot read content from a non-text entity')
+            return file.content
+
+    def open_read(self, path):
+        """
+        Opens a text file for streaming reads
+        The returned TextReader supports read(n), readline(), iteration over lines and seek, and serves the
+        content piece by piece without joining it into one string. It sees the content as it was when opened.
+        :param path path to the text file to be read
+        """
+
+        with self._locked(lambda: [(self._get_entity_at_path(path), S)]) as (file,):
+            if file.entity_type != 'text':
+                raise NotATextFile('Cannot read content from a non-text entity')
+            return TextReader(file.chunk_source(), file.size)
+
+    def write_many(self, writes):
+        """
+        Changes the content of many text files, resolving each distinct parent path only once
+        The sizes of a parent's ancestors are updated once for all of the files written under it.
+        A failing write does not stop the others from being applied.
+        :param writes iterable of (path, content) tuples
+        :return list with, for each tuple in order, None or the exception it raised
+        """
+
+        writes = [(parse_path(path), content) for path, content in writes]
+        results = [None] * len(writes)
+
+        groups = {}
+        for index, (path, content) in enumerate(writes):
+            groups.setdefault(path.parent, []).append(index)
+
+        for parent_path, indexes in groups.items():
+            try:
+                with self._locked(lambda: [(self._get_entity_at_path(parent_path), X)]) as (parent,):
+                    size_delta = 0
+                    try:
+                        for index in indexes:
+                            path, content = writes[index]
+                            if not path or parent.entity_type == 'text' or path.name not in parent.get_names():
+                                results[index] = PathNotFound('Invalid target path')
+                                continue
+
+                            file = parent.get_child(path.name)
+                            if file.entity_type != 'text':
+                                results[index] = NotATextFile('Cannot write content to a non-text entity')
+                                continue
+
+                            file_delta = len(content) - file.size
+                            self._preserve(file)
+                            self._set_content(file, content)
+                            file.size += file_delta
+                            size_delta += file_delta
+                            self._log('write_to_file', str(path), content)
+                    finally:
+                        # update the sizes of ancestors once for the whole group, even if an item raised
+                        self._update_sizes(parent, size_delta)
+            except PathNotFound as error:
+                for index in indexes:
+                    results[index] = error
+
+        return results
+
+    def find(self, pattern, under=None, entity_type=None):
+        """
+        Returns the entities whose names match a glob pattern, ordered by path, without walking the tree
+        The first call builds a name index of the whole tree, which is kept up to date from then on.
+        :param pattern a glob pattern matched against entity names, see fnmatch, e.g. 'config*'
+        :param under only entities below the entity at this path are returned
+        :param entity_type only entities of this type are returned
+        """
+
+        if self._name_index is None:
+            with self._locked(lambda: [(self._root, S)]):
+                if self._name_index is None:
+                    self._name_index = self._build_name_index()
+
+        with self._locked(lambda: [(self._get_entity_at_path(under), S)]) as (ancestor,):
+            return self._sorted_under(ancestor, (
+                entity for entity in self._name_index.match(pattern)
+                if entity_type is None or entity.entity_type == entity_type
+            ))
+
+    def grep(self, query, under=None):
+        """
+        Returns the text files whose contents match a query, ordered by path, without reading any content
+        The first call builds a full-text index of every text file, which is kept up to date from then on.
+        :param query space separated terms that must all match: a word, a word ending in '*' matching the words
+            it starts, or a "quoted phrase". Matching ignores case and punctuation.
+        :param under only text files below the entity at this path are returned
+        """
+
+        if self._text_index is None:
+            with self._locked(lambda: [(self._root, S)]):
+                if self._text_index is None:
+                    self._text_index = self._build_text_index()
+
+        with self._locked(lambda: [(self._get_entity_at_path(under), S)]) as (ancestor,):
+            return self._sorted_under(ancestor, self._text_index.search(query))
+
+    def _sorted_under(self, ancestor, entities):
+        """
+        Returns the entities below ancestor, ordered by path
+        """
+
+        results = []
+        for entity in entities:
+            current = entity.parent
+            while current is not None and current is not ancestor:
+                current = current.parent
+            if current is ancestor:
+                results.append(entity)
+
+        return sorted(results, key=lambda entity: entity.path)
+
+    def _build_text_index(self):
+        """
+        Returns a TextIndex of every text file, expects the tree to be locked
+        """
+
+        text_index = TextIndex()
+        stack = [self._root]
+        while stack:
+            entity = stack.pop()
+            if entity.entity_type == 'text':
+                text_index.update(entity, '', entity.content)
+            else:
+                stack.extend(entity.get_child(name) for name in entity.get_names())
+        return text_index
+
+    def _build_name_index(self):
+        """
+        Returns a NameIndex of every entity below the root, expects the tree to be locked
+        """
+
+        name_index = NameIndex()
+        stack = [self._root.get_child(name) for name in self._root.get_names()]
+        while stack:
+            entity = stack.pop()
+            name_index.add(entity)
+            if entity.entity_type != 'text':
+                stack.extend(entity.get_child(name) for name in entity.get_names())
+        return name_index
+
+    def content_store_info(self):
+        """
+        Reports the references, distinct contents, logical and stored bytes, bytes saved and dedup ratio
+        of the content store, or None if contents are not deduplicated
+        """
+
+        return self._content_store.info() if self._content_store is not None else None
+
+    def _set_content(self, file, content, in_zip=None):
+        """
+        Replaces the content of a text file, compressed if it is under a zip and zip compression is on,
+        otherwise through the content store if contents are deduplicated
+        :param in_zip whether the file is under a zip, looked up if None
+        """
+
+        if self._text_index is not None:
+            self._text_index.update(file, file.content, content)
+        if self._content_store is not None:
+            self._content_store.release(file._content)
+
+        if self._zip_compression is not None:
+            if in_zip is None:
+                in_zip = self._in_zip(file)
+            if in_zip:
+                content = compress(content, self._zip_compression)
+                if content.__class__ is CompressedContent:
+                    file.content = content  # compressed contents are not deduplicated
+                    return
+
+        if self._content_store is not None:
+            content = self._content_store.add(content)
+        file.content = content
+
+    def _in_zip(self, entity):
+        """
+        Whether entity is a zip or inside one
+        """
+
+        ancestor = entity
+        while ancestor is not None:
+            if ancestor.entity_type == 'zip':
+                return True
+            ancestor = ancestor.parent
+        return False
+
+    def _recode_contents(self, entity, in_zip):
+        """
+        Compresses or decompresses the text files of a subtree that was moved into or out of a zip
+        :param in_zip whether entity is now inside a zip
+        """
+
+        stack = [(entity, in_zip)]
+        while stack:
+            current, in_zip = stack.pop()
+            if current.entity_type == 'text':
+                if in_zip != is_compressed(current._content):
+                    self._preserve(current)
+                    self._set_content(current, current.content, in_zip)
+            else:
+                in_zip = in_zip or current.entity_type == 'zip'
+                stack.extend((current.get_child(name), in_zip) for name in current.get_names())
+
+    def stored_size(self, path):
+        """
+        Returns the bytes the contents of the text files at or below path take: the compressed size of a
+        compressed content and the UTF-8 encoded size of any other
+        """
+
+        with self._locked(lambda: [(self._get_entity_at_path(path), S)]) as (entity,):
+            total = 0
+            stack = [entity]
+            while stack:
+                current = stack.pop()
+                if current.entity_type == 'text':
+                    content = current._content
+                    if is_compressed(content):
+                        total += content.compressed_size
+                    else:
+                        total += len(current.content.encode('utf-8'))
+                else:
+                    stack.extend(current.get_child(name) for name in current.get_names())
+            return total
+
+    def _edit_content(self, file, edit, *arguments):
+        """
+        Edits the content of a text file in place, keeping the content store and the text index in step
+        Under a compressing zip the edited content is kept as compressed chunks.
+        :param edit the bound edit method of the file, called with arguments
+        """
 
-        # ensure we are writing to a text entity
-        if file.entity_type != 'text':
-            raise NotATextFile('Cannot write content to a non-text entity')
+        if self._content_store is not None:
+            self._content_store.release(file._content)
+
+        codec = self._zip_compression if self._zip_compression is not None and self._in_zip(file) else None
+        old_content = file.content if self._text_index is not None else None
+        edit(*arguments, codec=codec)
+        if self._text_index is not None:
+            self._text_index.update(file, old_content, file.content)
+
+    def reclaim(self, budget=None):
+        """
+        Tears down deleted subtrees on the calling thread
+        Deleted entities are dropped from the indexes and the content store as they are torn down.
+        :param budget the most entities torn down, all that are left if None
+        :return whether deleted subtrees are left to tear down
+        """
+
+        if budget is None:
+            self._reclaimer.drain()
+            return False
+        return self._reclaimer.step(budget)
+
+    def _reclaim(self, entity):
+        """
+        Tears down a deleted entity, a text file or an empty container at once and any other in the reclaimer
+        """
+
+        if entity.entity_type == 'text' or entity._children is NO_CHILDREN:
+            self._teardown(entity, self._text_index)
         else:
-            size_delta = len(content) - len(file.content)  # calculate the delta in size based on the new content
-            file.content = content  # update the content
-            self._update_sizes(path, size_delta)  # update sizes of all ancestors based on size delta
+            self._reclaimer.add(entity, self._text_index)
+
+    def _teardown(self, entity, text_index):
+        """
+        Drops a deleted entity from the name index, and a text file from the text index and the content store,
+        and empties a container
+        :param text_index the text index when the entity was deleted, a file deleted before it was built is not in it
+        :return the children of the entity, still to be torn down
+        """
+
+        if self._name_index is not None:
+            self._name_index.remove(entity)
+
+        if entity.entity_type != 'text':
+            return self._detach_children(entity)
+
+        if text_index is not None:
+            text_index.update(entity, entity.content, '')
+        if self._content_store is not None:
+            self._content_store.release(entity._content)
+        return ()
 
     def _get_entity_at_path(self, path):
         """
-        Given a path string, returns the entity at the path
+        Given a path string or FileSystemPath, returns the entity at the path
+        Resolved paths are kept in an LRU cache, which only returns entities that are still at that path
         """
 
-        current_entity = self._root
+        path_list = parse_path(path)
+        if not path_list:
+            return self._root
+
+        cached_entity = self._path_cache.get(path_list)
+        if cached_entity is not None:
+            return cached_entity
 
-        path_list = path_parse(path)
+        generation = self._path_cache.stamp()
+        current_entity = self._root
         for entity in path_list:
-            if entity in current_entity.get_names():
+            if current_entity.entity_type != 'text' and entity in current_entity.get_names():
                 current_entity = current_entity.get_child(entity)
             else:
                 raise PathNotFound('Invalid target path')
 
+        self._path_cache.put(path_list, current_entity, generation)
         return current_entity
 
-    def _update_sizes(self, path, size):
+    def _locked(self, resolve):
         """
-        Updates sizes of all entities in the path by size
+        Returns a context manager giving the entities an operation works on
+        In thread safe mode the entities are locked for the duration of the block, see LockManager.locked
+        :param resolve callable returning a list of (entity, lock mode) tuples
         """
 
-        path_list = path_parse(path)
-        self._recurse_sizes(path_list, self._root, size)
+        if self._locks is None:
+            return nullcontext([entity for entity, mode in resolve()])
+        return self._locks.locked(resolve)
 
-    def _recurse_sizes(self, path, current, size):
+    def _with_parent(self, entity):
         """
-        Recursively update the sizes of ancestors
-        Base Case: Final entity in a path, update by size, and return size
-        Recursive Case Non-Zip: Recurse with rest of path, new current entity, and size value
-            Update size by returned value
-        Recursive Case Zip: Recurse with rest of path, new current entity, and size value
-            Update size by math.ceil(returned value/2.0)
+        Lock targets for an operation that changes an entity's place in its parent
         """
-        if len(path) == 0:
-            return
 
-        new_current = current.get_child(path[0])
+        return [(entity, X), (entity.parent or entity, X)]
 
-        # Base Case
-        if len(path) == 1:
-            if new_current.entity_type == 'zip':
-                compressed_size = math.ceil(size / 2.0)
-                new_current.size += compressed_size
-                return compressed_size
+    def path_cache_info(self):
+        """
+        Reports the hits, misses, invalidations, maximum size and current size of the path cache
+        """
+
+        return self._path_cache.info()
+
+    def _update_sizes(self, entity, size):
+        """
+        Updates the size of entity by size, and the sizes of all of its ancestors accordingly
+        For a container, size is the change in the sum of its children's sizes.
+        Walks up the parent links in a single pass. Every container keeps the exact sum of its
+        children's sizes and derives its own size from it, so a Zip stays at exactly half of
+        its children no matter how many updates pass through it.
+        The walk stops as soon as an entity's size does not change. The root does not track a size.
+        When sizes are deferred, the ancestors are only marked dirty.
+        """
+
+        with self._size_lock:
+            if entity.entity_type == 'text':
+                self._preserve(entity)
+                entity.size += size
+                entity = entity.parent
+
+            if self._defer_sizes or self._batch_depth:
+                entity.mark_dirty(self._preserve)
+                return
+
+            epoch = self._epoch
+            current = entity
+            while size and current.parent is not None:
+                if current._version_epoch != epoch:
+                    self._preserve(current)
+                old_size = current.size
+                current.raw_size += size
+                size = current.size - old_size
+                current = current.parent
+
+    def verify_sizes(self):
+        """
+        Audits every cached size against the sizes of the entities' contents, in a single pass
+        :return list of the paths of entities whose cached size is wrong, empty if all sizes are exact
+        """
+
+        with self._locked(lambda: [(self._root, S)]):
+            self.flush_sizes()
+            return self._verify_sizes()
+
+    def _verify_sizes(self):
+        """
+        The audit behind verify_sizes, expects the sizes to be flushed and the tree to be locked
+        """
+
+        mismatches = []
+        true_sizes = {}  # id(entity) -> true size, for the children of containers not yet finished
+
+        # iterative post-order walk, a container is finished once all of its children have been
+        stack = [(self._root.get_child(name), False) for name in self._root.get_names()]
+        while stack:
+            entity, children_done = stack.pop()
+
+            if entity.entity_type == 'text':
+                true_size = len(entity.content)
+                if entity.size != true_size:
+                    mismatches.append(entity.path)
+                true_sizes[id(entity)] = true_size
+            elif not children_done:
+                stack.append((entity, True))
+                stack.extend((entity.get_child(name), False) for name in entity.get_names())
             else:
-                new_current.size += size
-                return size
-        # Recursive Case Non-Zip
-        elif new_current.entity_type != 'zip':
-            new_size = self._recurse_sizes(path[1:], new_current, size)
-            new_current.size += new_size
-            return new_size
-        # Recursive Case Zip
-        else:
-            new_size = self._recurse_sizes(path[1:], new_current, size)
-            compressed_size = math.ceil(new_size/2.0)
-            new_current.size += compressed_size
-            return compressed_size
+                raw_size = 0
+                for name in entity.get_names():
+                    raw_size += true_sizes.pop(id(entity.get_child(name)))
+                true_size = entity.compressed_size(raw_size)
+                if entity.raw_size != raw_size or entity.size != true_size:
+                    mismatches.append(entity.path)
+                true_sizes[id(entity)] = true_size
+
+        return mismatches
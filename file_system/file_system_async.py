@@ -0,0 +1,124 @@
+import asyncio
+
+from file_system.file_system import FileSystem
+from file_system.file_system_helpers import parse_path
+
+
+class AsyncFileSystem:
+    """
+    An asyncio front-end for a FileSystem
+
+    Operations run directly on the event loop thread, since they cost time proportional to the depth of
+    the entities involved, so there is no executor hop. Writes are queued and applied together once per
+    event loop tick: concurrent writes to the same text file are coalesced into the last one, and the
+    sizes are propagated once per parent for the whole tick. Every other operation first applies the
+    queued writes, so operations take effect in the order they were awaited.
+    Deleting a subtree detaches it immediately and then tears it down in slices, yielding to the event
+    loop between them.
+    """
+
+    def __init__(self, file_system=None, teardown_slice=1000):
+        """
+        :param file_system the FileSystem to operate on, a new one that only reclaims deleted subtrees
+            on the event loop if None
+        :param teardown_slice the number of deleted entities torn down between yields to the event loop
+        """
+
+        self._file_system = file_system if file_system is not None else FileSystem(background_reclaim=False)
+        self._teardown_slice = teardown_slice
+        self._pending_writes = {}  # FileSystemPath -> (content, [futures])
+        self._flush_handle = None
+
+    @property
+    def file_system(self):
+        return self._file_system
+
+    async def create(self, entity_type, name, path_of_parent):
+        self.flush()
+        return self._file_system.create(entity_type, name, path_of_parent)
+
+    async def move(self, source_path, destination_path):
+        self.flush()
+        self._file_system.move(source_path, destination_path)
+
+    async def rename(self, path, new_name):
+        self.flush()
+        self._file_system.rename(path, new_name)
+
+    async def read(self, path):
+        self.flush()
+        return self._file_system.read(path)
+
+    async def delete(self, path):
+        """
+        Deletes an entity, tearing its subtree down cooperatively
+        """
+
+        self.flush()
+
+        self._file_system.delete(path)
+
+        # the subtree is detached at once, tear it down a slice at a time so it is never freed in one
+        # long recursive pass. A file system reclaiming in the background shares the work with its thread.
+        while self._file_system.reclaim(self._teardown_slice):
+            await asyncio.sleep(0)
+
+    async def write_to_file(self, path, content):
+        """
+        Queues a write, which is applied with all other writes of this event loop tick
+        Content that is not a string raises at once, so it never fails the other writes of the tick.
+        """
+
+        if not isinstance(content, str):
+            raise TypeError('Content must be a string, not {}'.format(type(content).__name__))
+
+        path = parse_path(path)
+        future = asyncio.get_running_loop().create_future()
+
+        futures = self._pending_writes[path][1] if path in self._pending_writes else []
+        futures.append(future)
+        self._pending_writes[path] = (content, futures)
+
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_soon(self.flush)
+
+        await future
+
+    def flush(self):
+        """
+        Applies all queued writes
+        """
+
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        if not self._pending_writes:
+            return
+
+        pending_writes = self._pending_writes
+        self._pending_writes = {}
+
+        try:
+            results = self._file_system.write_many(
+                (path, content) for path, (content, futures) in pending_writes.items()
+            )
+        except Exception:
+            # a write raised an unexpected error, apply them one by one so only its own futures fail. Writes
+            # replace the whole content, so writing the ones already applied again leaves the same tree.
+            results = []
+            for path, (content, futures) in pending_writes.items():
+                try:
+                    self._file_system.write_to_file(path, content)
+                    results.append(None)
+                except Exception as error:
+                    results.append(error)
+
+        for (content, futures), result in zip(pending_writes.values(), results):
+            for future in futures:
+                if future.done():
+                    continue
+                elif result is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(result)
@@ -0,0 +1,92 @@
+import threading
+from collections import OrderedDict, namedtuple
+
+from file_system.file_system_entities import FileSystemEntity
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'invalidations', 'maxsize', 'currsize'])
+
+
+class PathCache:
+    """
+    A bounded LRU cache from a parsed path to the entity at that path
+
+    Entries are stamped with the structure generation of the file system entities. While no entity has
+    been detached, moved or renamed since an entry was stamped, a hit costs a single dict lookup.
+    Otherwise the entry is re-validated by walking up the entity's parent links and comparing names,
+    so an entry is dropped exactly when one of its ancestors was deleted, moved or renamed.
+    """
+
+    def __init__(self, root, maxsize):
+        self._root = root
+        self._maxsize = maxsize
+        self._mutex = threading.Lock()
+        self._entries = OrderedDict()  # path components -> (entity, generation)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        Returns the entity cached for the path components in key, or None
+        """
+
+        with self._mutex:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            entity, generation = entry
+            if generation != FileSystemEntity._generation:
+                current_generation = FileSystemEntity._generation
+                if not self._still_at(entity, key):
+                    del self._entries[key]
+                    self.invalidations += 1
+                    self.misses += 1
+                    return None
+                self._entries[key] = (entity, current_generation)
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entity
+
+    def stamp(self):
+        """
+        Returns the current structure generation, taken before a path is resolved and passed to put
+        """
+
+        return FileSystemEntity._generation
+
+    def put(self, key, entity, generation):
+        if self._maxsize <= 0:
+            return
+
+        with self._mutex:
+            self._entries[key] = (entity, generation)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._mutex:
+            self._entries.clear()
+
+    def info(self):
+        return CacheInfo(self.hits, self.misses, self.invalidations, self._maxsize, len(self._entries))
+
+    def _still_at(self, entity, key):
+        """
+        Checks that entity is still attached to the root at the path given by key
+        """
+
+        current = entity
+        for name in reversed(key):
+            if current is None or current.name != name:
+                return False
+            current = current.parent
+
+        return current is self._root
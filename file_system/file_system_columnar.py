@@ -0,0 +1,517 @@
+import math
+from array import array
+from contextlib import contextmanager
+
+from file_system.file_system_entities import FileSystemEntity
+from file_system.file_system_exceptions import IllegalFileSystemOperation, PathAlreadyExists, PathNotFound, NotATextFile
+from file_system.file_system_helpers import path_parse
+
+
+# type codes are the indexes of FileSystemEntity.VALID_ENTITIES
+ROOT, DRIVE, FOLDER, ZIP, TEXT = range(5)
+FREE = -1  # type code of an unused slot
+
+VALID_CHILDREN = {
+    ROOT: (DRIVE,),
+    DRIVE: (FOLDER, ZIP, TEXT),
+    FOLDER: (FOLDER, ZIP, TEXT),
+    ZIP: (FOLDER, ZIP, TEXT),
+    TEXT: (),
+}
+
+NONE = -1  # index used for a missing parent, child, sibling or content
+
+
+class ColumnarFileSystem:
+    """
+    A file system backend that stores the tree in parallel arrays instead of one Python object per entity
+
+    Every entity is an index into the arrays. Each array holds one column: the parent index, the interned
+    name id, the type code, the size, the raw (un-halved) sum of the children's sizes, the content offset
+    and the first child, last child, next sibling and previous sibling links.
+    Entities with the same parent are found through a single dictionary keyed by parent index and name id.
+
+    It supports the same create/delete/move/rename/write_to_file API as FileSystem, and returns
+    ColumnarEntity handles instead of entity objects. Bulk size recomputation and listings run as
+    passes over the arrays.
+    """
+
+    def __init__(self, defer_sizes=False):
+        """
+        :param defer_sizes if True, sizes are never propagated eagerly, they are recomputed
+            in a single pass over the arrays when they are next read
+        """
+
+        self._parents = array('q')
+        self._name_ids = array('q')
+        self._types = array('b')
+        self._sizes = array('q')
+        self._raw_sizes = array('q')
+        self._content_offsets = array('q')
+        self._first_children = array('q')
+        self._last_children = array('q')
+        self._next_siblings = array('q')
+        self._previous_siblings = array('q')
+
+        self._names = []  # name id -> name
+        self._name_table = {}  # name -> name id
+        self._contents = []  # content offset -> content
+        self._free_contents = []
+        self._free_nodes = []
+        self._children = {}  # (parent index << 32) | name id -> child index
+
+        self._defer_sizes = defer_sizes
+        self._batch_depth = 0
+        self._sizes_stale = False
+
+        self._root = self._allocate(ROOT, 'root', NONE)
+
+    def __str__(self):
+        return '\n'.join(self.iter_lines())
+
+    @contextmanager
+    def batch(self):
+        """
+        Defers size updates for the duration of the block
+        All sizes are recomputed in a single pass over the arrays when the outermost batch exits,
+        or when a size is read inside the block.
+        """
+
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and not self._defer_sizes:
+                self.flush_sizes()
+
+    def flush_sizes(self):
+        """
+        Recomputes all sizes if any update has been deferred
+        """
+
+        if self._sizes_stale:
+            self.recompute_sizes()
+
+    def create(self, entity_type, name, path_of_parent):
+        """
+        Creates a new entity under the target parent
+        :param entity_type root, drive, folder, zip, or text
+        :param name string
+        :param path_of_parent '\' separated path to target parent, or root identifier if a drive
+        :return ColumnarEntity handle of the newly created entity
+        """
+
+        roots = [None, '', '\\', 'root']  # possible paths for root
+
+        if path_of_parent in roots:
+            path_of_parent = ''
+
+        parent = self._get_index_at_path(path_of_parent)
+
+        if self._find_child(parent, name) != NONE:
+            raise PathAlreadyExists('An entity with that name already exists in {}'.format(path_of_parent))
+
+        if entity_type not in FileSystemEntity.VALID_ENTITIES[DRIVE:]:
+            raise IllegalFileSystemOperation('Invalid entity_type: {}'.format(entity_type))
+
+        type_code = FileSystemEntity.VALID_ENTITIES.index(entity_type)
+        self._check_child_type(parent, type_code)
+
+        index = self._allocate(type_code, name, parent)
+        self._link(parent, index)
+
+        return ColumnarEntity(self, index)
+
+    def delete(self, path):
+        """
+        Deletes an existing entry and all the entities it contains
+        :param path path to the entity to be deleted
+        """
+
+        index = self._get_index_at_path(path)
+        parent = self._parents[index]
+        if parent == NONE:
+            raise IllegalFileSystemOperation('The root cannot be deleted')
+
+        self._unlink(index)
+        self._update_sizes(parent, -self._sizes[index])
+
+        # free the whole subtree
+        stack = [index]
+        while stack:
+            current = stack.pop()
+            child = self._first_children[current]
+            while child != NONE:
+                stack.append(child)
+                child = self._next_siblings[child]
+            self._free(current)
+
+    def move(self, source_path, destination_path):
+        """
+        Change the parent of an entity
+        :param source_path the path to the entity to be moved
+        :param destination_path the parent to move the entity under
+        """
+
+        index = self._get_index_at_path(source_path)
+        source_parent = self._parents[index]
+        if source_parent == NONE:
+            raise IllegalFileSystemOperation('The root cannot be moved')
+
+        destination = self._get_index_at_path(destination_path)
+
+        # an entity cannot be moved underneath itself
+        ancestor = destination
+        while ancestor != NONE:
+            if ancestor == index:
+                raise IllegalFileSystemOperation('Cannot move an entity into itself or one of its descendants')
+            ancestor = self._parents[ancestor]
+
+        if self._find_child(destination, self._names[self._name_ids[index]]) != NONE:
+            raise PathAlreadyExists('Destination already has an entity with the source\'s name')
+
+        self._check_child_type(destination, self._types[index])
+
+        self._unlink(index)
+        self._link(destination, index)
+
+        self._update_sizes(source_parent, -self._sizes[index])
+        self._update_sizes(destination, self._sizes[index])
+
+    def rename(self, path, new_name):
+        """
+        Change the name of an entity
+        :param path the path to the entity to be renamed
+        :param new_name the new name of the entity
+        """
+
+        index = self._get_index_at_path(path)
+        parent = self._parents[index]
+        if parent == NONE:
+            raise IllegalFileSystemOperation('The root cannot be renamed')
+
+        if self._find_child(parent, new_name) != NONE:
+            raise PathAlreadyExists('An entity with that name already exists')
+
+        del self._children[(parent << 32) | self._name_ids[index]]
+        self._name_ids[index] = self._intern(new_name)
+        self._children[(parent << 32) | self._name_ids[index]] = index
+
+    def write_to_file(self, path, content):
+        """
+        Change the content of a text file
+        :param path path to the text file whose content will be written to
+        :param content the content that will be written to the text file
+        """
+
+        index = self._get_index_at_path(path)
+
+        if self._types[index] != TEXT:
+            raise NotATextFile('Cannot write content to a non-text entity')
+
+        offset = self._content_offsets[index]
+        if offset == NONE:
+            offset = self._free_contents.pop() if self._free_contents else len(self._contents)
+            if offset == len(self._contents):
+                self._contents.append('')
+            self._content_offsets[index] = offset
+
+        size_delta = len(content) - len(self._contents[offset])
+        self._contents[offset] = content
+        self._sizes[index] += size_delta
+        self._update_sizes(self._parents[index], size_delta)
+
+    def iter_lines(self, max_depth=None, sort_children=False):
+        """
+        Lazily yields a 'path size' line for every entity below the root, depth first
+        :param max_depth only entities up to max_depth levels below the root are yielded, drives are at depth 1
+        :param sort_children yield children ordered by name instead of by insertion order
+        """
+
+        self.flush_sizes()
+
+        stack = [(child, '', 1) for child in reversed(self._child_indexes(self._root, sort_children))]
+        while stack:
+            index, prefix, depth = stack.pop()
+            path = prefix + self._names[self._name_ids[index]]
+
+            yield path + ' ' + str(self._sizes[index])
+
+            if depth != max_depth:
+                for child in reversed(self._child_indexes(index, sort_children)):
+                    stack.append((child, path + '\\', depth + 1))
+
+    def recompute_sizes(self):
+        """
+        Recomputes every size from the text contents in one pass over the arrays
+        The live entities are ordered parents before children, and the sizes are then accumulated
+        into the parents in reverse order.
+        """
+
+        types = self._types
+        parents = self._parents
+        sizes = self._sizes
+        raw_sizes = self._raw_sizes
+
+        order = self._breadth_first_order()
+
+        for index in order:
+            raw_sizes[index] = 0
+            if types[index] != TEXT:
+                sizes[index] = 0
+
+        for index in reversed(order):
+            if types[index] != TEXT:
+                raw_size = raw_sizes[index]
+                sizes[index] = math.ceil(raw_size / 2.0) if types[index] == ZIP else raw_size
+            parent = parents[index]
+            if parent != self._root and parent != NONE:
+                raw_sizes[parent] += sizes[index]
+
+        sizes[self._root] = 0
+        self._sizes_stale = False
+
+    def verify_sizes(self):
+        """
+        Audits every cached size against a full recomputation
+        :return list of the paths of entities whose cached size is wrong, empty if all sizes are exact
+        """
+
+        self.flush_sizes()
+
+        cached_sizes = array('q', self._sizes)
+        cached_raw_sizes = array('q', self._raw_sizes)
+        self.recompute_sizes()
+
+        mismatches = []
+        for index in self._breadth_first_order():
+            if cached_sizes[index] != self._sizes[index] or cached_raw_sizes[index] != self._raw_sizes[index]:
+                mismatches.append(self._path_of(index))
+
+        return mismatches
+
+    def _breadth_first_order(self):
+        """
+        Returns the indexes of all live entities below the root, parents before children
+        """
+
+        order = array('q')
+        child = self._first_children[self._root]
+        while child != NONE:
+            order.append(child)
+            child = self._next_siblings[child]
+
+        position = 0
+        while position < len(order):
+            child = self._first_children[order[position]]
+            while child != NONE:
+                order.append(child)
+                child = self._next_siblings[child]
+            position += 1
+
+        return order
+
+    def _update_sizes(self, index, size):
+        """
+        Updates the raw size of container index by size, and the sizes of its ancestors accordingly
+        """
+
+        if self._defer_sizes or self._batch_depth:
+            self._sizes_stale = True
+            return
+
+        while size and index != self._root:
+            old_size = self._sizes[index]
+            self._raw_sizes[index] += size
+            raw_size = self._raw_sizes[index]
+            self._sizes[index] = math.ceil(raw_size / 2.0) if self._types[index] == ZIP else raw_size
+            size = self._sizes[index] - old_size
+            index = self._parents[index]
+
+    def _get_index_at_path(self, path):
+        """
+        Given a path string, returns the index of the entity at the path
+        """
+
+        index = self._root
+        for name in path_parse(path):
+            index = self._find_child(index, name)
+            if index == NONE:
+                raise PathNotFound('Invalid target path')
+
+        return index
+
+    def _find_child(self, parent, name):
+        name_id = self._name_table.get(name)
+        if name_id is None:
+            return NONE
+        return self._children.get((parent << 32) | name_id, NONE)
+
+    def _child_indexes(self, index, sort_children=False):
+        children = []
+        child = self._first_children[index]
+        while child != NONE:
+            children.append(child)
+            child = self._next_siblings[child]
+
+        if sort_children:
+            children.sort(key=lambda child_index: self._names[self._name_ids[child_index]])
+
+        return children
+
+    def _check_child_type(self, parent, type_code):
+        if type_code not in VALID_CHILDREN[self._types[parent]]:
+            raise IllegalFileSystemOperation('Entity is not valid for adding to a {}'.format(
+                FileSystemEntity.VALID_ENTITIES[self._types[parent]].capitalize()
+            ))
+
+    def _path_of(self, index):
+        names = []
+        while index != self._root:
+            names.append(self._names[self._name_ids[index]])
+            index = self._parents[index]
+        names.reverse()
+        return '\\'.join(names)
+
+    def _intern(self, name):
+        name_id = self._name_table.get(name)
+        if name_id is None:
+            name_id = len(self._names)
+            self._names.append(name)
+            self._name_table[name] = name_id
+        return name_id
+
+    def _allocate(self, type_code, name, parent):
+        """
+        Returns the index of a fresh entity, reusing a freed slot when there is one
+        """
+
+        values = (parent, self._intern(name), type_code, 0, 0, NONE, NONE, NONE, NONE, NONE)
+        columns = (
+            self._parents, self._name_ids, self._types, self._sizes, self._raw_sizes, self._content_offsets,
+            self._first_children, self._last_children, self._next_siblings, self._previous_siblings
+        )
+
+        if self._free_nodes:
+            index = self._free_nodes.pop()
+            for column, value in zip(columns, values):
+                column[index] = value
+        else:
+            index = len(self._types)
+            for column, value in zip(columns, values):
+                column.append(value)
+
+        return index
+
+    def _free(self, index):
+        offset = self._content_offsets[index]
+        if offset != NONE:
+            self._contents[offset] = ''
+            self._free_contents.append(offset)
+
+        # the top of a deleted subtree has already been unlinked from its parent
+        self._children.pop((self._parents[index] << 32) | self._name_ids[index], None)
+        self._types[index] = FREE
+        self._free_nodes.append(index)
+
+    def _link(self, parent, index):
+        """
+        Appends index to the children of parent
+        """
+
+        self._parents[index] = parent
+        self._children[(parent << 32) | self._name_ids[index]] = index
+
+        last = self._last_children[parent]
+        self._previous_siblings[index] = last
+        self._next_siblings[index] = NONE
+        if last == NONE:
+            self._first_children[parent] = index
+        else:
+            self._next_siblings[last] = index
+        self._last_children[parent] = index
+
+    def _unlink(self, index):
+        """
+        Removes index from the children of its parent, its subtree stays intact
+        """
+
+        parent = self._parents[index]
+        del self._children[(parent << 32) | self._name_ids[index]]
+
+        previous = self._previous_siblings[index]
+        following = self._next_siblings[index]
+        if previous == NONE:
+            self._first_children[parent] = following
+        else:
+            self._next_siblings[previous] = following
+        if following == NONE:
+            self._last_children[parent] = previous
+        else:
+            self._previous_siblings[following] = previous
+
+
+class ColumnarEntity:
+    """
+    A lightweight handle to an entity stored in a ColumnarFileSystem
+    A handle is only valid until its entity is deleted, after which its slot may be reused.
+    """
+
+    __slots__ = ('_file_system', '_index')
+
+    def __init__(self, file_system, index):
+        self._file_system = file_system
+        self._index = index
+
+    def __eq__(self, other):
+        return isinstance(other, ColumnarEntity) and (other._file_system, other._index) == (
+            self._file_system, self._index
+        )
+
+    def __hash__(self):
+        return hash(self._index)
+
+    @property
+    def entity_type(self):
+        return FileSystemEntity.VALID_ENTITIES[self._file_system._types[self._index]]
+
+    @property
+    def name(self):
+        file_system = self._file_system
+        return file_system._names[file_system._name_ids[self._index]]
+
+    @property
+    def path(self):
+        return self._file_system._path_of(self._index)
+
+    @property
+    def parent(self):
+        parent = self._file_system._parents[self._index]
+        return None if parent == NONE else ColumnarEntity(self._file_system, parent)
+
+    @property
+    def size(self):
+        self._file_system.flush_sizes()
+        return self._file_system._sizes[self._index]
+
+    @property
+    def raw_size(self):
+        self._file_system.flush_sizes()
+        return self._file_system._raw_sizes[self._index]
+
+    @property
+    def content(self):
+        file_system = self._file_system
+        offset = file_system._content_offsets[self._index]
+        return '' if offset == NONE else file_system._contents[offset]
+
+    def get_child(self, name):
+        index = self._file_system._find_child(self._index, name)
+        if index == NONE:
+            raise KeyError(name)
+        return ColumnarEntity(self._file_system, index)
+
+    def get_names(self):
+        file_system = self._file_system
+        return [file_system._names[file_system._name_ids[child]] for child in file_system._child_indexes(self._index)]
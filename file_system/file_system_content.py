@@ -0,0 +1,397 @@
+import codecs
+import io
+import lzma
+import zlib
+from bisect import bisect_right
+
+
+# the largest chunk an edit copies, longer strings are cut into chunks of this size when they are first edited,
+# and the largest piece a reader copies at once
+CHUNK_SIZE = 8192
+
+
+def iter_string_chunks(content, offset=0):
+    """
+    Yields a string from offset onwards in pieces of at most CHUNK_SIZE characters
+    """
+
+    for start in range(offset, len(content), CHUNK_SIZE):
+        yield content[start:start + CHUNK_SIZE]
+
+
+def iter_decoded(pieces, offset=0):
+    """
+    Decodes UTF-8 bytes arriving in pieces, yielding the text from offset onwards
+    """
+
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    for piece in pieces:
+        text = decoder.decode(piece)
+
+        # the characters before offset have to be decoded to know where offset is
+        if offset >= len(text):
+            offset -= len(text)
+            continue
+        elif offset:
+            text = text[offset:]
+            offset = 0
+        yield text
+
+
+def compress(content, codec):
+    """
+    Returns content as a CompressedContent, or content itself if compressing it does not make it smaller
+    :param codec 'zlib' or 'lzma'
+    """
+
+    encoded = content.encode('utf-8')
+    data = zlib.compress(encoded) if codec == 'zlib' else lzma.compress(encoded)
+    if len(data) >= len(encoded):
+        return content
+    return CompressedContent(codec, data, len(content))
+
+
+class CompressedContent:
+    """
+    The content of a text file compressed with zlib or lzma, used for text files under a zip
+
+    It is decompressed whenever it is read, and a reader decompresses it a piece at a time.
+    """
+
+    CODECS = ['zlib', 'lzma']
+
+    __slots__ = ('_codec', '_data', '_length')
+
+    def __init__(self, codec, data, length):
+        """
+        :param codec 'zlib' or 'lzma'
+        :param data the compressed UTF-8 encoding of the content
+        :param length the length of the content in characters
+        """
+
+        self._codec = codec
+        self._data = data
+        self._length = length
+
+    def __len__(self):
+        return self._length
+
+    def __str__(self):
+        decompress = zlib.decompress if self._codec == 'zlib' else lzma.decompress
+        return decompress(self._data).decode('utf-8')
+
+    @property
+    def compressed_size(self):
+        """
+        The number of bytes the compressed content takes
+        """
+
+        return len(self._data)
+
+    def iter_chunks(self, offset=0):
+        """
+        Yields the content from offset onwards, decompressing at most CHUNK_SIZE bytes at a time
+        """
+
+        return iter_decoded(self._iter_decompressed(), offset)
+
+    def _iter_decompressed(self):
+        data = self._data
+
+        if self._codec == 'zlib':
+            decompressor = zlib.decompressobj()
+            for start in range(0, len(data), CHUNK_SIZE):
+                piece = data[start:start + CHUNK_SIZE]
+                while piece:
+                    yield decompressor.decompress(piece, CHUNK_SIZE)
+                    piece = decompressor.unconsumed_tail
+            yield decompressor.flush()
+        else:
+            decompressor = lzma.LZMADecompressor()
+            for start in range(0, len(data), CHUNK_SIZE):
+                yield decompressor.decompress(data[start:start + CHUNK_SIZE], CHUNK_SIZE)
+                while not decompressor.needs_input and not decompressor.eof:
+                    yield decompressor.decompress(b'', CHUNK_SIZE)
+
+
+class ChunkedContent:
+    """
+    The content of a text file as a list of string chunks, used once the file is edited in place
+
+    Appending, overwriting and truncating only touch the chunks around the edit, so their cost is
+    proportional to the size of the edit rather than to the size of the content. Chunks are never
+    modified in place once they may be shared: a content frozen for a snapshot is marked shared and
+    the text file copies the chunk list, not the chunks, before its next edit.
+    With a codec, every chunk holds at most CHUNK_SIZE characters and is compressed on its own, so an edit
+    only decompresses and recompresses the chunks it touches.
+    """
+
+    __slots__ = ('_chunks', '_starts', '_length', '_codec', 'shared')
+
+    def __init__(self, content='', codec=None):
+        """
+        :param content the initial content
+        :param codec 'zlib' or 'lzma' to keep the chunks compressed with that codec, None to keep them as strings
+        """
+
+        self._codec = codec
+        self._chunks, self._starts = self._stored(content, 0) if content else ([], [])  # starts are chunk offsets
+        self._length = len(content)
+        self.shared = False
+
+    def __len__(self):
+        return self._length
+
+    def __str__(self):
+        return ''.join(map(str, self._chunks))
+
+    @property
+    def codec(self):
+        return self._codec
+
+    @property
+    def compressed_size(self):
+        """
+        The number of bytes the chunks take, compressed or UTF-8 encoded
+        """
+
+        return sum(chunk.compressed_size if chunk.__class__ is CompressedContent else len(chunk.encode('utf-8'))
+                   for chunk in self._chunks)
+
+    def copy(self):
+        """
+        Returns an unshared copy, which shares the immutable chunks with this content
+        """
+
+        copy = ChunkedContent(codec=self._codec)
+        copy._chunks = list(self._chunks)
+        copy._starts = list(self._starts)
+        copy._length = self._length
+        return copy
+
+    def iter_chunks(self, offset=0):
+        """
+        Yields the content from offset onwards in pieces of at most CHUNK_SIZE characters
+        """
+
+        if offset >= self._length:
+            return
+
+        index = bisect_right(self._starts, offset) - 1
+        yield from iter_string_chunks(str(self._chunks[index]), offset - self._starts[index])
+        for index in range(index + 1, len(self._chunks)):
+            yield from iter_string_chunks(str(self._chunks[index]))
+
+    def append(self, data):
+        if not data:
+            return
+
+        chunks = self._chunks
+        if chunks and len(chunks[-1]) + len(data) <= CHUNK_SIZE:
+            # keeps a stream of small appends from leaving a chunk per append
+            chunks[-1] = self._store(str(chunks[-1]) + data)
+        else:
+            stored, starts = self._stored(data, self._length)
+            chunks.extend(stored)
+            self._starts.extend(starts)
+        self._length += len(data)
+
+    def write_at(self, offset, data):
+        """
+        Overwrites the content from offset with data, extending the content if data runs past its end
+        :param offset an offset in the content, at most its length
+        """
+
+        end = offset + len(data)
+        if end >= self._length:
+            self.truncate(offset)
+            self.append(data)
+        elif data:
+            first = self._split(offset)
+            last = self._split(end)
+            self._chunks[first:last], self._starts[first:last] = self._stored(data, offset)
+
+    def truncate(self, length):
+        """
+        Cuts the content down to its first length characters
+        """
+
+        if length >= self._length:
+            return
+
+        index = self._split(length)
+        del self._chunks[index:]
+        del self._starts[index:]
+        self._length = length
+
+    def _split(self, offset):
+        """
+        Makes a chunk start at offset and returns its index
+        """
+
+        if offset == self._length:
+            return len(self._chunks)
+
+        index = bisect_right(self._starts, offset) - 1
+        start = self._starts[index]
+        if start == offset:
+            return index
+
+        chunk = str(self._chunks[index])
+        if len(chunk) > CHUNK_SIZE:
+            # cut once into small chunks, so later edits around it never copy more than a chunk
+            self._chunks[index:index + 1] = [chunk[i:i + CHUNK_SIZE] for i in range(0, len(chunk), CHUNK_SIZE)]
+            self._starts[index:index + 1] = range(start, start + len(chunk), CHUNK_SIZE)
+            return self._split(offset)
+
+        self._chunks[index:index + 1] = [self._store(chunk[:offset - start]), self._store(chunk[offset - start:])]
+        self._starts.insert(index + 1, offset)
+        return index + 1
+
+    def _store(self, chunk):
+        """
+        Returns a chunk string as it is kept, compressed if the content has a codec
+        """
+
+        return chunk if self._codec is None else compress(chunk, self._codec)
+
+    def _stored(self, data, offset):
+        """
+        Returns data as a list of chunks as they are kept and the list of their offsets, data starting at offset
+        Without a codec data is kept as one chunk, it is only cut into small chunks once an edit falls inside it.
+        """
+
+        if self._codec is None:
+            return [data], [offset]
+        return ([compress(piece, self._codec) for piece in iter_string_chunks(data)],
+                list(range(offset, offset + len(data), CHUNK_SIZE)))
+
+
+def is_compressed(content):
+    """
+    Whether the content of a text file is kept compressed, whole or chunk by chunk
+    """
+
+    return content.__class__ is CompressedContent or (content.__class__ is ChunkedContent and content.codec is not None)
+
+
+class TextReader(io.TextIOBase):
+    """
+    A read-only, seekable text stream over the content of a text file, returned by FileSystem.open_read
+
+    The content is served piece by piece from where it is stored, it is never joined into one string,
+    so reading a file of any size holds at most a chunk and the requested data in memory.
+    Offsets are in characters. The reader sees the content as it was when it was opened.
+    """
+
+    def __init__(self, chunks, length):
+        """
+        :param chunks callable returning an iterator over the content from an offset, in pieces
+        :param length the length of the content
+        """
+
+        self._iter_chunks = chunks
+        self._length = length
+        self._position = 0
+        self._chunks = None  # iterator over the pieces after the buffer, started lazily
+        self._buffer = ''
+        self._buffer_offset = 0  # the buffer is consumed by advancing an index, never by slicing off its head
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        self._check_open()
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self._check_open()
+
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self._length + offset
+        else:
+            raise ValueError('Invalid whence: {}'.format(whence))
+
+        if position < 0:
+            raise ValueError('Negative seek position {}'.format(position))
+
+        if position != self._position:
+            self._position = position
+            self._chunks = None
+            self._buffer = ''
+            self._buffer_offset = 0
+        return position
+
+    def read(self, size=-1):
+        """
+        Reads at most size characters, or up to the end of the content if size is negative or None
+        """
+
+        self._check_open()
+
+        if size is None or size < 0:
+            size = max(self._length - self._position, 0)
+
+        pieces = []
+        while size > 0 and self._fill():
+            piece = self._buffer[self._buffer_offset:self._buffer_offset + size]
+            self._consume(len(piece))
+            pieces.append(piece)
+            size -= len(piece)
+
+        return ''.join(pieces)
+
+    def readline(self, size=-1):
+        """
+        Reads up to and including the next newline, or at most size characters if size is not negative
+        """
+
+        self._check_open()
+
+        if size is None or size < 0:
+            size = max(self._length - self._position, 0)
+
+        pieces = []
+        while size > 0 and self._fill():
+            end = self._buffer.find('\n', self._buffer_offset, self._buffer_offset + size)
+            if end == -1:
+                piece = self._buffer[self._buffer_offset:self._buffer_offset + size]
+            else:
+                piece = self._buffer[self._buffer_offset:end + 1]
+
+            self._consume(len(piece))
+            pieces.append(piece)
+            size -= len(piece)
+            if end != -1:
+                break
+
+        return ''.join(pieces)
+
+    def _fill(self):
+        """
+        Makes sure the buffer holds unread data, returns False at the end of the content
+        """
+
+        if self._buffer_offset < len(self._buffer):
+            return True
+
+        if self._chunks is None:
+            self._chunks = self._iter_chunks(self._position)
+        self._buffer = next(self._chunks, '')
+        self._buffer_offset = 0
+        return self._buffer != ''
+
+    def _consume(self, length):
+        self._buffer_offset += length
+        self._position += length
+
+    def _check_open(self):
+        if self.closed:
+            raise ValueError('I/O operation on closed file')
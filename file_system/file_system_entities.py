@@ -1,7 +1,31 @@
+import math
+from collections import namedtuple
+from functools import partial
+from itertools import count
+from types import MappingProxyType
+
+from file_system.file_system_content import ChunkedContent, is_compressed, iter_string_chunks
 from file_system.file_system_helpers import path_parse
 from file_system.file_system_exceptions import IllegalFileSystemOperation, PathNotFound, PathAlreadyExists
 
 
+# shared by every container without children
+NO_CHILDREN = MappingProxyType({})
+
+_generations = count(1)
+
+# the state of an entity as seen by a snapshot, children and content are None where they do not apply
+EntityState = namedtuple('EntityState', ['name', 'size', 'raw_size', 'children', 'content'])
+
+
+def bump_generation():
+    """
+    Invalidates every cached path, called after an attached entity is detached, re-parented or renamed
+    Draws from an atomic counter so concurrent structural changes never reuse a generation.
+    """
+    FileSystemEntity._generation = next(_generations)
+
+
 class FileSystemEntity:
     """
     Represents an entity in our file system
@@ -15,20 +39,30 @@ class FileSystemEntity:
     size – an integer defined as follows:
         For a text file – it is the length of its content.
         For a drive or a folder, it is the sum of all sizes of the entities it contains.
-        For a zip file, it is one half of the sum of all sizes of the entities it contains.
+        For a zip file, it is one half of the sum of all sizes of the entities it contains, rounded up.
     """
 
     VALID_ENTITIES = ['root', 'drive', 'folder', 'zip', 'text']
 
-    def __init__(self, entity_type, name, path):
-        self._entity_type = entity_type
+    # entities are slotted and store no full path, so memory per node stays small on huge trees
+    __slots__ = ('_type', '_name', '_path', '_parent', '_size', '_version_epoch', '_versions')
+
+    # changed by bump_generation() whenever an attached entity is detached, re-parented
+    # or renamed, which invalidates every cached path at once
+    _generation = 0
+
+    def __init__(self, entity_type, name, path=None):
+        self.entity_type = entity_type
         self._name = name
-        self._path = path
+        self._path = path  # only used while the entity is detached from a parent
+        self._parent = None
         self._size = 0  # all entities either empty container or content-less text at init
+        self._version_epoch = 0  # snapshot epoch in which the current state began
+        self._versions = None  # [(last epoch, EntityState)] of earlier states still visible to snapshots
 
     @property
     def entity_type(self):
-        return self._entity_type
+        return self.VALID_ENTITIES[self._type]
 
     @entity_type.setter
     def entity_type(self, new_type):
@@ -37,7 +71,7 @@ class FileSystemEntity:
                 'Not a valid entity type, must be \'drive\', \'folder\', \'zip\', or \'text\''
             )
         else:
-            self._entity_type = new_type
+            self._type = self.VALID_ENTITIES.index(new_type)  # stored as its index in VALID_ENTITIES
 
     @property
     def name(self):
@@ -45,14 +79,33 @@ class FileSystemEntity:
 
     @name.setter
     def name(self, new_name):
-        self._name = new_name
+        if self._parent is not None:
+            self._parent.rename_child(self._name, new_name)
+        else:
+            self._name = new_name
+
+    @property
+    def parent(self):
+        return self._parent
 
     @property
     def path(self):
-        return self._path
+        """
+        The path is derived from the parent links, so moving or renaming a container
+        never has to touch its descendants. It is built from the parent's path, which
+        containers cache, so a text file keeps no path of its own.
+        """
+        if self._parent is None:
+            return self._name if self._path is None else self._path
+
+        prefix = self._parent.path
+        return self._name if prefix == '' else prefix + '\\' + self._name
 
     @path.setter
     def path(self, new_path):
+        if self._parent is not None:
+            raise IllegalFileSystemOperation('The path of an attached entity is derived from its parent')
+
         # cleanup leading/trailing \'s
         new_path = path_parse(new_path)
         path_name = new_path[-1]
@@ -69,15 +122,138 @@ class FileSystemEntity:
     def size(self, new_size):
         self._size = new_size
 
+    def freeze(self):
+        """
+        Returns the current state of the entity as an EntityState
+        """
+        return EntityState(self._name, self.size, 0, None, None)
+
 
 class Container(FileSystemEntity):
     """
     Containers may contain zero to many other entities.
+    Empty containers share a read-only empty map, a container's own map is only allocated for its first child.
     """
 
-    def __init__(self, entity_type, name, path):
+    __slots__ = ('_children', '_raw_size', '_dirty', '_cached_path', '_cached_generation')
+
+    def __init__(self, entity_type, name, path=None):
         FileSystemEntity.__init__(self, entity_type, name, path)
-        self._children = {}
+        self._children = NO_CHILDREN
+        self._raw_size = 0  # exact sum of the children's sizes, size is derived from it
+        self._dirty = False  # size is stale and is recomputed from the children when next read
+        self._cached_path = None
+        self._cached_generation = -1
+
+    def _get_path(self):
+        """
+        Computed paths are cached until the next structural change anywhere in the tree. Only
+        containers cache them, there are far fewer of them than text files.
+        """
+        if self._parent is None:
+            return self._name if self._path is None else self._path
+
+        generation = FileSystemEntity._generation  # read first, so a concurrent change makes the result stale
+        if self._cached_generation == generation:
+            return self._cached_path
+
+        # walk up until we reach the top or an ancestor with a valid cached path
+        names = []
+        current = self
+        while current._parent is not None and current._cached_generation != generation:
+            names.append(current._name)
+            current = current._parent
+
+        prefix = current.path
+        if prefix != '':
+            names.append(prefix)
+        names.reverse()
+
+        path = '\\'.join(names)
+        self._cached_path = path
+        self._cached_generation = generation
+        return path
+
+    path = property(_get_path, FileSystemEntity.path.fset, doc=FileSystemEntity.path.__doc__)
+
+    @property
+    def size(self):
+        if self._dirty:
+            self._recompute_size()
+        return self._size
+
+    @size.setter
+    def size(self, new_size):
+        self._size = new_size
+
+    @property
+    def raw_size(self):
+        if self._dirty:
+            self._recompute_size()
+        return self._raw_size
+
+    @raw_size.setter
+    def raw_size(self, new_raw_size):
+        self._raw_size = new_raw_size
+        self._size = self.compressed_size(new_raw_size)
+
+    def mark_dirty(self, before_change=None):
+        """
+        Marks this container and its ancestors as having a stale size
+        Stops at the first ancestor that is already dirty, so marking n entities costs O(n) in total
+        :param before_change optional callable, called with each container before it is marked
+        """
+        current = self
+        while current.parent is not None and not current._dirty:
+            if before_change is not None:
+                before_change(current)
+            current._dirty = True
+            current = current.parent
+
+    def freeze(self):
+        # the child map is shared with the state, it is copied before it is next modified. A child map that is
+        # built lazily and was never built gives the state a map of its own, and stays unbuilt in the container.
+        children = self._children
+        if children.__class__ is not dict and children is not NO_CHILDREN:
+            children = children.frozen()
+        return EntityState(self._name, self.size, self.raw_size, children, None)
+
+    def unshare_children(self):
+        """
+        Gives the container its own copy of its child map, if the map is shared with a frozen state
+        """
+        if self._versions and self._versions[-1][1].children is self._children and self._children:
+            self._children = dict(self._children)
+
+    def compressed_size(self, size):
+        """
+        The size a container reports for children whose sizes add up to size
+        """
+        return size
+
+    def _recompute_size(self):
+        """
+        Recomputes the sizes of the dirty containers below and including this one in a single bottom-up pass
+        """
+
+        # collect the dirty containers top-down, clean subtrees are never entered
+        order = []
+        stack = [self]
+        while stack:
+            container = stack.pop()
+            order.append(container)
+            for child in container._children.values():
+                if child.entity_type != 'text' and child._dirty:
+                    stack.append(child)
+
+        # children are always visited before their parents
+        for container in reversed(order):
+            total = 0
+            for child in container._children.values():
+                total += child._size
+            container._raw_size = total
+            container._size = container.compressed_size(total)
+            container._dirty = False
 
     def get_child(self, name):
         return self._children[name]
@@ -86,18 +262,48 @@ class Container(FileSystemEntity):
         return self._children.keys()
 
     def delete_child(self, name):
+        child = self._children[name]
         del self._children[name]
+        if not self._children:
+            self._children = NO_CHILDREN
+
+        # a moved child has already been attached to its new parent
+        if child._parent is self:
+            child._path = child.path  # keep the last known path for the detached entity
+            child._parent = None
+            bump_generation()
+
+    def detach_children(self):
+        """
+        Removes all children at once and returns them, used to tear down a detached subtree
+        The children keep their parent link, their paths are no longer meaningful. A child map that is built
+        lazily and was never built is dropped without building it.
+        """
+        children = self._children
+        self._children = NO_CHILDREN
+        return list(children.values()) if children.__class__ is dict else []
+
+    def rename_child(self, name, new_name):
+        if new_name in self._children.keys():
+            raise PathAlreadyExists('An entity with that name already exists')
 
-    @FileSystemEntity.path.setter
-    def path(self, new_path):
-        self._path = new_path
+        child = self._children[name]
+        del self._children[name]
+        child._name = new_name
+        self._children[new_name] = child
+        bump_generation()
+
+    def _attach(self, child):
+        moved = child._parent is not None
+
+        if self._children is NO_CHILDREN:
+            self._children = {}
+        self._children[child.name] = child
+        child._parent = self
+        child._path = None
 
-        # recursively update the children's paths,
-        # base case is text's non-recursive path update
-        # and containers with empty children sets.
-        for child in self._children.keys():
-            child_entity = self._children[child]
-            child_entity.path = '{parent_path}\\{name}'.format(parent_path=new_path, name=child_entity.name)
+        if moved:
+            bump_generation()  # re-parenting changes the paths of the whole subtree
 
 
 class Root(Container):
@@ -105,9 +311,11 @@ class Root(Container):
     The root of the file system where drives reside
     """
 
+    __slots__ = ()
+
     VALID_ROOT_CHILDREN = ['drive']
 
-    def __init__(self, entity_type, name, path):
+    def __init__(self, entity_type, name, path=None):
         Container.__init__(self, entity_type, name, path)
 
     def add_child(self, child):
@@ -116,7 +324,7 @@ class Root(Container):
         elif child.entity_type not in self.VALID_ROOT_CHILDREN:
             raise IllegalFileSystemOperation('You cannot add a non-drive to the root')
         else:
-            self._children[child.name] = child
+            self._attach(child)
 
 
 class Drive(Container):
@@ -124,9 +332,11 @@ class Drive(Container):
     Represents a physical drive that exist only within the system's root
     """
 
+    __slots__ = ()
+
     VALID_DRIVE_CHILDREN = ['folder', 'zip', 'text']
 
-    def __init__(self, entity_type, name, path):
+    def __init__(self, entity_type, name, path=None):
         Container.__init__(self, entity_type, name, path)
 
     def add_child(self, child):
@@ -135,7 +345,7 @@ class Drive(Container):
         elif child.entity_type not in self.VALID_DRIVE_CHILDREN:
             raise IllegalFileSystemOperation('Entity is not valid for adding to a Drive')
         else:
-            self._children[child.name] = child
+            self._attach(child)
 
 
 class Folder(Container):
@@ -144,9 +354,11 @@ class Folder(Container):
     and can contain folders, zips, and text.
     """
 
+    __slots__ = ()
+
     VALID_FOLDER_CHILDREN = ['folder', 'zip', 'text']
 
-    def __init__(self, entity_type, name, path):
+    def __init__(self, entity_type, name, path=None):
         Container.__init__(self, entity_type, name, path)
 
     def add_child(self, child):
@@ -155,7 +367,7 @@ class Folder(Container):
         elif child.entity_type not in self.VALID_FOLDER_CHILDREN:
             raise IllegalFileSystemOperation('Entity is not valid for adding to a Folder')
         else:
-            self._children[child.name] = child
+            self._attach(child)
 
 
 class Zip(Container):
@@ -163,33 +375,90 @@ class Zip(Container):
     The same as a folder, but will only inherit half the size of its children
     """
 
+    __slots__ = ()
+
     VALID_ZIP_CHILDREN = ['folder', 'zip', 'text']
 
-    def __init__(self, entity_type, name, path):
+    def __init__(self, entity_type, name, path=None):
         Container.__init__(self, entity_type, name, path)
 
+    def compressed_size(self, size):
+        return math.ceil(size / 2.0)
+
     def add_child(self, child):
         if child.name in self._children.keys():
             raise PathAlreadyExists('An entity with that name already exists')
         elif child.entity_type not in self.VALID_ZIP_CHILDREN:
             raise IllegalFileSystemOperation('Entity is not valid for adding to a Zip')
         else:
-            self._children[child.name] = child
+            self._attach(child)
 
 
 class Text(FileSystemEntity):
     """
     A text file has a property called Content which is a string.
+    Once it is edited in place its content is kept as a ChunkedContent, which is joined back into a
+    string when the content is next read as a whole. Under a compressing zip its content is kept as a
+    CompressedContent, or once edited as a ChunkedContent of compressed chunks, which is decompressed
+    every time it is read.
     """
 
-    def __init__(self, entity_type, name, path):
+    __slots__ = ('_content',)
+
+    def __init__(self, entity_type, name, path=None):
         FileSystemEntity.__init__(self, entity_type, name, path)
         self._content = ''
 
     @property
     def content(self):
-        return self._content
+        content = self._content
+        if content.__class__ is not str:
+            if is_compressed(content):
+                return str(content)
+            content = self._content = str(content)
+        return content
 
     @content.setter
     def content(self, new_content):
         self._content = new_content
+
+    def append(self, data, codec=None):
+        self._chunked(codec).append(data)
+
+    def write_at(self, offset, data, codec=None):
+        self._chunked(codec).write_at(offset, data)
+
+    def truncate(self, length, codec=None):
+        self._chunked(codec).truncate(length)
+
+    def chunk_source(self):
+        """
+        Returns a callable yielding the current content from an offset in pieces, without joining it into
+        one string. Later edits of the file do not change what it yields.
+        """
+
+        content = self._content
+        if content.__class__ is str:
+            return partial(iter_string_chunks, content)
+        elif content.__class__ is ChunkedContent:
+            content.shared = True  # the next edit works on a copy
+        return content.iter_chunks
+
+    def _chunked(self, codec=None):
+        """
+        Returns the content as a ChunkedContent that may be edited in place
+        :param codec the codec the chunks are compressed with, None to keep them as strings
+        """
+
+        content = self._content
+        if content.__class__ is not ChunkedContent or content.codec != codec:
+            content = self._content = ChunkedContent(str(content), codec)
+        elif content.shared:
+            content = self._content = content.copy()
+        return content
+
+    def freeze(self):
+        content = self._content
+        if content.__class__ is ChunkedContent:
+            content.shared = True  # the state keeps it, the next edit works on a copy
+        return EntityState(self._name, self._size, 0, None, content)
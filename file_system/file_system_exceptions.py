@@ -25,3 +25,10 @@ class NotATextFile(Exception):
     Expected an entity of type 'text'
     """
     pass
+
+
+class InvalidImage(Exception):
+    """
+    A file is not a valid saved file system image or journal
+    """
+    pass
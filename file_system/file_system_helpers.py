@@ -1,3 +1,89 @@
+import sys
+from functools import lru_cache
+
+
+class FileSystemPath:
+    """
+    An immutable, pre-parsed path
+    Holds the path's components as a tuple of interned strings and precomputes its hash, so it can be
+    parsed once and passed to any number of FileSystem operations in place of a path string.
+    """
+
+    __slots__ = ('_components', '_hash')
+
+    def __init__(self, path=()):
+        """
+        :param path a '\' separated path string, another FileSystemPath, or an iterable of components
+        """
+        if isinstance(path, FileSystemPath):
+            components = path._components
+        elif isinstance(path, str):
+            components = tuple(sys.intern(entity) for entity in path.split('\\') if entity)
+        else:
+            components = tuple(sys.intern(entity) for entity in path)
+
+        self._components = components
+        self._hash = hash(components)
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if not isinstance(other, FileSystemPath):
+            return NotImplemented
+        return self._hash == other._hash and self._components == other._components
+
+    def __len__(self):
+        return len(self._components)
+
+    def __iter__(self):
+        return iter(self._components)
+
+    def __reversed__(self):
+        return reversed(self._components)
+
+    def __getitem__(self, index):
+        return self._components[index]
+
+    def __str__(self):
+        return '\\'.join(self._components)
+
+    def __repr__(self):
+        return 'FileSystemPath({!r})'.format(str(self))
+
+    @property
+    def components(self):
+        return self._components
+
+    @property
+    def name(self):
+        return self._components[-1] if self._components else ''
+
+    @property
+    def parent(self):
+        return FileSystemPath(self._components[:-1])
+
+    def join(self, name):
+        return FileSystemPath(self._components + (name,))
+
+
+@lru_cache(maxsize=65536)
+def _parse_path_string(path):
+    return FileSystemPath(path)
+
+
+def parse_path(path):
+    """
+    Returns the FileSystemPath for a path string or FileSystemPath
+    Parsed strings are memoized, so hot paths are only split once.
+    """
+
+    if isinstance(path, FileSystemPath):
+        return path
+    elif path is None:
+        return FileSystemPath()
+    return _parse_path_string(path)
+
 
 def path_parse(path):
     """
@@ -5,10 +91,10 @@ def path_parse(path):
     Returns a parsed list of the path entities
     """
 
-    split_path = path.split('\\')
-    split_path = [entity for entity in split_path if entity != '']
+    if isinstance(path, FileSystemPath):
+        return list(path.components)
 
-    return split_path
+    return [entity for entity in path.split('\\') if entity]
 
 
 def print_recursive(entity):
@@ -16,10 +102,104 @@ def print_recursive(entity):
     Recursively prints an entity and its children
     """
 
-    string = entity.path + ' ' + str(entity.size) + '\n'
+    return ''.join(line + '\n' for line in iter_lines(entity))
+
+
+def iter_lines(entity, max_depth=None, sort_children=False):
+    """
+    Lazily yields a 'path size' line for an entity and each of its descendants, depth first
+    Uses an explicit stack and builds each path from its parent's, so the output is never held in memory
+    :param max_depth descendants deeper than max_depth levels below entity are skipped
+    :param sort_children yield children ordered by name instead of by insertion order
+    """
+
+    stack = [(entity, entity.path, 0)]
+    while stack:
+        current, path, depth = stack.pop()
+
+        yield path + ' ' + str(current.size)
+
+        if current.entity_type == 'text' or depth == max_depth:
+            continue
+
+        names = sorted(current.get_names()) if sort_children else list(current.get_names())
+        prefix = path + '\\' if path != '' else ''
+
+        # pushed in reverse so children are popped in order
+        for name in reversed(names):
+            stack.append((current.get_child(name), prefix + name, depth + 1))
+
+
+class FileSystemEntry:
+    """
+    A lightweight entry yielded by FileSystem.walk and FileSystem.iterdir
+    Holds only the entity and its depth below the walked entity, the path is built only when asked for.
+    """
+
+    __slots__ = ('entity', 'depth')
+
+    def __init__(self, entity, depth):
+        self.entity = entity
+        self.depth = depth
+
+    def __repr__(self):
+        return 'FileSystemEntry({!r}, {!r})'.format(self.entity.entity_type, self.entity.name)
+
+    @property
+    def name(self):
+        return self.entity.name
+
+    @property
+    def entity_type(self):
+        return self.entity.entity_type
+
+    @property
+    def size(self):
+        return self.entity.size
+
+    @property
+    def path(self):
+        return self.entity.path
+
+    def is_text(self):
+        return self.entity.entity_type == 'text'
+
+
+def list_children(container):
+    """
+    Returns the children of a container as a list, in insertion order
+    """
+
+    return [container.get_child(name) for name in container.get_names()]
+
+
+def walk(entity, topdown=True, max_depth=None, children=list_children):
+    """
+    Lazily yields a FileSystemEntry for each descendant of an entity, depth first, in insertion order
+    Uses an explicit stack, so the depth of the tree is not limited by the recursion limit.
+    :param topdown yield a container before its descendants if True, after them if False
+    :param max_depth descendants deeper than max_depth levels below entity are skipped, children are at depth 1
+    :param children callable returning the list of children of a container
+    """
+
+    if entity.entity_type == 'text':
+        return
+
+    # each item is (entry, whether its children have been pushed), pushed in reverse so children are popped in order
+    stack = [(FileSystemEntry(child, 1), False) for child in reversed(children(entity))]
+    while stack:
+        entry, expanded = stack.pop()
+        current = entry.entity
+
+        if expanded or current.entity_type == 'text' or entry.depth == max_depth:
+            yield entry
+            continue
 
-    if entity.entity_type != 'text':
-        for entity_name in entity.get_names():
-            string += print_recursive(entity.get_child(entity_name))
+        if topdown:
+            yield entry
+        else:
+            stack.append((entry, True))
 
-    return string
+        depth = entry.depth + 1
+        for child in reversed(children(current)):
+            stack.append((FileSystemEntry(child, depth), False))
@@ -0,0 +1,465 @@
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from functools import partial
+
+from file_system.file_system_content import CHUNK_SIZE, iter_decoded
+from file_system.file_system_entities import EntityState, FileSystemEntity, Root, Drive, Folder, Zip, Text
+from file_system.file_system_exceptions import InvalidImage
+
+
+# magic, format version, byte order ('<' or '>'), sequence number of the last journaled operation in the image,
+# node count, names blob length, contents blob length
+HEADER = struct.Struct('<4sHc1xqqqq')
+MAGIC = b'FSIM'
+VERSION = 2
+VERSIONS = [1, 2]  # version 1 images have no sequence number, its bytes were zero padding
+BYTE_ORDER = b'<' if sys.byteorder == 'little' else b'>'
+
+# the node table is stored as one contiguous column per field, in this order, each holding a value per node
+COLUMNS = [
+    ('parent', 'q'),  # index of the parent node, -1 for the root
+    ('name_offset', 'q'),  # byte offset of the UTF-8 encoded name in the names blob
+    ('name_length', 'q'),
+    ('size', 'q'),
+    ('raw_size', 'q'),  # sum of the children's sizes, 0 for text files
+    ('content_offset', 'q'),  # byte offset of the UTF-8 encoded content in the contents blob, 0 for containers
+    ('content_length', 'q'),
+    ('subtree_end', 'q'),  # index one past the node's last descendant, its children start at index + 1
+    ('type', 'B'),  # index into FileSystemEntity.VALID_ENTITIES
+]
+
+ENTITY_CLASSES = [Root, Drive, Folder, Zip, Text]  # by type code
+TEXT = FileSystemEntity.VALID_ENTITIES.index('text')
+
+
+def write_image(root, stream, sequence=0):
+    """
+    Writes the tree below root to a binary stream as a file system image
+    The nodes are written in pre-order, so the descendants of a node directly follow it.
+    Works on live entities and on snapshot entities alike.
+    :param root the root entity, its sizes must be up to date
+    :param stream a binary stream with a write method
+    :param sequence the sequence number of the last journaled operation the tree includes
+    """
+
+    columns = {name: array(code) for name, code in COLUMNS}
+    parents = columns['parent']
+    name_offsets, name_lengths = columns['name_offset'], columns['name_length']
+    sizes, raw_sizes = columns['size'], columns['raw_size']
+    content_offsets, content_lengths = columns['content_offset'], columns['content_length']
+    types = columns['type']
+
+    names = bytearray()
+    contents = bytearray()
+
+    stack = [(root, -1)]
+    while stack:
+        entity, parent = stack.pop()
+        index = len(types)
+
+        encoded_name = entity.name.encode('utf-8')
+        name_offsets.append(len(names))
+        name_lengths.append(len(encoded_name))
+        names += encoded_name
+
+        entity_type = entity.entity_type
+        types.append(FileSystemEntity.VALID_ENTITIES.index(entity_type))
+        parents.append(parent)
+        sizes.append(entity.size)
+
+        if entity_type == 'text':
+            encoded_content = entity.content.encode('utf-8')
+            raw_sizes.append(0)
+            content_offsets.append(len(contents))
+            content_lengths.append(len(encoded_content))
+            contents += encoded_content
+        else:
+            raw_sizes.append(entity.raw_size)
+            content_offsets.append(0)
+            content_lengths.append(0)
+
+            # pushed in reverse so children are written in order
+            for name in reversed(list(entity.get_names())):
+                stack.append((entity.get_child(name), index))
+
+    # a node's subtree ends where the subtree of its last descendant ends, children always follow their parent
+    subtree_ends = columns['subtree_end']
+    subtree_ends.extend(range(1, len(types) + 1))
+    for index in range(len(types) - 1, 0, -1):
+        parent = parents[index]
+        if subtree_ends[index] > subtree_ends[parent]:
+            subtree_ends[parent] = subtree_ends[index]
+
+    stream.write(HEADER.pack(MAGIC, VERSION, BYTE_ORDER, sequence, len(types), len(names), len(contents)))
+    for name, code in COLUMNS:
+        stream.write(columns[name])  # arrays expose their items as a buffer, written without a copy
+    stream.write(names)
+    stream.write(contents)
+
+
+def save_image(root, image_path, sequence=0):
+    """
+    Writes the tree below root to an image file
+    The image is written next to image_path and moved into place once it is complete and synced,
+    so a crash never leaves a partially written image behind.
+    """
+
+    temporary_path = image_path + '.tmp'
+    with open(temporary_path, 'wb') as stream:
+        write_image(root, stream, sequence)
+        stream.flush()
+        os.fsync(stream.fileno())
+    os.replace(temporary_path, image_path)
+
+
+def load_image(image_path):
+    """
+    Rebuilds the tree of an image file and returns its root entity
+    """
+
+    with open(image_path, 'rb') as stream:
+        return read_image(stream.read())
+
+
+def map_image(image_path):
+    """
+    Memory-maps an image file and returns its root entity
+    Children and text contents are only built from the mapping when they are first used.
+    """
+
+    return MappedImage(image_path).root()
+
+
+def read_sequence(image_path):
+    """
+    Returns the sequence number of the last journaled operation included in an image file
+    """
+
+    with open(image_path, 'rb') as stream:
+        data = stream.read(HEADER.size)
+
+    if len(data) < HEADER.size:
+        raise InvalidImage('The file is too short to be a file system image')
+    return HEADER.unpack(data)[3]
+
+
+def read_header(data):
+    """
+    Validates the header of an image
+    :param data a bytes-like object holding the image
+    :return (node count, names blob length, contents blob length, byte order)
+    """
+
+    if len(data) < HEADER.size:
+        raise InvalidImage('The file is too short to be a file system image')
+
+    magic, version, byte_order, sequence, node_count, names_length, contents_length = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise InvalidImage('The file is not a file system image')
+    elif version not in VERSIONS:
+        raise InvalidImage('Unsupported image version: {}'.format(version))
+
+    table_length = sum(array(code).itemsize for name, code in COLUMNS) * node_count
+    if len(data) != HEADER.size + table_length + names_length + contents_length:
+        raise InvalidImage('The image is truncated')
+
+    return node_count, names_length, contents_length, byte_order
+
+
+def read_columns(data, node_count, byte_order, copy=True):
+    """
+    Returns the node table of an image as a dict of column name -> array
+    :param copy if False and the image has the native byte order, the columns are memoryviews into data
+    """
+
+    columns = {}
+    offset = HEADER.size
+    for name, code in COLUMNS:
+        column = array(code)
+        length = column.itemsize * node_count
+        if not copy and byte_order == BYTE_ORDER:
+            column = memoryview(data)[offset:offset + length].cast(code)
+        else:
+            column.frombytes(data[offset:offset + length])
+            if byte_order != BYTE_ORDER:
+                column.byteswap()
+        columns[name] = column
+        offset += length
+
+    return columns, offset
+
+
+def read_image(data):
+    """
+    Rebuilds the tree of an image
+    Sizes are taken from the image, not recomputed.
+    :param data a bytes-like object holding the image
+    :return the root entity
+    """
+
+    node_count, names_length, contents_length, byte_order = read_header(data)
+    columns, names_start = read_columns(data, node_count, byte_order)
+    contents_start = names_start + names_length
+
+    if node_count == 0 or columns['type'][0] != 0:
+        raise InvalidImage('The image does not start with the root')
+
+    types, parents = columns['type'], columns['parent']
+    name_offsets, name_lengths = columns['name_offset'], columns['name_length']
+    sizes, raw_sizes = columns['size'], columns['raw_size']
+    content_offsets, content_lengths = columns['content_offset'], columns['content_length']
+    names = bytes(data[names_start:contents_start])
+
+    entity_types = FileSystemEntity.VALID_ENTITIES
+    intern = sys.intern
+
+    root = Root('root', 'root', '')
+    entities = [root]
+    for index in range(1, node_count):
+        name_offset = name_offsets[index]
+        name = intern(names[name_offset:name_offset + name_lengths[index]].decode('utf-8'))
+
+        type_code = types[index]
+        entity = ENTITY_CLASSES[type_code](entity_types[type_code], name)
+        if type_code == TEXT:
+            content_offset = contents_start + content_offsets[index]
+            entity.content = bytes(data[content_offset:content_offset + content_lengths[index]]).decode('utf-8')
+        else:
+            entity.raw_size = raw_sizes[index]
+        entity.size = sizes[index]
+
+        entities[parents[index]]._attach(entity)
+        entities.append(entity)
+
+    return root
+
+
+class MappedImage:
+    """
+    An image file mapped into memory, from which entities are built on demand
+
+    The node table is read in place from the mapping. A container loaded from the image holds a
+    MappedChildren in place of its child map, which builds its children the first time it is used,
+    and a text file holds its content undecoded until it is first read. Startup costs O(1) and the
+    memory in use is proportional to the part of the tree that is actually touched.
+    """
+
+    def __init__(self, image_path):
+        with open(image_path, 'rb') as stream:
+            try:
+                self._map = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise InvalidImage('The file is too short to be a file system image')
+
+        node_count, names_length, contents_length, byte_order = read_header(self._map)
+        self._columns, self._names_start = read_columns(self._map, node_count, byte_order, copy=False)
+        self._contents_start = self._names_start + names_length
+        self._mutex = threading.Lock()  # children are built once even if several threads reach them
+
+        if node_count == 0 or self._columns['type'][0] != 0:
+            raise InvalidImage('The image does not start with the root')
+
+    def root(self):
+        root = Root('root', 'root', '')
+        self._load_children(root, 0)
+        return root
+
+    def content(self, index):
+        """
+        Decodes the content of the text file at index
+        """
+
+        start = self._contents_start + self._columns['content_offset'][index]
+        return self._map[start:start + self._columns['content_length'][index]].decode('utf-8')
+
+    def iter_content(self, index, offset=0):
+        """
+        Yields the content of the text file at index from offset onwards, decoding the mapping in pieces
+        """
+
+        start = self._contents_start + self._columns['content_offset'][index]
+        end = start + self._columns['content_length'][index]
+        pieces = (self._map[piece:min(piece + CHUNK_SIZE, end)] for piece in range(start, end, CHUNK_SIZE))
+        return iter_decoded(pieces, offset)
+
+    def children(self, container, index):
+        """
+        Builds the children of the container at index, attaches them and returns the child map
+        """
+
+        columns = self._columns
+        types, sizes, raw_sizes = columns['type'], columns['size'], columns['raw_size']
+        name_offsets, name_lengths = columns['name_offset'], columns['name_length']
+        subtree_ends = columns['subtree_end']
+
+        entity_types = FileSystemEntity.VALID_ENTITIES
+        names_start = self._names_start
+
+        children = {}
+        child_index = index + 1
+        end = subtree_ends[index]
+        while child_index < end:
+            name_offset = names_start + name_offsets[child_index]
+            name = sys.intern(self._map[name_offset:name_offset + name_lengths[child_index]].decode('utf-8'))
+
+            type_code = types[child_index]
+            if type_code == TEXT:
+                child = MappedText(entity_types[type_code], name, self, child_index)
+            else:
+                child = ENTITY_CLASSES[type_code](entity_types[type_code], name)
+                child.raw_size = raw_sizes[child_index]
+                self._load_children(child, child_index)
+            child.size = sizes[child_index]
+
+            child._parent = container
+            child._path = None
+            children[name] = child
+
+            child_index = subtree_ends[child_index]  # the next sibling follows this child's subtree
+
+        return children
+
+    def _load_children(self, container, index):
+        if self._columns['subtree_end'][index] > index + 1:
+            container._children = MappedChildren(self, container, index)
+
+
+class MappedChildren:
+    """
+    Stands in for the child map of a container loaded from a MappedImage
+    The first time it is used, it builds the children and replaces itself with a real dict in the
+    container, so only that first access costs anything extra.
+    """
+
+    __slots__ = ('_image', '_container', '_index')
+
+    def __init__(self, image, container, index):
+        self._image = image
+        self._container = container
+        self._index = index
+
+    def materialize(self):
+        """
+        Returns the container's child map, building it from the image the first time
+        """
+
+        if self._container._children is self:
+            with self._image._mutex:
+                if self._container._children is self:
+                    self._container._children = self._image.children(self._container, self._index)
+        return self._container._children
+
+    def frozen(self):
+        """
+        Returns a child map for a state kept for snapshots, built from the image without building the container's
+        Nothing below a container whose children were never built has been modified, so the image holds its state.
+        """
+
+        if self._container._children is not self:
+            return self._container._children
+        return self._image.children(self._container, self._index)
+
+    def __len__(self):
+        return len(self.materialize())
+
+    def __iter__(self):
+        return iter(self.materialize())
+
+    def __contains__(self, name):
+        return name in self.materialize()
+
+    def __getitem__(self, name):
+        return self.materialize()[name]
+
+    def __setitem__(self, name, child):
+        self.materialize()[name] = child
+
+    def __delitem__(self, name):
+        del self.materialize()[name]
+
+    def keys(self):
+        return self.materialize().keys()
+
+    def values(self):
+        return self.materialize().values()
+
+    def items(self):
+        return self.materialize().items()
+
+
+class MappedContent:
+    """
+    The undecoded content of a text file in a MappedImage, held by a state kept for snapshots
+    It is decoded from the mapping every time it is read.
+    """
+
+    __slots__ = ('_image', '_index', '_length')
+
+    def __init__(self, image, index, length):
+        """
+        :param length the length of the content in characters
+        """
+
+        self._image = image
+        self._index = index
+        self._length = length
+
+    def __len__(self):
+        return self._length
+
+    def __str__(self):
+        return self._image.content(self._index)
+
+    def iter_chunks(self, offset=0):
+        """
+        Yields the content from offset onwards, decoding the mapping in pieces
+        """
+
+        return self._image.iter_content(self._index, offset)
+
+
+class MappedText(Text):
+    """
+    A text file loaded from a MappedImage, its content is decoded from the mapping when first used
+    """
+
+    __slots__ = ('_image', '_index')
+
+    def __init__(self, entity_type, name, image, index):
+        Text.__init__(self, entity_type, name)
+        self._image = image
+        self._index = index
+
+    @property
+    def content(self):
+        self._decode()
+        return Text.content.fget(self)
+
+    @content.setter
+    def content(self, new_content):
+        self._content = new_content
+        self._image = None
+
+    def chunk_source(self):
+        if self._image is not None:
+            return partial(self._image.iter_content, self._index)  # streamed from the mapping, never decoded whole
+        return Text.chunk_source(self)
+
+    def _chunked(self, codec=None):
+        self._decode()
+        return Text._chunked(self, codec)
+
+    def freeze(self):
+        if self._image is not None:
+            # the state reads the content from the mapping whenever it is used, the file stays undecoded
+            return EntityState(self._name, self._size, 0, None, MappedContent(self._image, self._index, self._size))
+        return Text.freeze(self)
+
+    def _decode(self):
+        if self._image is not None:
+            self._content = self._image.content(self._index)
+            self._image = None
@@ -0,0 +1,232 @@
+import re
+import threading
+from bisect import bisect_left
+from fnmatch import translate
+
+
+# characters that start the wildcard part of a glob pattern
+WILDCARDS = '*?['
+
+# a token is a run of word characters, matched case-insensitively
+TOKEN = re.compile(r'\w+')
+
+# a query term is a quoted phrase or a run of non-space characters
+QUERY_TERM = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def tokenize(content):
+    """
+    Returns a dict of token -> tuple of the positions at which it occurs in content, counted in tokens
+    """
+
+    positions = {}
+    for position, match in enumerate(TOKEN.finditer(content.lower())):
+        positions.setdefault(match.group(), []).append(position)
+    return {token: tuple(token_positions) for token, token_positions in positions.items()}
+
+
+class SortedKeys:
+    """
+    The keys of a dict in a sorted list, for prefix lookups
+
+    Keys added since the last lookup are appended and sorted in on the next lookup, which is cheap since
+    the list is already mostly sorted. Keys removed from the dict stay in the list, and are skipped, until
+    they make up most of it and the list is rebuilt. Not thread safe, the owner serializes access.
+    """
+
+    def __init__(self, mapping):
+        self._mapping = mapping
+        self._keys = []
+        self._sorted = True
+
+    def added(self, key):
+        """
+        Called when a key is added to the dict
+        """
+
+        self._keys.append(key)
+        self._sorted = False
+
+    def with_prefix(self, prefix):
+        """
+        Yields the keys of the dict that start with prefix, in order
+        """
+
+        if len(self._keys) > 2 * len(self._mapping) + 1024:
+            self._keys = sorted(self._mapping)  # mostly stale, rebuild
+        elif not self._sorted:
+            self._keys.sort()
+        self._sorted = True
+
+        keys = self._keys
+        previous = None
+        for index in range(bisect_left(keys, prefix), len(keys)):
+            key = keys[index]
+            if not key.startswith(prefix):
+                break
+            elif key != previous and key in self._mapping:  # a key removed and added again is listed twice
+                yield key
+            previous = key
+
+
+class NameIndex:
+    """
+    An index from entity name to the entities of that name, for glob searches across the whole tree
+
+    The distinct names are also kept sorted, so a pattern with a literal prefix such as 'config*' only
+    looks at the names that start with the prefix.
+    """
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self._entities = {}  # name -> set of entities with that name
+        self._names = SortedKeys(self._entities)
+
+    def __len__(self):
+        return len(self._entities)
+
+    def add(self, entity):
+        with self._mutex:
+            entities = self._entities.get(entity.name)
+            if entities is None:
+                entities = self._entities[entity.name] = set()
+                self._names.added(entity.name)
+            entities.add(entity)
+
+    def remove(self, entity):
+        with self._mutex:
+            entities = self._entities.get(entity.name)
+            if entities is None:
+                return
+
+            entities.discard(entity)
+            if not entities:
+                del self._entities[entity.name]
+
+    def match(self, pattern):
+        """
+        Returns the entities whose names match a glob pattern, as understood by fnmatch, case-sensitively
+        """
+
+        prefix = pattern
+        for index, character in enumerate(pattern):
+            if character in WILDCARDS:
+                prefix = pattern[:index]
+                break
+
+        if prefix == pattern:
+            with self._mutex:
+                return list(self._entities.get(pattern, ()))
+
+        matches = re.compile(translate(pattern)).match
+        results = []
+        with self._mutex:
+            for name in self._names.with_prefix(prefix):
+                if matches(name):
+                    results.extend(self._entities[name])
+
+        return results
+
+
+class TextIndex:
+    """
+    An inverted index from the tokens in text file contents to the files containing them
+
+    Every token maps to the files it occurs in and the positions at which it occurs there, so phrases
+    are matched without reading any content. Updating a file only touches the postings of the tokens
+    that were added, removed or moved between its old and new content. Tokens are also kept sorted,
+    for prefix searches.
+    """
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self._postings = {}  # token -> {text file: tuple of positions}
+        self._tokens = SortedKeys(self._postings)
+
+    def __len__(self):
+        return len(self._postings)
+
+    def update(self, file, old_content, new_content):
+        """
+        Re-indexes a text file whose content changed from old_content to new_content
+        """
+
+        if old_content == new_content:
+            return
+
+        old_tokens = tokenize(old_content) if old_content else {}
+        new_tokens = tokenize(new_content) if new_content else {}
+
+        with self._mutex:
+            for token in old_tokens:
+                if token not in new_tokens:
+                    postings = self._postings[token]
+                    del postings[file]
+                    if not postings:
+                        del self._postings[token]
+
+            for token, positions in new_tokens.items():
+                if old_tokens.get(token) != positions:
+                    postings = self._postings.get(token)
+                    if postings is None:
+                        postings = self._postings[token] = {}
+                        self._tokens.added(token)
+                    postings[file] = positions
+
+    def search(self, query):
+        """
+        Returns the text files matching every term of a query
+        A term is a word, a word ending in '*' matching any token it starts, or a "quoted phrase" whose
+        words must occur next to each other in order. Matching ignores case and punctuation.
+        """
+
+        terms = []
+        for phrase, word in QUERY_TERM.findall(query):
+            if word.endswith('*') and TOKEN.fullmatch(word[:-1]):
+                terms.append((word[:-1].lower(), None))
+            else:
+                tokens = [match.group() for match in TOKEN.finditer((phrase or word).lower())]
+                if tokens:
+                    terms.append((None, tokens))
+
+        if not terms:
+            return []
+
+        with self._mutex:
+            results = None
+            for prefix, tokens in terms:
+                files = self._match_prefix(prefix) if prefix is not None else self._match_phrase(tokens)
+                results = files if results is None else results & files
+                if not results:
+                    return []
+
+            return list(results)
+
+    def _match_prefix(self, prefix):
+        files = set()
+        for token in self._tokens.with_prefix(prefix):
+            files.update(self._postings[token])
+        return files
+
+    def _match_phrase(self, tokens):
+        postings = [self._postings.get(token) for token in tokens]
+        if not all(postings):
+            return set()
+
+        # only the files holding every token can hold the phrase, start from the rarest token
+        candidates = set(min(postings, key=len))
+        for token_postings in postings:
+            candidates.intersection_update(token_postings)
+
+        if len(tokens) == 1:
+            return candidates
+
+        files = set()
+        for file in candidates:
+            following = [set(token_postings[file]) for token_postings in postings[1:]]
+            for start in postings[0][file]:
+                if all(start + offset in positions for offset, positions in enumerate(following, 1)):
+                    files.add(file)
+                    break
+
+        return files
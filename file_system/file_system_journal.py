@@ -0,0 +1,198 @@
+import json
+import os
+import struct
+import threading
+import zlib
+
+from file_system.file_system_exceptions import InvalidImage
+
+
+IMAGE_FILE = 'image.fs'
+SEGMENT_PREFIX = 'journal-'
+SEGMENT_SUFFIX = '.log'
+
+# payload length, crc32 of the sequence number and payload, sequence number
+RECORD = struct.Struct('<IIq')
+SEQUENCE = struct.Struct('<q')
+
+
+def segment_name(first_sequence):
+    return '{}{:020d}{}'.format(SEGMENT_PREFIX, first_sequence, SEGMENT_SUFFIX)
+
+
+def segment_paths(directory):
+    """
+    Returns the journal segments in a directory as a list of (first sequence number, file path), oldest first
+    """
+
+    segments = []
+    for name in os.listdir(directory):
+        if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+            first_sequence = int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+            segments.append((first_sequence, os.path.join(directory, name)))
+
+    return sorted(segments)
+
+
+def read_segment(segment_path):
+    """
+    Yields the (sequence number, operation, arguments) records of a journal segment
+    Reading stops at the first incomplete or corrupt record, which was never committed.
+    """
+
+    with open(segment_path, 'rb') as stream:
+        while True:
+            header = stream.read(RECORD.size)
+            if len(header) < RECORD.size:
+                return
+
+            length, checksum, sequence = RECORD.unpack(header)
+            payload = stream.read(length)
+            if len(payload) < length or zlib.crc32(payload, zlib.crc32(header[8:])) != checksum:
+                return
+
+            operation, arguments = json.loads(payload.decode('utf-8'))
+            yield sequence, operation, arguments
+
+
+def replay(directory, after_sequence):
+    """
+    Yields the (sequence number, operation, arguments) records of all journal segments in a directory
+    that come after after_sequence, in order
+    """
+
+    expected = after_sequence + 1
+    for first_sequence, segment_path in segment_paths(directory):
+        for sequence, operation, arguments in read_segment(segment_path):
+            if sequence < expected:
+                continue  # already included in the image
+            elif sequence > expected:
+                raise InvalidImage('The journal is missing operation {}'.format(expected))
+
+            yield sequence, operation, arguments
+            expected += 1
+
+
+class Journal:
+    """
+    An append-only log of the operations applied to a file system, written to numbered segment files
+
+    Records are buffered and committed as a group: the journal is flushed and synced to disk once
+    commit_every records are pending, and, if a commit_interval is given, at most that many seconds
+    after a record was appended. An operation is only durable once the group it is part of is committed.
+    Every record carries a sequence number and a checksum, so a torn record at the end of a segment
+    is recognized and ignored when the journal is replayed, and it is overwritten by the records appended after.
+    """
+
+    def __init__(self, directory, first_sequence, commit_every=1, commit_interval=None):
+        """
+        :param directory the directory holding the journal segments
+        :param first_sequence the sequence number of the first record appended, a new segment starts with it
+        :param commit_every the number of records committed together
+        :param commit_interval the longest time in seconds a record waits to be committed, None for no limit
+        """
+
+        self._directory = directory
+        self._commit_every = commit_every
+        self._mutex = threading.Lock()
+        self._sequence = first_sequence - 1
+        self._pending = 0
+        self._stream = None
+        self._open_segment(first_sequence)
+
+        self._closed = threading.Event()
+        self._committer = None
+        if commit_interval is not None:
+            self._committer = threading.Thread(target=self._commit_periodically, args=(commit_interval,), daemon=True)
+            self._committer.start()
+
+    @property
+    def sequence(self):
+        """
+        The sequence number of the last appended record
+        """
+
+        return self._sequence
+
+    def append(self, operation, arguments):
+        """
+        Appends a record, committing the pending group once it is complete
+        :param operation the name of the FileSystem method that was applied
+        :param arguments list of its JSON serializable arguments
+        :return the sequence number of the record
+        """
+
+        payload = json.dumps([operation, arguments], separators=(',', ':')).encode('utf-8')
+
+        with self._mutex:
+            self._sequence += 1
+            encoded_sequence = SEQUENCE.pack(self._sequence)
+            checksum = zlib.crc32(payload, zlib.crc32(encoded_sequence))
+            self._stream.write(RECORD.pack(len(payload), checksum, self._sequence))
+            self._stream.write(payload)
+
+            self._pending += 1
+            if self._pending >= self._commit_every:
+                self._commit()
+
+            return self._sequence
+
+    def commit(self):
+        """
+        Flushes and syncs all pending records to disk
+        """
+
+        with self._mutex:
+            self._commit()
+
+    def rotate(self):
+        """
+        Commits the current segment and starts a new one
+        :return the sequence number of the last record in the finished segments
+        """
+
+        with self._mutex:
+            self._commit()
+            self._stream.close()
+            self._open_segment(self._sequence + 1)
+            return self._sequence
+
+    def remove_segments(self, last_sequence):
+        """
+        Removes the finished segments holding no record after last_sequence, once they are folded into an image
+        """
+
+        with self._mutex:
+            current = self._stream.name
+
+        for first_sequence, segment_path in segment_paths(self._directory):
+            if first_sequence <= last_sequence and segment_path != current:
+                os.remove(segment_path)
+
+    def close(self):
+        """
+        Commits the pending records and closes the journal
+        """
+
+        self._closed.set()
+        if self._committer is not None:
+            self._committer.join()
+
+        with self._mutex:
+            self._commit()
+            self._stream.close()
+
+    def _open_segment(self, first_sequence):
+        # records from first_sequence on were never committed, or they would have been replayed, so a segment
+        # already starting there only holds a torn record and is started over instead of appended to
+        self._stream = open(os.path.join(self._directory, segment_name(first_sequence)), 'wb')
+
+    def _commit(self):
+        if self._pending:
+            self._stream.flush()
+            os.fsync(self._stream.fileno())
+            self._pending = 0
+
+    def _commit_periodically(self, commit_interval):
+        while not self._closed.wait(commit_interval):
+            self.commit()
@@ -0,0 +1,164 @@
+import threading
+from contextlib import contextmanager
+
+from file_system.file_system_exceptions import PathNotFound
+
+
+# lock modes, from weakest to strongest
+IS = 'IS'  # intention to read below the locked entity
+IX = 'IX'  # intention to modify below the locked entity
+S = 'S'  # read the locked entity and its whole subtree
+SIX = 'SIX'  # S and IX at once
+X = 'X'  # modify the locked entity and its whole subtree
+
+COMPATIBLE = {
+    IS: {IS, IX, S, SIX},
+    IX: {IS, IX},
+    S: {IS, S},
+    SIX: {IS},
+    X: set(),
+}
+
+# the weakest mode that covers both modes
+COMBINED = {
+    (IS, IS): IS, (IS, IX): IX, (IS, S): S, (IS, SIX): SIX,
+    (IX, IX): IX, (IX, S): SIX, (IX, SIX): SIX,
+    (S, S): S, (S, SIX): SIX,
+    (SIX, SIX): SIX,
+}
+
+INTENTION = {IS: IS, S: IS, IX: IX, SIX: IX, X: IX}  # mode taken on the ancestors of an entity locked in a mode
+
+
+def combine(mode, other_mode):
+    if X in (mode, other_mode):
+        return X
+    return COMBINED.get((mode, other_mode)) or COMBINED[(other_mode, mode)]
+
+
+class IntentionLock:
+    """
+    A multiple granularity lock, which can be held in any of the modes IS, IX, S, SIX and X
+    A mode is granted once it is compatible with every mode currently held by other owners.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._held = {IS: 0, IX: 0, S: 0, SIX: 0, X: 0}
+
+    def acquire(self, mode):
+        with self._condition:
+            while not self._grantable(mode):
+                self._condition.wait()
+            self._held[mode] += 1
+
+    def release(self, mode):
+        with self._condition:
+            self._held[mode] -= 1
+            self._condition.notify_all()
+
+    def _grantable(self, mode):
+        compatible = COMPATIBLE[mode]
+        for held_mode, count in self._held.items():
+            if count and held_mode not in compatible:
+                return False
+        return True
+
+
+class LockManager:
+    """
+    Hands out hierarchical locks on file system entities
+
+    Locking an entity in a mode also takes the matching intention mode on every one of its ancestors,
+    so operations on disjoint subtrees never block each other, while an operation holding S or X on
+    a container excludes conflicting operations anywhere below it.
+    Locks are taken in a single global order and all held until the operation ends, so operations
+    cannot deadlock. Locks only exist while they are held.
+    """
+
+    def __init__(self, root):
+        self._root = root
+        self._mutex = threading.Lock()
+        self._locks = {}  # entity -> [IntentionLock, number of operations using it]
+
+        # size propagation updates shared ancestors that are only intention locked
+        self.size_lock = threading.RLock()
+
+    @contextmanager
+    def locked(self, resolve):
+        """
+        Resolves and locks the entities an operation works on for the duration of the block
+        The entities are resolved without locks, locked, and resolved again under the locks. If a
+        concurrent operation changed the result in between, the locks are released and it is retried.
+        :param resolve callable returning a list of (entity, mode) tuples, it may raise PathNotFound
+        :return the list of entities returned by resolve, in order
+        """
+
+        while True:
+            try:
+                targets = resolve()
+            except PathNotFound:
+                # the path may only be missing in the middle of a concurrent rename, confirm it
+                # while no operation can modify the tree
+                targets = None
+                plan = {self._root: S}
+            else:
+                plan = self._plan(targets)
+
+            self._acquire(plan)
+            try:
+                if targets is None:
+                    targets = resolve()  # raises if the path is really missing
+                    retry = True
+                else:
+                    retry = self._plan(resolve()) != plan
+            except BaseException:
+                self._release(plan)
+                raise
+
+            if not retry:
+                break
+            self._release(plan)
+
+        try:
+            yield [entity for entity, mode in targets]
+        finally:
+            self._release(plan)
+
+    def _plan(self, targets):
+        """
+        Returns the mode to take on each entity, including the intention modes on the ancestors
+        """
+
+        plan = {}
+        for entity, mode in targets:
+            plan[entity] = combine(plan[entity], mode) if entity in plan else mode
+
+            intention = INTENTION[mode]
+            ancestor = entity.parent
+            while ancestor is not None:
+                plan[ancestor] = combine(plan[ancestor], intention) if ancestor in plan else intention
+                ancestor = ancestor.parent
+
+        return plan
+
+    def _acquire(self, plan):
+        for entity in sorted(plan, key=id):
+            with self._mutex:
+                record = self._locks.get(entity)
+                if record is None:
+                    record = self._locks[entity] = [IntentionLock(), 0]
+                record[1] += 1
+            record[0].acquire(plan[entity])
+
+    def _release(self, plan):
+        for entity, mode in plan.items():
+            with self._mutex:
+                record = self._locks[entity]
+            record[0].release(mode)
+
+            # the record is only dropped once the lock is free, so an entity never has two locks
+            with self._mutex:
+                record[1] -= 1
+                if record[1] == 0:
+                    del self._locks[entity]
@@ -0,0 +1,85 @@
+import threading
+import time
+
+
+# the number of entities torn down in one step
+STEP_BUDGET = 1000
+
+
+class Reclaimer:
+    """
+    Tears down deleted subtrees incrementally, a bounded number of entities per step
+
+    A deleted subtree is detached from the tree at once and handed to the reclaimer, which visits its
+    entities from an explicit stack and empties its containers one by one, so the subtree is never freed
+    in one long recursive pass. In the background, steps run on a daemon thread that is started when there
+    is work and exits once it is done, and the thread yields between steps so a step is the longest it
+    keeps other threads waiting. Steps are serialized, so the thread and callers of step may share the work.
+    """
+
+    def __init__(self, teardown, background=True, budget=STEP_BUDGET):
+        """
+        :param teardown callable called with each entity and the context it was added with, returning the
+            entity's children, which are torn down after it with the same context
+        :param background if True, added subtrees are torn down on a daemon thread, otherwise only by step
+        :param budget the number of entities torn down per step
+        """
+
+        self._teardown = teardown
+        self._background = background
+        self._budget = budget
+        self._mutex = threading.Lock()
+        self._stack = []  # (entity, context) still to be torn down
+        self._thread = None
+
+    @property
+    def pending(self):
+        """
+        The number of entities known to be left to tear down, their descendants are not counted
+        """
+
+        return len(self._stack)
+
+    def add(self, entity, context=None):
+        """
+        Adds a detached subtree to be torn down
+        """
+
+        with self._mutex:
+            self._stack.append((entity, context))
+            if self._background and self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def step(self, budget=None):
+        """
+        Tears down at most budget entities, the reclaimer's budget if None
+        :return whether there is work left
+        """
+
+        budget = self._budget if budget is None else budget
+        with self._mutex:
+            stack = self._stack
+            for _ in range(budget):
+                if not stack:
+                    break
+                entity, context = stack.pop()
+                stack.extend((child, context) for child in self._teardown(entity, context))
+            return bool(stack)
+
+    def drain(self):
+        """
+        Tears down everything that is left on the calling thread
+        """
+
+        while self.step():
+            pass
+
+    def _run(self):
+        while True:
+            with self._mutex:
+                if not self._stack:
+                    self._thread = None
+                    return
+            self.step()
+            time.sleep(0)  # let other threads in between steps
@@ -0,0 +1,133 @@
+from file_system.file_system_exceptions import PathNotFound, NotATextFile
+from file_system.file_system_helpers import parse_path, iter_lines
+from file_system.file_system_image import save_image
+
+
+def state_at(entity, epoch):
+    """
+    Returns the EntityState of entity as it was when the snapshot of the given epoch was taken
+    """
+
+    versions = entity._versions
+    if versions:
+        for last_epoch, state in versions:
+            if last_epoch >= epoch:
+                return state
+
+    state = entity.freeze()
+    if entity._versions is not versions:
+        # the entity was modified by another thread in between, and its previous state was kept
+        return state_at(entity, epoch)
+    return state
+
+
+class FileSystemSnapshot:
+    """
+    A read-only, point-in-time view of a FileSystem, returned by FileSystem.snapshot()
+
+    Taking a snapshot is O(1): the snapshot shares every entity with the live tree. The first time an
+    entity is modified after a snapshot, the file system keeps its previous state (name, sizes, a reference
+    to its child map and its content) for the snapshot. Only entities on the modified path are kept, and
+    a child map is only copied when children are added, removed or renamed.
+    """
+
+    def __init__(self, root, epoch):
+        self._root = root
+        self._epoch = epoch
+
+    def __str__(self):
+        return '\n'.join(self.iter_lines())
+
+    @property
+    def epoch(self):
+        return self._epoch
+
+    def get_entity(self, path):
+        """
+        Returns a read-only SnapshotEntity for the entity at path, as it was in the snapshot
+        """
+
+        current_entity = self.root
+        for name in parse_path(path):
+            if current_entity.entity_type == 'text' or name not in current_entity.get_names():
+                raise PathNotFound('Invalid target path')
+            current_entity = current_entity.get_child(name)
+
+        return current_entity
+
+    @property
+    def root(self):
+        return SnapshotEntity(self._root, self._epoch, '')
+
+    def read(self, path):
+        """
+        Returns the content of a text file as it was in the snapshot
+        """
+
+        file = self.get_entity(path)
+        if file.entity_type != 'text':
+            raise NotATextFile('Cannot read content from a non-text entity')
+        return file.content
+
+    def save(self, image_path, sequence=0):
+        """
+        Saves the file system as it was in the snapshot to a binary image file
+        :param sequence the sequence number of the last journaled operation the snapshot includes
+        """
+
+        save_image(self.root, image_path, sequence)
+
+    def iter_lines(self, max_depth=None, sort_children=False):
+        """
+        Lazily yields a 'path size' line for every entity below the root, as they were in the snapshot
+        """
+
+        lines = iter_lines(self.root, max_depth, sort_children)
+        next(lines)  # the root itself is not listed
+        yield from lines  # the generator keeps the snapshot, and the states it sees, alive until it is done
+
+
+class SnapshotEntity:
+    """
+    A read-only view of an entity as it was in a snapshot
+    """
+
+    __slots__ = ('_entity', '_epoch', '_state', '_path')
+
+    def __init__(self, entity, epoch, path):
+        self._entity = entity
+        self._epoch = epoch
+        self._state = state_at(entity, epoch)
+        self._path = path
+
+    @property
+    def entity_type(self):
+        return self._entity.entity_type
+
+    @property
+    def name(self):
+        return self._state.name
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def size(self):
+        return self._state.size
+
+    @property
+    def raw_size(self):
+        return self._state.raw_size
+
+    @property
+    def content(self):
+        content = self._state.content
+        return content if content is None or content.__class__ is str else str(content)
+
+    def get_names(self):
+        return self._state.children.keys()
+
+    def get_child(self, name):
+        child = self._state.children[name]
+        return SnapshotEntity(child, self._epoch, name if self._path == '' else self._path + '\\' + name)
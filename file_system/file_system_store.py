@@ -0,0 +1,86 @@
+import sys
+import threading
+from collections import namedtuple
+
+
+StoreInfo = namedtuple('StoreInfo', ['references', 'contents', 'logical_bytes', 'stored_bytes', 'saved_bytes', 'ratio'])
+
+# shorter contents are not stored, they are too small to be worth sharing and Python already shares
+# the empty and single character strings
+MIN_LENGTH = 2
+
+
+class ContentStore:
+    """
+    A reference counted store of text file contents, so identical contents are kept once
+
+    Contents are keyed by their hash and compared for equality on a hash match, which makes the lookup
+    exact. A file written through the store holds the stored string itself, so releasing it is a dict
+    lookup that hits the stored string by identity, and a string only counts as a reference if it is
+    the stored one.
+    """
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self._entries = {}  # content -> [stored content, number of files holding it]
+        self._references = 0
+        self._logical_bytes = 0
+        self._stored_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, content):
+        """
+        Adds a reference to content
+        :return the stored string equal to content, to be held in place of content
+        """
+
+        if len(content) < MIN_LENGTH:
+            return content
+
+        content_bytes = sys.getsizeof(content)
+        with self._mutex:
+            entry = self._entries.get(content)
+            if entry is None:
+                entry = self._entries[content] = [content, 0]
+                self._stored_bytes += content_bytes
+
+            entry[1] += 1
+            self._references += 1
+            self._logical_bytes += content_bytes
+            return entry[0]
+
+    def release(self, content):
+        """
+        Drops a reference to content, if content is a stored string, and forgets it once it is unreferenced
+        """
+
+        if content.__class__ is not str or len(content) < MIN_LENGTH:
+            return
+
+        with self._mutex:
+            entry = self._entries.get(content)
+            if entry is None or entry[0] is not content:
+                return
+
+            content_bytes = sys.getsizeof(content)
+            entry[1] -= 1
+            self._references -= 1
+            self._logical_bytes -= content_bytes
+            if entry[1] == 0:
+                del self._entries[content]
+                self._stored_bytes -= content_bytes
+
+    def info(self):
+        """
+        Reports the number of references and of distinct stored contents, the bytes the referenced contents
+        would take without the store, the bytes they take in it, the bytes saved and the dedup ratio
+        """
+
+        with self._mutex:
+            ratio = self._logical_bytes / self._stored_bytes if self._stored_bytes else 1.0
+            return StoreInfo(
+                self._references, len(self._entries), self._logical_bytes, self._stored_bytes,
+                self._logical_bytes - self._stored_bytes, ratio
+            )
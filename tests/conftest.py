@@ -0,0 +1,26 @@
+import pytest
+from file_system.file_system import FileSystem
+
+
+@pytest.fixture
+def file_system():
+    """
+    A small file system with a zip, an empty folder and non-ascii names and content
+    """
+
+    file_system = FileSystem()
+
+    file_system.create('drive', 'A', '')
+    file_system.create('folder', 'stuff1', 'A')
+    file_system.create('zip', 'zip1', 'A\\stuff1')
+    file_system.create('text', 'list1', 'A\\stuff1\\zip1')
+    file_system.create('text', 'listeé', 'A\\stuff1\\zip1')
+    file_system.create('folder', 'stuff2', 'A')
+    file_system.create('folder', 'empty', 'A')
+    file_system.create('drive', 'B', '')
+    file_system.create('text', 'notes', 'B')
+    file_system.write_to_file('A\\stuff1\\zip1\\list1', 'test')
+    file_system.write_to_file('A\\stuff1\\zip1\\listeé', 'déjà vu')
+    file_system.write_to_file('B\\notes', 'some notes')
+
+    return file_system
@@ -1,6 +1,11 @@
+import io
+import sys
+import time
 import pytest
 from file_system.file_system import FileSystem
-from file_system.file_system_exceptions import IllegalFileSystemOperation
+from file_system.file_system_content import CompressedContent
+from file_system.file_system_helpers import FileSystemPath
+from file_system.file_system_exceptions import IllegalFileSystemOperation, PathAlreadyExists, PathNotFound, NotATextFile
 
 
 def test_file_system_init():
@@ -218,3 +223,573 @@ def test_file_system_write_to_file():
     assert text_c.size == len(test_string)
     assert folder_b.size == len(test_string)
     assert drive_a.size == len(test_string)
+
+
+def test_file_system_move_subtree_paths():
+    """
+    Test that moving a container re-derives the paths of all of its descendants
+    """
+
+    file_system = FileSystem()
+
+    file_system.create('drive', 'a', '')
+    file_system.create('folder', 'b', 'a')
+    folder_c = file_system.create('folder', 'c', 'a\\b')
+    text_d = file_system.create('text', 'd', 'a\\b\\c')
+    target = file_system.create('zip', 'z', 'a')
+
+    assert text_d.path == 'a\\b\\c\\d'
+
+    file_system.move('a\\b', target.path)
+
+    assert folder_c.path == 'a\\z\\b\\c'
+    assert text_d.path == 'a\\z\\b\\c\\d'
+
+    with pytest.raises(IllegalFileSystemOperation):
+        file_system.move('a\\z', 'a\\z\\b\\c')
+
+
+def test_file_system_rename():
+    """
+    Test renaming a container and the paths of its descendants following it
+    """
+
+    file_system = FileSystem()
+
+    file_system.create('drive', 'a', '')
+    folder_b = file_system.create('folder', 'b', 'a')
+    file_system.create('folder', 'taken', 'a')
+    text_c = file_system.create('text', 'c', 'a\\b')
+
+    file_system.rename('a\\b', 'renamed')
+
+    assert folder_b.name == 'renamed'
+    assert 'renamed' in file_system._root.get_child('a').get_names()
+    assert 'b' not in file_system._root.get_child('a').get_names()
+    assert text_c.path == 'a\\renamed\\c'
+
+    with pytest.raises(PathAlreadyExists):
+        file_system.rename('a\\renamed', 'taken')
+
+
+def test_file_system_deep_size_propagation():
+    """
+    Test that size propagation walks up iteratively, past the recursion limit, and halves at every zip
+    """
+
+    file_system = FileSystem()
+
+    drive = file_system.create('drive', 'a', '')
+    zip_a = file_system.create('zip', 'z', 'a')
+
+    parent = zip_a
+    for level in range(sys.getrecursionlimit() + 100):
+        parent = file_system.create('folder', 'f{}'.format(level), parent.path)
+
+    text = file_system.create('text', 't', parent.path)
+    file_system.write_to_file(text.path, 'teststring')
+
+    assert parent.size == len('teststring')
+    assert zip_a.size == len('teststring') / 2
+    assert drive.size == len('teststring') / 2
+
+
+def test_file_system_batch():
+    """
+    Test that sizes are deferred inside a batch and recomputed when read or when the batch exits
+    """
+
+    file_system = FileSystem()
+
+    drive_a = file_system.create('drive', 'a', '')
+
+    with file_system.batch():
+        folder_b = file_system.create('folder', 'b', 'a')
+        zip_c = file_system.create('zip', 'c', 'a\\b')
+        for index in range(10):
+            text = file_system.create('text', 't{}'.format(index), 'a\\b\\c')
+            file_system.write_to_file(text.path, 'test')
+
+        assert drive_a._size == 0  # nothing has been propagated yet
+        assert zip_c.size == 20  # read inside the batch recomputes on demand
+
+        file_system.delete('a\\b\\c\\t0')
+        other = file_system.create('text', 'other', 'a')
+        file_system.write_to_file(other.path, 'abc')
+
+    assert zip_c.size == 18
+    assert folder_b.size == 18
+    assert drive_a._size == 21
+
+
+def test_file_system_defer_sizes():
+    """
+    Test a file system whose sizes are always recomputed lazily when read
+    """
+
+    file_system = FileSystem(defer_sizes=True)
+
+    drive_a = file_system.create('drive', 'a', '')
+    file_system.create('folder', 'b', 'a')
+    text_c = file_system.create('text', 'c', 'a\\b')
+
+    file_system.write_to_file(text_c.path, 'teststring')
+    assert drive_a.size == len('teststring')
+
+    file_system.move(text_c.path, 'a')
+    file_system.write_to_file(text_c.path, 'test')
+    assert file_system._root.get_child('a').get_child('b').size == 0
+    assert drive_a.size == len('test')
+
+
+def test_file_system_zip_sizes_do_not_drift():
+    """
+    Test that a zip stays at exactly half of its children's sizes under many small updates
+    """
+
+    file_system = FileSystem()
+
+    drive_a = file_system.create('drive', 'a', '')
+    zip_a = file_system.create('zip', 'z', 'a')
+    inner_zip = file_system.create('zip', 'y', 'a\\z')
+
+    for index in range(9):
+        text = file_system.create('text', 't{}'.format(index), 'a\\z\\y')
+        file_system.write_to_file(text.path, 'x')
+
+    file_system.write_to_file('a\\z\\y\\t0', 'xxx')
+    file_system.write_to_file('a\\z\\y\\t0', '')
+
+    assert inner_zip.raw_size == 8
+    assert inner_zip.size == 4
+    assert zip_a.size == 2
+    assert drive_a.size == 2
+    assert file_system.verify_sizes() == []
+
+
+def test_file_system_verify_sizes():
+    """
+    Test that the size audit reports entities whose cached size is wrong
+    """
+
+    file_system = FileSystem()
+
+    file_system.create('drive', 'a', '')
+    folder_b = file_system.create('folder', 'b', 'a')
+    text_c = file_system.create('text', 'c', 'a\\b')
+    file_system.write_to_file(text_c.path, 'teststring')
+
+    assert file_system.verify_sizes() == []
+
+    folder_b.size += 1
+
+    assert file_system.verify_sizes() == ['a\\b']
+
+
+def test_file_system_dump():
+    """
+    Test writing the file system structure to a stream, with a depth limit
+    """
+
+    file_system = FileSystem()
+
+    file_system.create('drive', 'B', '')
+    file_system.create('drive', 'A', '')
+    file_system.create('folder', 'stuff', 'A')
+
+    stream = io.StringIO()
+    file_system.dump(stream)
+    assert stream.getvalue() == str(file_system) + '\n'
+
+    stream = io.StringIO()
+    file_system.dump(stream, max_depth=1, sort_children=True)
+    assert stream.getvalue() == 'A 0\nB 0\n'
+
+
+def test_file_system_walk():
+    """
+    Test walking a subtree top down, bottom up and with a depth limit, deeper than the recursion limit,
+    and listing the children of a container
+    """
+
+    file_system = FileSystem()
+
+    file_system.create('drive', 'a', '')
+    folder_b = file_system.create('folder', 'b', 'a')
+    file_system.create('text', 't', 'a\\b')
+    file_system.write_to_file('a\\b\\t', 'teststring')
+    file_system.create('zip', 'z', 'a')
+
+    assert [(entry.path, entry.depth) for entry in file_system.walk()] == [
+        ('a', 1), ('a\\b', 2), ('a\\b\\t', 3), ('a\\z', 2)
+    ]
+    assert [entry.path for entry in file_system.walk('a', topdown=False)] == ['a\\b\\t', 'a\\b', 'a\\z']
+    assert [entry.name for entry in file_system.walk(max_depth=2)] == ['a', 'b', 'z']
+    assert list(file_system.walk('a\\b\\t')) == []
+
+    entries = list(file_system.iterdir('a'))
+    assert [(entry.name, entry.entity_type, entry.size) for entry in entries] == [('b', 'folder', 10), ('z', 'zip', 0)]
+    assert entries[0].entity is folder_b
+    with pytest.raises(IllegalFileSystemOperation):
+        list(file_system.iterdir('a\\b\\t'))
+
+    parent = 'a'
+    for level in range(sys.getrecursionlimit() + 100):
+        parent = file_system.create('folder', 'f{}'.format(level), parent).path
+    assert sum(1 for _ in file_system.walk(topdown=False)) == 4 + sys.getrecursionlimit() + 100
+
+
+def test_file_system_path_cache():
+    """
+    Test that cached paths are counted and dropped when an ancestor is moved, renamed or deleted
+    """
+
+    file_system = FileSystem(path_cache_size=8)
+
+    file_system.create('drive', 'a', '')
+    file_system.create('folder', 'b', 'a')
+    file_system.create('folder', 'target', 'a')
+    text_c = file_system.create('text', 'c', 'a\\b')
+
+    hits = file_system.path_cache_info().hits
+    file_system.write_to_file('a\\b\\c', 'test')
+    file_system.write_to_file('\\a\\b\\c\\', 'test')
+    assert file_system.path_cache_info().hits == hits + 1
+
+    file_system.move('a\\b', 'a\\target')
+    with pytest.raises(PathNotFound):
+        file_system.write_to_file('a\\b\\c', 'test')
+    assert file_system.path_cache_info().invalidations >= 1
+
+    file_system.write_to_file('a\\target\\b\\c', 'moved')
+    assert text_c.content == 'moved'
+
+    file_system.rename('a\\target\\b', 'd')
+    with pytest.raises(PathNotFound):
+        file_system.delete('a\\target\\b\\c')
+
+    file_system.delete('a\\target\\d')
+    with pytest.raises(PathNotFound):
+        file_system.write_to_file('a\\target\\d\\c', 'test')
+
+    info = file_system.path_cache_info()
+    assert info.maxsize == 8
+    assert info.currsize <= 8
+
+
+def test_file_system_parsed_paths():
+    """
+    Test that operations accept pre-parsed paths in place of path strings
+    """
+
+    file_system = FileSystem()
+
+    drive = file_system.create('drive', 'a', FileSystemPath(''))
+    folder = file_system.create('folder', 'b', FileSystemPath('a'))
+    text_path = FileSystemPath('a\\b').join('c')
+    text = file_system.create('text', 'c', text_path.parent)
+
+    file_system.write_to_file(text_path, 'test')
+    assert text.content == 'test'
+    assert drive.size == 4
+
+    file_system.move(text_path, FileSystemPath('a'))
+    assert folder.size == 0
+    file_system.delete(FileSystemPath('a\\c'))
+    assert drive.size == 0
+
+
+def test_file_system_bulk_operations():
+    """
+    Test creating, writing and deleting many entities at once, with per-item failures reported
+    """
+
+    file_system = FileSystem()
+
+    drive_a = file_system.create('drive', 'a', '')
+
+    created = file_system.create_many([
+        ('folder', 'b', 'a'),
+        ('zip', 'z', 'a\\b'),
+        ('text', 't1', 'a\\b\\z'),
+        ('text', 't2', 'a\\b\\z'),
+        ('text', 't1', 'a\\b\\z'),
+        ('drive', 'c', 'a'),
+        ('text', 't3', 'a\\missing'),
+        ('text', 't4', 'a'),
+    ])
+
+    assert created[0].path == 'a\\b'
+    assert created[3].path == 'a\\b\\z\\t2'
+    assert isinstance(created[4], PathAlreadyExists)
+    assert isinstance(created[5], IllegalFileSystemOperation)
+    assert isinstance(created[6], PathNotFound)
+    assert created[7].path == 'a\\t4'
+
+    written = file_system.write_many([
+        ('a\\b\\z\\t1', 'test'),
+        ('a\\b\\z\\t2', 'teststring'),
+        ('a\\t4', 'abc'),
+        ('a\\b', 'test'),
+        ('a\\b\\z\\missing', 'test'),
+    ])
+
+    assert written[:3] == [None, None, None]
+    assert isinstance(written[3], NotATextFile)
+    assert isinstance(written[4], PathNotFound)
+    assert created[1].size == 7
+    assert drive_a.size == 10
+    assert file_system.verify_sizes() == []
+
+    deleted = file_system.delete_many(['a\\b\\z\\t1', 'a\\t4', 'a\\b\\z\\missing', 'a\\t4\\x'])
+
+    assert deleted[:2] == [None, None]
+    assert isinstance(deleted[2], PathNotFound)
+    assert isinstance(deleted[3], PathNotFound)
+    assert drive_a.size == 5
+    assert file_system.verify_sizes() == []
+
+    # an item raising an unexpected error keeps the sizes of the items applied before it
+    with pytest.raises(TypeError):
+        file_system.write_many([('a\\b\\z\\t2', 'xxxxxxxxx'), ('a\\b\\z\\t2', None)])
+    assert file_system.verify_sizes() == []
+
+
+def test_file_system_incremental_writes():
+    """
+    Test append_to_file, write_at and truncate, with sizes propagated through a zip and a snapshot kept intact
+    """
+
+    file_system = FileSystem()
+    file_system.create('drive', 'a', '')
+    file_system.create('zip', 'z', 'a')
+    file_system.create('text', 't', 'a\\z')
+    file_system.write_to_file('a\\z\\t', 'hello')
+
+    snapshot = file_system.snapshot()
+
+    file_system.append_to_file('a\\z\\t', ' world')
+    assert file_system.read('a\\z\\t') == 'hello world'
+    file_system.write_at('a\\z\\t', 6, 'there!')
+    file_system.write_at('a\\z\\t', 0, 'J')
+    file_system.append_to_file('a\\z\\t', '!')
+    assert file_system.read('a\\z\\t') == 'Jello there!!'
+    assert file_system._root.get_child('a').size == 7
+
+    file_system.truncate('a\\z\\t', 5)
+    assert file_system.read('a\\z\\t') == 'Jello'
+    assert file_system._root.get_child('a').size == 3
+    assert snapshot.read('a\\z\\t') == 'hello'
+    assert file_system.verify_sizes() == []
+
+    with pytest.raises(IllegalFileSystemOperation):
+        file_system.write_at('a\\z\\t', 6, 'x')
+    with pytest.raises(IllegalFileSystemOperation):
+        file_system.truncate('a\\z\\t', 6)
+    with pytest.raises(NotATextFile):
+        file_system.append_to_file('a\\z', 'x')
+
+
+def test_file_system_copy():
+    """
+    Test copying a subtree, with contents shared between the copies, sizes propagated once through a zip
+    and the indexes and a snapshot kept up to date
+    """
+
+    file_system = FileSystem(dedup=True)
+    file_system.create('drive', 'a', '')
+    folder = file_system.create('folder', 'f', 'a')
+    text = file_system.create('text', 't', 'a\\f')
+    file_system.write_to_file('a\\f\\t', 'shared content')
+    file_system.create('text', 'e', 'a\\f')
+    file_system.append_to_file('a\\f\\e', 'edited')
+    file_system.create('zip', 'z', 'a')
+    assert file_system.grep('shared') == [text]
+    assert file_system.find('e') == [file_system._root.get_child('a').get_child('f').get_child('e')]
+
+    snapshot = file_system.snapshot()
+    copy = file_system.copy('a\\f', 'a\\z')
+
+    assert copy.path == 'a\\z\\f'
+    assert copy is not folder and copy.size == folder.size == 20
+    assert file_system._root.get_child('a').size == 30
+    assert file_system.verify_sizes() == []
+    assert copy.get_child('t')._content is text._content
+
+    # the copies are edited independently
+    file_system.append_to_file('a\\z\\f\\e', '!')
+    assert file_system.read('a\\f\\e') == 'edited'
+    assert file_system.read('a\\z\\f\\e') == 'edited!'
+
+    assert [entity.path for entity in file_system.grep('shared')] == ['a\\f\\t', 'a\\z\\f\\t']
+    assert [entity.path for entity in file_system.find('e')] == ['a\\f\\e', 'a\\z\\f\\e']
+    assert list(snapshot.iter_lines()) == ['a 20', 'a\\f 20', 'a\\f\\t 14', 'a\\f\\e 6', 'a\\z 0']
+
+    with pytest.raises(PathAlreadyExists):
+        file_system.copy('a\\f', 'a\\z')
+    with pytest.raises(IllegalFileSystemOperation):
+        file_system.copy('a\\f', 'a\\f')
+    with pytest.raises(IllegalFileSystemOperation):
+        file_system.copy('a\\f', '')
+    with pytest.raises(IllegalFileSystemOperation):
+        file_system.copy('a\\f', 'a\\f\\t')
+    with pytest.raises(IllegalFileSystemOperation):
+        file_system.move('a\\z', 'a\\f\\t')
+
+
+def test_file_system_delete_reclaim():
+    """
+    Test that deleting a large subtree detaches it at once and leaves its teardown to the reclaimer,
+    which drops it from the indexes and the content store while a snapshot still sees it
+    """
+
+    file_system = FileSystem(dedup=True, background_reclaim=False)
+    drive = file_system.create('drive', 'a', '')
+    file_system.create('drive', 'b', '')
+    file_system.create('folder', 'f', 'a')
+    for index in range(100):
+        file_system.create('text', 't{}'.format(index), 'a\\f')
+        file_system.write_to_file('a\\f\\t{}'.format(index), 'shared content')
+
+    parent = 'a'
+    for level in range(sys.getrecursionlimit() + 100):
+        parent = file_system.create('folder', 'deep', parent).path
+
+    assert len(file_system.find('t*')) == 100
+    assert len(file_system.grep('shared')) == 100
+    snapshot = file_system.snapshot()
+
+    file_system.delete('a')
+    assert file_system.find('t*') == [] and file_system.grep('shared') == []
+    assert drive.get_names() and file_system.content_store_info().references == 100
+
+    assert file_system.reclaim(10) is True
+    assert file_system.reclaim() is False
+    assert len(drive.get_names()) == 0
+    assert file_system.content_store_info().references == 0
+    assert len(file_system._name_index) == 1 and len(file_system._text_index) == 0
+    assert snapshot.read('a\\f\\t99') == 'shared content'
+    assert len(list(snapshot.iter_lines())) == 103 + sys.getrecursionlimit() + 100
+
+    # in the background, the teardown runs on its own thread
+    file_system = FileSystem(dedup=True)
+    file_system.create('drive', 'a', '')
+    file_system.create('folder', 'f', 'a')
+    for index in range(5000):
+        file_system.create('text', 't{}'.format(index), 'a\\f')
+        file_system.write_to_file('a\\f\\t{}'.format(index), 'shared content')
+
+    file_system.delete('a')
+    deadline = time.monotonic() + 10
+    while file_system.content_store_info().references and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert file_system.content_store_info().references == 0
+
+
+def test_file_system_dedup():
+    """
+    Test that identical contents are stored once, and that writes, edits and deletes maintain the references
+    """
+
+    file_system = FileSystem(dedup=True)
+    file_system.create('drive', 'a', '')
+    file_system.create('folder', 'f', 'a')
+    for name in ['t1', 't2', 't3']:
+        file_system.create('text', name, 'a\\f')
+        file_system.write_to_file('a\\f\\' + name, ''.join(['template ', 'content']))
+
+    text1 = file_system._root.get_child('a').get_child('f').get_child('t1')
+    text3 = file_system._root.get_child('a').get_child('f').get_child('t3')
+    assert text1.content is text3.content
+
+    info = file_system.content_store_info()
+    assert (info.references, info.contents) == (3, 1)
+    assert info.saved_bytes == 2 * info.stored_bytes
+    assert info.ratio == 3.0
+
+    file_system.write_to_file('a\\f\\t1', 'other')
+    file_system.append_to_file('a\\f\\t2', '!')
+    assert file_system.content_store_info()[:2] == (2, 2)
+
+    file_system.write_many([('a\\f\\t2', 'template content')])
+    assert file_system.content_store_info()[:2] == (3, 2)
+
+    file_system.delete('a\\f')
+    file_system.reclaim()  # the references of a deleted subtree are dropped as it is torn down
+    info = file_system.content_store_info()
+    assert (info.references, info.contents, info.stored_bytes) == (0, 0, 0)
+    assert FileSystem().content_store_info() is None
+
+
+def test_file_system_zip_compression():
+    """
+    Test that contents under a zip are kept compressed, and decompressed when read or moved out of the zip
+    """
+
+    content = 'a line of text that repeats\n' * 200
+
+    for codec in ['zlib', 'lzma']:
+        file_system = FileSystem(zip_compression=codec)
+        file_system.create('drive', 'a', '')
+        file_system.create('zip', 'z', 'a')
+        file_system.create('folder', 'f', 'a\\z')
+        file_system.create('text', 't', 'a\\z\\f')
+        file_system.create('text', 'plain', 'a')
+        file_system.write_to_file('a\\z\\f\\t', content)
+        file_system.write_to_file('a\\plain', content)
+
+        text = file_system._root.get_child('a').get_child('z').get_child('f').get_child('t')
+        assert isinstance(text._content, CompressedContent)
+        assert file_system.read('a\\z\\f\\t') == content
+        assert file_system.open_read('a\\z\\f\\t').read() == content
+        assert file_system._root.get_child('a').size == len(content) + len(content) // 2  # nominal sizes
+        assert file_system.stored_size('a\\z') < len(content) // 10
+        assert file_system.stored_size('a') == file_system.stored_size('a\\z') + len(content)
+
+        file_system.move('a\\z\\f', 'a')
+        assert text._content == content
+        file_system.move('a\\plain', 'a\\z')
+        assert file_system.read('a\\z\\plain') == content
+        assert file_system.stored_size('a\\z') < len(content) // 10
+        assert file_system.verify_sizes() == []
+
+    with pytest.raises(IllegalFileSystemOperation):
+        FileSystem(zip_compression='gzip')
+
+
+def test_file_system_zip_compression_edits():
+    """
+    Test that in-place edits of a file under a compressing zip keep its content compressed
+    """
+
+    content = 'a line of text that repeats\n' * 200
+
+    for codec in ['zlib', 'lzma']:
+        file_system = FileSystem(zip_compression=codec)
+        file_system.create('drive', 'a', '')
+        file_system.create('zip', 'z', 'a')
+        file_system.create('text', 'log', 'a\\z')
+        file_system.write_to_file('a\\z\\log', content)
+        snapshot = file_system.snapshot()
+
+        file_system.append_to_file('a\\z\\log', 'end\n')
+        assert file_system.stored_size('a\\z') < len(content) // 10
+
+        for step in range(100):
+            file_system.append_to_file('a\\z\\log', 'another line of text that repeats\n')
+        file_system.write_at('a\\z\\log', 5, 'LINE')
+        file_system.truncate('a\\z\\log', len(content) + 1000)
+        expected = (content[:5] + 'LINE' + content[9:] + 'end\n' + 'another line of text that repeats\n' * 100)
+        expected = expected[:len(content) + 1000]
+
+        assert file_system.read('a\\z\\log') == expected
+        assert file_system.open_read('a\\z\\log').read() == expected
+        assert file_system.stored_size('a\\z') < len(expected) // 10
+        assert snapshot.read('a\\z\\log') == content
+        assert file_system.verify_sizes() == []
+
+        # moved out of the zip the content is decompressed, and edits keep it as plain chunks
+        file_system.move('a\\z\\log', 'a')
+        file_system.append_to_file('a\\log', 'x')
+        assert file_system.read('a\\log') == expected + 'x'
+        assert file_system.stored_size('a\\log') == len(expected) + 1
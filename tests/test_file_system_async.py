@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+from file_system.file_system import FileSystem
+from file_system.file_system_async import AsyncFileSystem
+from file_system.file_system_exceptions import NotATextFile, PathNotFound
+
+
+def test_async_operations():
+    """
+    Test the awaitable operations and that they apply in the order they were awaited
+    """
+
+    async def run():
+        file_system = AsyncFileSystem()
+
+        drive = await file_system.create('drive', 'a', '')
+        await file_system.create('folder', 'b', 'a')
+        text = await file_system.create('text', 'c', 'a\\b')
+
+        await file_system.write_to_file('a\\b\\c', 'test')
+        assert await file_system.read('a\\b\\c') == 'test'
+
+        await file_system.move('a\\b\\c', 'a')
+        await file_system.rename('a\\c', 'd')
+        assert text.path == 'a\\d'
+        assert drive.size == 4
+
+        with pytest.raises(NotATextFile):
+            await file_system.write_to_file('a\\b', 'test')
+
+        await file_system.delete('a\\d')
+        with pytest.raises(PathNotFound):
+            await file_system.read('a\\d')
+        assert drive.size == 0
+
+    asyncio.run(run())
+
+
+def test_async_write_coalescing():
+    """
+    Test that concurrent writes to the same file are applied once per event loop tick
+    """
+
+    async def run():
+        file_system = FileSystem()
+        drive = file_system.create('drive', 'a', '')
+        text = file_system.create('text', 'c', 'a')
+
+        async_file_system = AsyncFileSystem(file_system)
+        writes = []
+        original_write_many = file_system.write_many
+
+        def write_many(items):
+            items = list(items)
+            writes.append(items)
+            return original_write_many(items)
+
+        file_system.write_many = write_many
+
+        await asyncio.gather(*(async_file_system.write_to_file('a\\c', 'x' * length) for length in range(1, 6)))
+
+        assert len(writes) == 1
+        assert len(writes[0]) == 1
+        assert text.content == 'xxxxx'
+        assert drive.size == 5
+
+    asyncio.run(run())
+
+
+def test_async_write_failure():
+    """
+    Test that a write with invalid content fails on its own, without failing the other writes of its tick
+    """
+
+    async def run():
+        file_system = AsyncFileSystem()
+        await file_system.create('drive', 'a', '')
+        await file_system.create('text', 't', 'a')
+        await file_system.create('text', 'u', 'a')
+
+        results = await asyncio.wait_for(asyncio.gather(
+            file_system.write_to_file('a\\u', 'good'), file_system.write_to_file('a\\t', 5), return_exceptions=True
+        ), timeout=5)
+
+        assert results[0] is None
+        assert isinstance(results[1], TypeError)
+        assert await file_system.read('a\\u') == 'good'
+        assert await file_system.read('a\\t') == ''
+        assert file_system.file_system.verify_sizes() == []
+
+        # a write failing inside the tick only fails its own future
+        class Unmeasurable(str):
+            def __len__(self):
+                raise ValueError('Unmeasurable content')
+
+        results = await asyncio.wait_for(asyncio.gather(
+            file_system.write_to_file('a\\u', 'better'), file_system.write_to_file('a\\t', Unmeasurable('x')),
+            return_exceptions=True
+        ), timeout=5)
+
+        assert results[0] is None
+        assert isinstance(results[1], ValueError)
+        assert await file_system.read('a\\u') == 'better'
+        assert file_system.file_system._root.get_child('a').size == 6
+        assert file_system.file_system.verify_sizes() == []
+
+    asyncio.run(run())
+
+
+def test_async_delete_yields():
+    """
+    Test that deleting a large subtree yields to the event loop while it is torn down
+    """
+
+    async def run():
+        file_system = AsyncFileSystem(teardown_slice=10)
+        drive = await file_system.create('drive', 'a', '')
+        folder = await file_system.create('folder', 'b', 'a')
+        for index in range(100):
+            await file_system.create('text', 't{}'.format(index), 'a\\b')
+
+        ticks = 0
+
+        async def count_ticks():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        counter = asyncio.ensure_future(count_ticks())
+        await asyncio.sleep(0)
+        await file_system.delete('a\\b')
+        counter.cancel()
+
+        assert ticks >= 10
+        assert len(drive.get_names()) == 0
+        assert len(folder.get_names()) == 0
+
+    asyncio.run(run())
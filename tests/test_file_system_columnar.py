@@ -0,0 +1,132 @@
+import pytest
+from file_system.file_system import FileSystem
+from file_system.file_system_columnar import ColumnarFileSystem
+from file_system.file_system_exceptions import IllegalFileSystemOperation, PathAlreadyExists, PathNotFound, NotATextFile
+
+
+def run_operations(file_system):
+    """
+    Applies the same sequence of operations to any backend
+    """
+
+    file_system.create('drive', 'A', '')
+    file_system.create('drive', 'B', '')
+    file_system.create('folder', 'stuff1', 'A')
+    file_system.create('zip', 'zip1', 'A\\stuff1')
+    file_system.create('text', 'list1', 'A\\stuff1\\zip1')
+    file_system.create('text', 'list2', 'A\\stuff1\\zip1')
+    file_system.create('folder', 'stuff2', 'A')
+    file_system.create('zip', 'stuff3', 'B')
+    file_system.create('folder', 'stuff4', 'B\\stuff3')
+
+    file_system.write_to_file('A\\stuff1\\zip1\\list1', 'test')
+    file_system.write_to_file('A\\stuff1\\zip1\\list2', 'x')
+    file_system.move('A\\stuff1\\zip1', 'B\\stuff3\\stuff4')
+    file_system.rename('B\\stuff3\\stuff4\\zip1', 'renamed')
+    file_system.create('text', 'list3', 'A\\stuff2')
+    file_system.write_to_file('A\\stuff2\\list3', 'teststring')
+    file_system.delete('A\\stuff1')
+
+
+def run_on_object_backend():
+    """
+    Returns an object backed file system with the operations applied
+    """
+
+    file_system = FileSystem()
+    run_operations(file_system)
+    return file_system
+
+
+def test_columnar_selected_by_backend(tmp_path):
+    """
+    Test that the columnar backend is selected through the FileSystem constructor
+    """
+
+    assert isinstance(FileSystem(backend='columnar'), ColumnarFileSystem)
+    assert isinstance(FileSystem(), FileSystem)
+
+    with pytest.raises(IllegalFileSystemOperation):
+        FileSystem(backend='test')
+
+    # options the columnar backend does not implement are rejected rather than ignored
+    for options in [{'thread_safe': True}, {'dedup': True}, {'zip_compression': 'zlib'}, {'path_cache_size': 0}]:
+        with pytest.raises(IllegalFileSystemOperation):
+            FileSystem(backend='columnar', **options)
+    with pytest.raises(IllegalFileSystemOperation):
+        FileSystem.load('image.fs', backend='columnar')
+    with pytest.raises(IllegalFileSystemOperation):
+        FileSystem.open(str(tmp_path / 'journaled'), backend='columnar')
+    assert not (tmp_path / 'journaled').exists()
+
+
+def test_columnar_matches_object_backend():
+    """
+    Test that both backends produce the same structure and sizes for the same operations
+    """
+
+    object_file_system = FileSystem()
+    columnar_file_system = FileSystem(backend='columnar')
+
+    run_operations(object_file_system)
+    run_operations(columnar_file_system)
+
+    assert str(columnar_file_system) == str(object_file_system)
+    assert list(columnar_file_system.iter_lines(max_depth=2, sort_children=True)) == \
+        list(object_file_system.iter_lines(max_depth=2, sort_children=True))
+    assert columnar_file_system.verify_sizes() == []
+
+
+def test_columnar_batch():
+    """
+    Test that sizes deferred in a batch are recomputed in one pass when it exits
+    """
+
+    file_system = ColumnarFileSystem()
+
+    with file_system.batch():
+        run_operations(file_system)
+        assert file_system._sizes_stale
+
+    assert not file_system._sizes_stale
+    assert str(file_system) == str(run_on_object_backend())
+
+
+def test_columnar_errors():
+    """
+    Test that the columnar backend raises the same exceptions as the object backend
+    """
+
+    file_system = ColumnarFileSystem()
+
+    drive = file_system.create('drive', 'a', '')
+    folder = file_system.create('folder', 'b', 'a')
+    text = file_system.create('text', 'c', 'a\\b')
+
+    assert text.path == 'a\\b\\c'
+    assert folder.get_child('c') == text
+    assert drive.get_names() == ['b']
+
+    with pytest.raises(IllegalFileSystemOperation):
+        file_system.create('folder', 'test', '')
+
+    with pytest.raises(IllegalFileSystemOperation):
+        file_system.create('folder', 'test', 'a\\b\\c')
+
+    with pytest.raises(PathAlreadyExists):
+        file_system.create('text', 'c', 'a\\b')
+
+    with pytest.raises(PathNotFound):
+        file_system.delete('a\\missing')
+
+    with pytest.raises(NotATextFile):
+        file_system.write_to_file('a\\b', 'test')
+
+    with pytest.raises(IllegalFileSystemOperation):
+        file_system.move('a\\b', 'a\\b')
+
+    # freed slots are reused
+    file_system.delete('a\\b')
+    new_folder = file_system.create('folder', 'd', 'a')
+    assert new_folder.path == 'a\\d'
+    assert file_system.verify_sizes() == []
@@ -0,0 +1,134 @@
+import io
+import random
+
+import pytest
+from file_system.file_system import FileSystem
+from file_system.file_system_content import ChunkedContent, CompressedContent, CHUNK_SIZE, compress
+from file_system.file_system_exceptions import NotATextFile
+
+
+def test_chunked_content_edits():
+    """
+    Test that random appends, writes and truncates match the same edits made on a plain string,
+    with chunks kept as strings and compressed
+    """
+
+    for codec in [None, 'zlib', 'lzma']:
+        rng = random.Random(17)
+        expected = 'x' * (3 * CHUNK_SIZE + 11)
+        content = ChunkedContent(expected, codec)
+
+        for step in range(500):
+            data = str(step) * rng.randint(0, 40)
+            operation = rng.choice(['append', 'write_at', 'truncate'])
+            if operation == 'append':
+                content.append(data)
+                expected += data
+            elif operation == 'write_at':
+                offset = rng.randint(0, len(expected))
+                content.write_at(offset, data)
+                expected = expected[:offset] + data + expected[offset + len(data):]
+            else:
+                length = rng.randint(len(expected) // 2, len(expected))
+                content.truncate(length)
+                expected = expected[:length]
+
+            assert len(content) == len(expected)
+
+        assert str(content) == expected
+        assert ''.join(content.iter_chunks(100)) == expected[100:]
+        assert max(len(chunk) for chunk in content._chunks) <= CHUNK_SIZE
+        if codec is not None:
+            content = ChunkedContent('x' * (3 * CHUNK_SIZE), codec)
+            content.append('y' * 100)
+            assert content.compressed_size < CHUNK_SIZE // 10
+
+
+def test_chunked_content_copy():
+    """
+    Test that editing a copy leaves the original untouched
+    """
+
+    content = ChunkedContent('abc')
+    content.append('def')
+    copy = content.copy()
+    copy.write_at(1, 'XY')
+    copy.truncate(4)
+
+    assert str(content) == 'abcdef'
+    assert str(copy) == 'aXYd'
+
+
+def check_reader(reader, expected):
+    """
+    Reads expected through reader with each of the reading methods
+    """
+
+    assert reader.read(5) == expected[:5]
+    assert reader.readline() == expected[5:expected.index('\n', 5) + 1]
+    assert reader.read() == expected[expected.index('\n', 5) + 1:]
+    assert reader.read() == ''
+
+    reader.seek(CHUNK_SIZE - 3)
+    assert reader.read(10) == expected[CHUNK_SIZE - 3:CHUNK_SIZE + 7]
+    assert reader.tell() == CHUNK_SIZE + 7
+    reader.seek(-4, io.SEEK_END)
+    assert reader.read() == expected[-4:]
+
+    reader.seek(0)
+    assert list(reader) == expected.splitlines(keepends=True)
+
+
+def test_open_read(tmp_path):
+    """
+    Test streaming reads of plain, edited and memory-mapped text files
+    """
+
+    expected = ''.join('line {} é\n'.format(index) for index in range(3000))
+
+    file_system = FileSystem()
+    file_system.create('drive', 'a', '')
+    file_system.create('text', 'plain', 'a')
+    file_system.create('text', 'edited', 'a')
+    file_system.write_to_file('a\\plain', expected)
+    file_system.write_to_file('a\\edited', expected[:100])
+    file_system.append_to_file('a\\edited', expected[100:])
+
+    with file_system.open_read('a\\plain') as reader:
+        check_reader(reader, expected)
+
+    reader = file_system.open_read('a\\edited')
+    file_system.write_at('a\\edited', 0, 'changed')  # the reader keeps the content it was opened on
+    check_reader(reader, expected)
+
+    image_path = str(tmp_path / 'image.fs')
+    file_system.write_to_file('a\\edited', expected)
+    file_system.save(image_path)
+    loaded = FileSystem.load(image_path, lazy=True)
+    check_reader(loaded.open_read('a\\edited'), expected)
+    assert loaded._root.get_child('a').get_child('edited')._image is not None  # never decoded whole
+
+    with pytest.raises(NotATextFile):
+        file_system.open_read('a')
+
+
+def test_compressed_content():
+    """
+    Test that compressed contents are decompressed whole and in bounded pieces from an offset
+    """
+
+    rng = random.Random(20)
+    expected = ''.join(rng.choice('abcé \n') for _ in range(5 * CHUNK_SIZE)) + 'z' * (20 * CHUNK_SIZE)
+
+    for codec in ['zlib', 'lzma']:
+        content = compress(expected, codec)
+        assert isinstance(content, CompressedContent)
+        assert len(content) == len(expected)
+        assert content.compressed_size < len(expected.encode('utf-8'))
+        assert str(content) == expected
+
+        pieces = list(content.iter_chunks(CHUNK_SIZE + 5))
+        assert ''.join(pieces) == expected[CHUNK_SIZE + 5:]
+        assert max(len(piece) for piece in pieces) <= CHUNK_SIZE
+
+    assert compress('ab', 'zlib') == 'ab'  # kept as is when compressing does not help
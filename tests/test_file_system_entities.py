@@ -56,6 +56,8 @@ def test_root():
     root.add_child(drive)
 
     assert root.get_child('A') is drive
+    assert drive.parent is root
+    assert drive.path == 'A'
 
     folder = Folder('folder', 'stuff', 'stuff')
 
@@ -160,6 +162,32 @@ def test_text():
 
     drive.add_child(text)
 
+    with pytest.raises(IllegalFileSystemOperation):
+        text.path = 'B\\list'
+
     text.content = 'test'
     assert text.content == 'test'
 
+
+def test_compact_layout():
+    """
+    Test that entities are slotted and that empty containers share a single empty child map
+    """
+
+    folder = Folder('folder', 'stuff')
+    other = Folder('folder', 'other')
+    text = Text('text', 'list')
+
+    assert not hasattr(folder, '__dict__')
+    assert not hasattr(text, '__dict__')
+    assert folder._children is other._children
+    assert len(folder.get_names()) == 0
+
+    folder.add_child(text)
+    assert folder._children is not other._children
+    assert text.path == 'stuff\\list'
+
+    folder.delete_child('list')
+    assert folder._children is other._children
+    assert text.path == 'stuff\\list'
+    assert text.parent is None
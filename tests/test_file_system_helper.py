@@ -1,4 +1,4 @@
-from file_system.file_system_helpers import path_parse, print_recursive
+from file_system.file_system_helpers import path_parse, print_recursive, iter_lines, parse_path, FileSystemPath
 from file_system.file_system import FileSystem
 
 
@@ -14,6 +14,27 @@ def test_path_parse():
     expected_results = ['A', 'stuff', 'list']
 
     assert parsed_path == expected_results
+    assert path_parse(FileSystemPath(path)) == expected_results
+
+
+def test_file_system_path():
+    """
+    Test the pre-parsed path type, which should compare and hash by its components
+    """
+
+    path = FileSystemPath('\\A\\stuff\\list\\')
+
+    assert path.components == ('A', 'stuff', 'list')
+    assert str(path) == 'A\\stuff\\list'
+    assert path == FileSystemPath(['A', 'stuff', 'list'])
+    assert hash(path) == hash(FileSystemPath('A\\stuff\\list'))
+    assert path.name == 'list'
+    assert path.parent == FileSystemPath('A\\stuff')
+    assert path.parent.join('list') == path
+    assert len(FileSystemPath('')) == 0
+
+    assert parse_path('A\\stuff') is parse_path('A\\stuff')
+    assert parse_path(path) is path
 
 
 def test_print_recursive():
@@ -32,3 +53,24 @@ def test_print_recursive():
     expected_string = ' 0\nA 0\nA\\stuff 0\nA\\stuff\\list 0\nA\\more_stuff 0\n'
 
     assert output_string == expected_string
+
+
+def test_iter_lines():
+    """
+    Test the lazy line generator with depth limits and sorted children
+    """
+
+    file_system = FileSystem()
+
+    file_system.create('drive', 'A', '')
+    file_system.create('folder', 'stuff', 'A')
+    file_system.create('text', 'list', 'A\\stuff')
+    file_system.create('folder', 'more_stuff', 'A')
+
+    drive = file_system._root.get_child('A')
+
+    assert list(iter_lines(drive)) == ['A 0', 'A\\stuff 0', 'A\\stuff\\list 0', 'A\\more_stuff 0']
+    assert list(iter_lines(drive, max_depth=1)) == ['A 0', 'A\\stuff 0', 'A\\more_stuff 0']
+    assert list(iter_lines(drive, sort_children=True)) == [
+        'A 0', 'A\\more_stuff 0', 'A\\stuff 0', 'A\\stuff\\list 0'
+    ]
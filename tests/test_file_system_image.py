@@ -0,0 +1,114 @@
+import pytest
+from file_system.file_system import FileSystem
+from file_system.file_system_exceptions import InvalidImage
+from file_system.file_system_image import MappedChildren
+
+
+def test_save_and_load(file_system, tmp_path):
+    """
+    Test that a loaded file system has the structure, sizes and contents of the saved one
+    """
+
+    image_path = str(tmp_path / 'image.fs')
+
+    file_system.save(image_path)
+    loaded = FileSystem.load(image_path)
+
+    assert str(loaded) == str(file_system)
+    assert loaded.read('A\\stuff1\\zip1\\listeé') == 'déjà vu'
+    assert loaded._root.get_child('A').get_child('stuff1').get_child('zip1').raw_size == 11
+    assert loaded.verify_sizes() == []
+
+    # the loaded file system is fully usable
+    loaded.write_to_file('B\\notes', 'more notes')
+    loaded.move('A\\stuff1\\zip1', 'B')
+    assert loaded._root.get_child('B').size == 16
+    assert loaded.verify_sizes() == []
+
+
+def test_save_empty_and_from_snapshot(file_system, tmp_path):
+    """
+    Test that saving an empty file system and an image taken from a snapshot both round trip
+    """
+
+    image_path = str(tmp_path / 'image.fs')
+    FileSystem().save(image_path)
+    assert str(FileSystem.load(image_path)) == ''
+
+    snapshot = file_system.snapshot()
+    expected = str(file_system)
+    file_system.delete('A')
+
+    snapshot.save(image_path)
+    assert str(FileSystem.load(image_path)) == expected
+
+
+def test_load_invalid_image(file_system, tmp_path):
+    """
+    Test that files that are not complete images are rejected
+    """
+
+    image_path = tmp_path / 'image.fs'
+
+    image_path.write_bytes(b'not an image at all, just some bytes')
+    with pytest.raises(InvalidImage):
+        FileSystem.load(str(image_path))
+
+    file_system.save(str(image_path))
+    image_path.write_bytes(image_path.read_bytes()[:-3])
+    with pytest.raises(InvalidImage):
+        FileSystem.load(str(image_path))
+
+
+def test_lazy_load(file_system, tmp_path):
+    """
+    Test that a memory-mapped file system only builds the children and contents that are used
+    """
+
+    image_path = str(tmp_path / 'image.fs')
+    file_system.save(image_path)
+
+    loaded = FileSystem.load(image_path, lazy=True)
+    drive_a = loaded._root.get_child('A')
+    assert isinstance(drive_a._children, MappedChildren)  # only the drives have been built
+    assert drive_a.size == file_system._root.get_child('A').size
+
+    zip1 = drive_a.get_child('stuff1').get_child('zip1')
+    assert loaded.read('A\\stuff1\\zip1\\list1') == 'test'
+    assert zip1.get_child('listeé')._image is not None  # not decoded yet
+    assert isinstance(loaded._root.get_child('B')._children, MappedChildren)
+
+    # saving reads the image through snapshot states, without building or decoding the live entities
+    copy_path = str(tmp_path / 'copy.fs')
+    loaded.save(copy_path)
+    assert zip1.get_child('listeé')._image is not None
+    assert isinstance(loaded._root.get_child('B')._children, MappedChildren)
+    assert str(FileSystem.load(copy_path)) == str(file_system)
+
+    assert str(loaded) == str(file_system)
+    assert loaded.verify_sizes() == []
+
+
+def test_lazy_load_modifications(file_system, tmp_path):
+    """
+    Test that a memory-mapped file system can be modified, snapshotted and saved over its own image
+    """
+
+    image_path = str(tmp_path / 'image.fs')
+    file_system.save(image_path)
+
+    loaded = FileSystem.load(image_path, lazy=True)
+    snapshot = loaded.snapshot()
+    expected = str(snapshot)
+
+    loaded.write_to_file('A\\stuff1\\zip1\\listeé', 'abc')
+    loaded.create('text', 'list2', 'A\\stuff1\\zip1')
+    loaded.move('B\\notes', 'A\\empty')
+    loaded.delete('B')
+
+    assert str(snapshot) == expected
+    assert snapshot.read('A\\stuff1\\zip1\\listeé') == 'déjà vu'
+    assert loaded.verify_sizes() == []
+
+    loaded.save(image_path)
+    assert str(FileSystem.load(image_path, lazy=True)) == str(loaded)
@@ -0,0 +1,144 @@
+from file_system.file_system import FileSystem
+from file_system.file_system_index import NameIndex, tokenize
+
+
+def paths(entities):
+    return [entity.path for entity in entities]
+
+
+def test_find():
+    """
+    Test glob searches with and without a literal prefix, under a path and by type
+    """
+
+    file_system = FileSystem()
+
+    file_system.create('drive', 'A', '')
+    file_system.create('folder', 'config', 'A')
+    file_system.create('text', 'config.ini', 'A\\config')
+    file_system.create('zip', 'configs', 'A')
+    file_system.create('text', 'config.yml', 'A\\configs')
+    file_system.create('text', 'readme', 'A\\configs')
+    file_system.create('drive', 'B', '')
+    file_system.create('text', 'config.ini', 'B')
+
+    assert paths(file_system.find('config*')) == [
+        'A\\config', 'A\\config\\config.ini', 'A\\configs', 'A\\configs\\config.yml', 'B\\config.ini'
+    ]
+    assert paths(file_system.find('config*', under='A', entity_type='text')) == [
+        'A\\config\\config.ini', 'A\\configs\\config.yml'
+    ]
+    assert paths(file_system.find('*.ini')) == ['A\\config\\config.ini', 'B\\config.ini']
+    assert paths(file_system.find('config.ini', under='B')) == ['B\\config.ini']
+    assert paths(file_system.find('config?')) == ['A\\configs']
+    assert file_system.find('missing*') == []
+
+
+def test_find_after_changes():
+    """
+    Test that the index follows creates, deletes, moves and renames made after it was built
+    """
+
+    file_system = FileSystem()
+
+    file_system.create('drive', 'A', '')
+    file_system.create('folder', 'config', 'A')
+    file_system.create('text', 'config.ini', 'A\\config')
+    file_system.create('zip', 'configs', 'A')
+    file_system.create('text', 'config.yml', 'A\\configs')
+    file_system.create('text', 'readme', 'A\\configs')
+    file_system.create('drive', 'B', '')
+    file_system.create('text', 'config.ini', 'B')
+    assert len(file_system.find('*')) == 8
+
+    file_system.create('text', 'config.json', 'B')
+    file_system.delete('A\\config')
+    file_system.move('A\\configs', 'B')
+    file_system.rename('B\\configs\\readme', 'config.txt')
+
+    assert paths(file_system.find('config*', entity_type='text')) == [
+        'B\\config.ini', 'B\\config.json', 'B\\configs\\config.txt', 'B\\configs\\config.yml'
+    ]
+    assert file_system.find('config*', under='A') == []
+    assert file_system.find('readme') == []
+
+
+def test_name_index_rebuilds_stale_names():
+    """
+    Test that names no longer in use are dropped from the sorted name list
+    """
+
+    file_system = FileSystem()
+    file_system.create('drive', 'A', '')
+    file_system.find('*')
+
+    for index in range(3000):
+        file_system.create('text', 'file{}'.format(index), 'A')
+        file_system.delete('A\\file{}'.format(index))
+
+    assert file_system.find('file*') == []
+    assert len(file_system._name_index._names._keys) < 3000
+    assert isinstance(file_system._name_index, NameIndex)
+
+
+def build_documents():
+    """
+    Returns a file system with a few documents to search
+    """
+
+    file_system = FileSystem()
+    file_system.create('drive', 'A', '')
+    file_system.create('folder', 'docs', 'A')
+    file_system.create('drive', 'B', '')
+
+    documents = {
+        'A\\docs\\fox': 'The quick brown fox jumps over the lazy dog.',
+        'A\\docs\\dog': 'A lazy dog sleeps; the brown dog is quick.',
+        'A\\notes': 'Quick notes about configuration and configs.',
+        'B\\fox': 'Brown, quick fox!',
+    }
+    for path, content in documents.items():
+        parent, name = path.rsplit('\\', 1)
+        file_system.create('text', name, parent)
+        file_system.write_to_file(path, content)
+
+    return file_system
+
+
+def test_grep():
+    """
+    Test word, prefix and phrase queries, alone, combined and under a path
+    """
+
+    file_system = build_documents()
+
+    assert paths(file_system.grep('quick')) == ['A\\docs\\dog', 'A\\docs\\fox', 'A\\notes', 'B\\fox']
+    assert paths(file_system.grep('"brown fox"')) == ['A\\docs\\fox']
+    assert paths(file_system.grep('"quick brown"')) == ['A\\docs\\fox']
+    assert paths(file_system.grep('config*')) == ['A\\notes']
+    assert paths(file_system.grep('brown fox', under='B')) == ['B\\fox']
+    assert paths(file_system.grep('LAZY "the brown"')) == ['A\\docs\\dog']
+    assert file_system.grep('cat') == []
+    assert file_system.grep('') == []
+
+
+def test_grep_after_changes():
+    """
+    Test that the text index follows writes, in place edits, moves and deletes made after it was built
+    """
+
+    file_system = build_documents()
+    assert paths(file_system.grep('fox')) == ['A\\docs\\fox', 'B\\fox']
+
+    file_system.write_to_file('B\\fox', 'A brown cat.')
+    file_system.append_to_file('A\\notes', ' The fox ran.')
+    file_system.move('A\\notes', 'B')
+    file_system.delete('A\\docs')
+
+    assert paths(file_system.grep('fox')) == ['B\\notes']
+    assert paths(file_system.grep('"brown cat"')) == ['B\\fox']
+    assert file_system.grep('lazy') == []
+    file_system.reclaim()  # the deleted subtree is dropped from the index as it is torn down
+    assert len(file_system._text_index) == len(
+        set(tokenize(file_system.read('B\\fox'))) | set(tokenize(file_system.read('B\\notes')))
+    )  # tokens no file holds anymore were dropped
@@ -0,0 +1,124 @@
+import os
+
+import pytest
+from file_system.file_system import FileSystem
+from file_system.file_system_exceptions import PathAlreadyExists
+from file_system.file_system_journal import IMAGE_FILE, segment_paths
+
+
+def apply_operations(file_system):
+    """
+    Applies one of each journaled operation to a file system
+    """
+
+    file_system.create('drive', 'A', '')
+    file_system.create('folder', 'stuff1', 'A')
+    file_system.create('zip', 'zip1', 'A\\stuff1')
+    file_system.create_many([('text', 'list1', 'A\\stuff1\\zip1'), ('text', 'list2', 'A\\stuff1\\zip1')])
+    file_system.create('folder', 'stuff2', 'A')
+    file_system.write_to_file('A\\stuff1\\zip1\\list1', 'test')
+    file_system.write_many([('A\\stuff1\\zip1\\list2', 'testing')])
+    file_system.append_to_file('A\\stuff1\\zip1\\list2', ' more')
+    file_system.write_at('A\\stuff1\\zip1\\list2', 4, 'ed')
+    file_system.truncate('A\\stuff1\\zip1\\list2', 9)
+    file_system.move('A\\stuff1\\zip1', 'A\\stuff2')
+    file_system.rename('A\\stuff2', 'renamed')
+    file_system.copy('A\\renamed\\zip1', 'A')
+    file_system.delete('A\\stuff1')
+
+
+def test_journal_replay(tmp_path):
+    """
+    Test that reopening a directory replays the journaled operations
+    """
+
+    directory = str(tmp_path / 'fs')
+    file_system = FileSystem.open(directory)
+    apply_operations(file_system)
+    expected = str(file_system)
+    file_system.close()
+
+    reopened = FileSystem.open(directory)
+    assert str(reopened) == expected
+    assert reopened.read('A\\renamed\\zip1\\list2') == 'testedg m'
+    assert reopened.verify_sizes() == []
+
+    # operations that fail are not journaled
+    reopened.write_to_file('A\\renamed\\zip1\\list1', 'abc')
+    with pytest.raises(PathAlreadyExists):
+        reopened.create('text', 'list1', 'A\\renamed\\zip1')
+    reopened.close()
+
+    assert FileSystem.open(directory).read('A\\renamed\\zip1\\list1') == 'abc'
+
+
+def test_journal_torn_record(tmp_path):
+    """
+    Test that a partially written last record is ignored, and later records still replay
+    """
+
+    directory = str(tmp_path / 'fs')
+    file_system = FileSystem.open(directory, commit_every=100)
+    apply_operations(file_system)
+    file_system.write_to_file('A\\renamed\\zip1\\list1', 'lost')
+    file_system.close()
+
+    (first_sequence, segment_path), = segment_paths(directory)
+    with open(segment_path, 'r+b') as stream:
+        stream.truncate(os.path.getsize(segment_path) - 2)
+
+    reopened = FileSystem.open(directory)
+    assert reopened.read('A\\renamed\\zip1\\list1') == 'test'
+    reopened.write_to_file('A\\renamed\\zip1\\list1', 'kept')
+    reopened.close()
+
+    assert FileSystem.open(directory).read('A\\renamed\\zip1\\list1') == 'kept'
+
+
+def test_journal_torn_first_record(tmp_path):
+    """
+    Test that records appended after a torn first record of a segment replay
+    """
+
+    directory = str(tmp_path / 'fs')
+    file_system = FileSystem.open(directory)
+    file_system.create('drive', 'A', '')
+    file_system.close()
+
+    (first_sequence, segment_path), = segment_paths(directory)
+    with open(segment_path, 'r+b') as stream:
+        stream.truncate(os.path.getsize(segment_path) - 3)
+
+    reopened = FileSystem.open(directory)
+    assert str(reopened) == ''
+    reopened.create('drive', 'B', '')
+    reopened.create('drive', 'C', '')
+    reopened.close()
+
+    assert str(FileSystem.open(directory)) == str(reopened) != ''
+
+
+def test_compaction(tmp_path):
+    """
+    Test that compaction folds the journal into an image, and that later operations are still journaled
+    """
+
+    directory = str(tmp_path / 'fs')
+    file_system = FileSystem.open(directory, commit_interval=0.01)
+    apply_operations(file_system)
+
+    file_system.compact(wait=True)
+    assert os.path.exists(os.path.join(directory, IMAGE_FILE))
+    assert len(segment_paths(directory)) == 1  # only the new, empty segment is left
+
+    file_system.create('drive', 'B', '')
+    file_system.compact()
+    file_system.create('text', 'notes', 'B')
+    file_system.write_to_file('B\\notes', 'after the compaction')
+    expected = str(file_system)
+    file_system.close()
+
+    for lazy in [False, True]:
+        reopened = FileSystem.open(directory, lazy=lazy)
+        assert str(reopened) == expected
+        reopened.close()
@@ -0,0 +1,230 @@
+import random
+import sys
+import threading
+
+import pytest
+from file_system.file_system import FileSystem
+from file_system.file_system_exceptions import IllegalFileSystemOperation, PathAlreadyExists, PathNotFound
+from file_system.file_system_locks import IntentionLock, LockManager, IS, IX, S, SIX, X
+
+
+def test_intention_lock_compatibility():
+    """
+    Test that each lock mode is only granted alongside compatible modes
+    """
+
+    lock = IntentionLock()
+
+    lock.acquire(IS)
+    lock.acquire(IX)
+    assert lock._grantable(IS)
+    assert lock._grantable(IX)
+    assert not lock._grantable(S)
+    assert not lock._grantable(SIX)
+    assert not lock._grantable(X)
+
+    lock.release(IX)
+    assert lock._grantable(S)
+    assert lock._grantable(SIX)
+
+    lock.release(IS)
+    assert lock._grantable(X)
+
+
+def test_lock_manager_plan():
+    """
+    Test that locking an entity takes intention locks on all of its ancestors
+    """
+
+    file_system = FileSystem()
+    drive = file_system.create('drive', 'a', '')
+    folder = file_system.create('folder', 'b', 'a')
+    text = file_system.create('text', 'c', 'a\\b')
+
+    manager = LockManager(file_system._root)
+    plan = manager._plan([(text, X), (folder, S)])
+
+    assert plan == {text: X, folder: SIX, drive: IX, file_system._root: IX}
+
+    with manager.locked(lambda: [(text, X)]) as entities:
+        assert entities == [text]
+        assert len(manager._locks) == 4
+
+    assert len(manager._locks) == 0
+
+
+def test_thread_safe_batches_are_rejected():
+    """
+    Test that deferred sizes cannot be combined with thread safe mode
+    """
+
+    with pytest.raises(IllegalFileSystemOperation):
+        FileSystem(thread_safe=True, defer_sizes=True)
+
+    with pytest.raises(IllegalFileSystemOperation):
+        with FileSystem(thread_safe=True).batch():
+            pass
+
+
+def test_thread_safe_stress():
+    """
+    Test that concurrent writes, creates, deletes and moves leave every size exact
+    """
+
+    file_system = FileSystem(thread_safe=True, path_cache_size=64)
+
+    file_system.create('drive', 'd', '')
+    file_system.create('zip', 'z', 'd')
+    file_system.create('folder', 'left', 'd')
+    file_system.create('folder', 'right', 'd\\z')
+
+    thread_count = 8
+    for thread_index in range(thread_count):
+        file_system.create('folder', 'f{}'.format(thread_index), 'd\\z')
+        for text_index in range(5):
+            file_system.create('text', 't{}'.format(text_index), 'd\\z\\f{}'.format(thread_index))
+
+    for text_index in range(10):
+        text = file_system.create('text', 'm{}'.format(text_index), 'd\\left')
+        file_system.write_to_file(text.path, 'x' * text_index)
+
+    errors = []
+
+    def writer(thread_index):
+        generator = random.Random(thread_index)
+        folder = 'd\\z\\f{}'.format(thread_index)
+        try:
+            for step in range(300):
+                operation = generator.random()
+                text = '{}\\t{}'.format(folder, generator.randrange(5))
+                if operation < 0.7:
+                    file_system.write_to_file(text, 'x' * generator.randrange(50))
+                elif operation < 0.85:
+                    try:
+                        extra = file_system.create('text', 'extra', folder)
+                        file_system.write_to_file(extra.path, 'abc')
+                    except PathAlreadyExists:
+                        pass
+                else:
+                    try:
+                        file_system.delete(folder + '\\extra')
+                    except PathNotFound:
+                        pass
+        except Exception as error:
+            errors.append(error)
+
+    def mover():
+        generator = random.Random(thread_count)
+        try:
+            for step in range(300):
+                name = 'm{}'.format(generator.randrange(10))
+                source, destination = ('d\\left', 'd\\z\\right') if generator.random() < 0.5 \
+                    else ('d\\z\\right', 'd\\left')
+                try:
+                    file_system.move(source + '\\' + name, destination)
+                except PathNotFound:
+                    pass
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=writer, args=(index,)) for index in range(thread_count)]
+    threads.append(threading.Thread(target=mover))
+
+    # switch threads as often as possible to interleave the operations
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+    assert errors == []
+    assert file_system.verify_sizes() == []
+    assert len(file_system._locks._locks) == 0
+
+
+def test_thread_safe_snapshot_isolation():
+    """
+    Test that snapshots taken and released concurrently each keep seeing the tree as it was when taken
+    """
+
+    file_system = FileSystem(thread_safe=True)
+
+    file_system.create('drive', 'd', '')
+    file_system.create('zip', 'z', 'd')
+
+    thread_count = 8
+    for thread_index in range(thread_count):
+        file_system.create('folder', 'f{}'.format(thread_index), 'd\\z')
+        for text_index in range(3):
+            file_system.create('text', 't{}'.format(text_index), 'd\\z\\f{}'.format(thread_index))
+
+    errors = []
+
+    def worker(thread_index):
+        folder = 'd\\z\\f{}'.format(thread_index)
+        try:
+            for step in range(200):
+                snapshot = file_system.snapshot()
+                expected = [snapshot.read('{}\\t{}'.format(folder, text_index)) for text_index in range(3)]
+                size = snapshot.get_entity(folder).size
+
+                for text_index in range(3):
+                    file_system.write_to_file('{}\\t{}'.format(folder, text_index), '{}-{}'.format(step, text_index))
+
+                seen = [snapshot.read('{}\\t{}'.format(folder, text_index)) for text_index in range(3)]
+                if seen != expected or snapshot.get_entity(folder).size != size:
+                    errors.append((thread_index, step, expected, seen))
+                del snapshot
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(thread_count)]
+
+    # switch threads as often as possible to interleave taking, reading and releasing snapshots
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+    assert errors == []
+    assert file_system.verify_sizes() == []
+    assert file_system._live_snapshots == {}
+    assert file_system._versioned == {}
+
+
+def test_thread_safe_generators_hold_no_locks():
+    """
+    Test that writing to the tree from inside a walk, an iterdir or an iter_lines loop does not deadlock
+    """
+
+    file_system = FileSystem(thread_safe=True)
+    file_system.create('drive', 'a', '')
+    for index in range(5):
+        file_system.create('text', 't{}'.format(index), 'a')
+
+    def run():
+        for entry in file_system.walk():
+            if entry.is_text():
+                file_system.write_to_file(entry.path, 'walked')
+        for entry in file_system.iterdir('a'):
+            file_system.append_to_file(entry.path, '!')
+        for line in file_system.iter_lines():
+            file_system.create('folder', line.split(' ')[0].replace('\\', '_'), 'a')
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+
+    assert not thread.is_alive()
+    assert file_system.read('a\\t4') == 'walked!'
+    assert len(file_system._root.get_child('a').get_names()) == 11
+    assert file_system.verify_sizes() == []
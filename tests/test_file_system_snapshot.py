@@ -0,0 +1,111 @@
+import gc
+import tracemalloc
+
+import pytest
+from file_system.file_system import FileSystem
+from file_system.file_system_exceptions import NotATextFile, PathNotFound
+
+
+def test_snapshot_is_isolated_from_writes(file_system):
+    """
+    Test that a snapshot keeps showing the tree as it was while the live tree changes
+    """
+
+    before = str(file_system)
+
+    snapshot = file_system.snapshot()
+
+    file_system.write_to_file('A\\stuff1\\zip1\\list1', 'teststring')
+    file_system.create('text', 'list2', 'A\\stuff2')
+    file_system.write_to_file('A\\stuff2\\list2', 'abc')
+    file_system.move('A\\stuff1\\zip1', 'A\\stuff2')
+    file_system.rename('A\\stuff2', 'renamed')
+    file_system.create('drive', 'C', '')
+    file_system.delete('A\\stuff1')
+
+    assert str(snapshot) == before
+    assert snapshot.read('A\\stuff1\\zip1\\list1') == 'test'
+    assert snapshot.get_entity('A').size == 6
+    assert snapshot.get_entity('A\\stuff1\\zip1').raw_size == 11
+
+    with pytest.raises(PathNotFound):
+        snapshot.get_entity('A\\renamed')
+
+    with pytest.raises(NotATextFile):
+        snapshot.read('A\\stuff1')
+
+    assert file_system.read('A\\renamed\\zip1\\list1') == 'teststring'
+    assert file_system.verify_sizes() == []
+
+
+def test_snapshots_of_different_epochs(file_system):
+    """
+    Test that several snapshots each see their own point in time
+    """
+
+    first = file_system.snapshot()
+    file_system.write_to_file('A\\stuff1\\zip1\\list1', 'second')
+    second = file_system.snapshot()
+    file_system.write_to_file('A\\stuff1\\zip1\\list1', 'third!!!!')
+
+    assert first.read('A\\stuff1\\zip1\\list1') == 'test'
+    assert second.read('A\\stuff1\\zip1\\list1') == 'second'
+    assert file_system.read('A\\stuff1\\zip1\\list1') == 'third!!!!'
+    assert first.get_entity('A').size == 6
+    assert second.get_entity('A').size == 7
+    assert file_system._root.get_child('A').size == 8
+
+
+def test_snapshot_only_copies_the_modified_path(file_system):
+    """
+    Test that only the modified entities keep old states, and that they are dropped with the snapshot
+    """
+
+    untouched = file_system._root.get_child('A').get_child('stuff2')
+    text = file_system._root.get_child('A').get_child('stuff1').get_child('zip1').get_child('list1')
+
+    snapshot = file_system.snapshot()
+    file_system.write_to_file('A\\stuff1\\zip1\\list1', 'teststring')
+
+    assert untouched._versions is None
+    assert len(text._versions) == 1
+
+    del snapshot
+    gc.collect()
+
+    file_system.write_to_file('A\\stuff1\\zip1\\list1', 'abc')
+    assert text._versions is None  # no live snapshot is left to see the old state
+
+    snapshot = file_system.snapshot()
+    file_system.write_to_file('A\\stuff1\\zip1\\list1', 'test')
+    assert len(text._versions) == 1
+    assert text._versions[0][1].content == 'abc'
+
+
+def test_released_snapshot_frees_old_states():
+    """
+    Test that the states kept for a snapshot are freed once it is released, without modifying the entities again
+    """
+
+    tracemalloc.start()
+    file_system = FileSystem()
+    file_system.create('drive', 'A', '')
+    for index in range(20):
+        file_system.create('text', 'file{}'.format(index), 'A')
+        file_system.write_to_file('A\\file{}'.format(index), str(index) * 100000)
+
+    snapshot = file_system.snapshot()
+    for index in range(20):
+        file_system.write_to_file('A\\file{}'.format(index), 'new')
+    retained, _ = tracemalloc.get_traced_memory()
+
+    del snapshot
+    gc.collect()
+    released, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    drive = file_system._root.get_child('A')
+    assert all(drive.get_child(name)._versions is None for name in drive.get_names())
+    assert drive._versions is None
+    assert retained - released >= 20 * 100000
+    assert file_system._versioned == {}